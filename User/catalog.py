@@ -1,10 +1,26 @@
+import os
 from typing import List, Dict
 from .database import Database
+from .shared_cache import SharedCache, file_version
+from .metrics import registry
+
+# Product list for browsing and search, kept in the host-wide shared cache. It
+# is recomputed after any data.db commit, and at least every CATALOG_CACHE_TTL
+# seconds, since available stock also changes as holds expire.
+catalog_cache = SharedCache(ttl=int(os.environ.get('CATALOG_CACHE_TTL', 30)))
+registry.track_cache(catalog_cache)
+
+async def get_catalog(db: Database) -> List[Dict]:
+    """Retrieve all products, from the shared cache while data.db is unchanged."""
+    version = file_version(db.db_path)
+    if version is None:
+        return await db.get_all_products()
+    return await catalog_cache.get_or_compute_async('catalog:products', db.get_all_products, version=version)
 
 async def get_products_by_platform(platform: str, db: Database) -> List[Dict]:
     """Retrieve products for a specific platform."""
     try:
-        products = await db.get_all_products()
+        products = await get_catalog(db)
         return [product for product in products if platform in product['platform']]
     except Exception as e:
         raise Exception(f"Error retrieving products for platform {platform}: {e}")
@@ -20,7 +36,7 @@ async def search_products(query: str, db: Database) -> List[Dict]:
     """Search products by name or description."""
     try:
         query = query.lower()
-        products = await db.get_all_products()
+        products = await get_catalog(db)
         return [
             product for product in products
             if query in product['name'].lower() or query in product['description'].lower()
@@ -1,12 +1,236 @@
 import aiosqlite
+import asyncio
 import json
 import logging
 import os
 from pathlib import Path
 from typing import List, Dict, Any
+from .metrics import instrument_methods
+from .query_log import ProfiledConnection
 
 logger = logging.getLogger(__name__)
 
+# Daily sales rollups read by the admin dashboard. Triggers keep them in step with
+# order status changes made by either the bot or the dashboard: an order counts
+# as a sale on its completed_at day once it leaves 'pending', and is reversed on
+# that same day if it is later cancelled.
+SALES_ROLLUP_SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS sales_daily_product (
+        day TEXT NOT NULL,
+        product_id INTEGER NOT NULL,
+        quantity INTEGER NOT NULL DEFAULT 0,
+        revenue REAL NOT NULL DEFAULT 0,
+        PRIMARY KEY (day, product_id)
+    );
+    CREATE TABLE IF NOT EXISTS sales_daily_platform (
+        day TEXT NOT NULL,
+        platform TEXT NOT NULL,
+        quantity INTEGER NOT NULL DEFAULT 0,
+        revenue REAL NOT NULL DEFAULT 0,
+        PRIMARY KEY (day, platform)
+    );
+    CREATE TABLE IF NOT EXISTS sales_daily_totals (
+        day TEXT PRIMARY KEY,
+        order_count INTEGER NOT NULL DEFAULT 0,
+        revenue REAL NOT NULL DEFAULT 0
+    );
+
+    DROP TRIGGER IF EXISTS trg_orders_sale_recorded;
+    CREATE TRIGGER trg_orders_sale_recorded
+    AFTER UPDATE OF status ON orders
+    WHEN old.status IN ('pending', 'cancelled') AND new.status NOT IN ('pending', 'cancelled')
+    BEGIN
+        UPDATE orders SET completed_at = datetime('now') WHERE id = new.id AND completed_at IS NULL;
+        INSERT INTO sales_daily_product (day, product_id, quantity, revenue)
+        SELECT (SELECT date(completed_at) FROM orders WHERE id = new.id), oi.product_id, SUM(oi.quantity), SUM(oi.quantity * oi.price)
+        FROM order_items oi WHERE oi.order_id = new.id GROUP BY oi.product_id
+        ON CONFLICT(day, product_id) DO UPDATE SET
+            quantity = quantity + excluded.quantity, revenue = revenue + excluded.revenue;
+        INSERT INTO sales_daily_platform (day, platform, quantity, revenue)
+        SELECT (SELECT date(completed_at) FROM orders WHERE id = new.id), COALESCE(p.platform, ''), SUM(oi.quantity), SUM(oi.quantity * oi.price)
+        FROM order_items oi JOIN products p ON p.id = oi.product_id
+        WHERE oi.order_id = new.id GROUP BY COALESCE(p.platform, '')
+        ON CONFLICT(day, platform) DO UPDATE SET
+            quantity = quantity + excluded.quantity, revenue = revenue + excluded.revenue;
+        INSERT INTO sales_daily_totals (day, order_count, revenue)
+        VALUES ((SELECT date(completed_at) FROM orders WHERE id = new.id), 1, new.total_price)
+        ON CONFLICT(day) DO UPDATE SET
+            order_count = order_count + 1, revenue = revenue + excluded.revenue;
+    END;
+
+    DROP TRIGGER IF EXISTS trg_orders_sale_reversed;
+    CREATE TRIGGER trg_orders_sale_reversed
+    AFTER UPDATE OF status ON orders
+    WHEN old.status NOT IN ('pending', 'cancelled') AND new.status IN ('pending', 'cancelled')
+    BEGIN
+        INSERT INTO sales_daily_product (day, product_id, quantity, revenue)
+        SELECT date(COALESCE(old.completed_at, 'now')), oi.product_id, -SUM(oi.quantity), -SUM(oi.quantity * oi.price)
+        FROM order_items oi WHERE oi.order_id = new.id GROUP BY oi.product_id
+        ON CONFLICT(day, product_id) DO UPDATE SET
+            quantity = quantity + excluded.quantity, revenue = revenue + excluded.revenue;
+        INSERT INTO sales_daily_platform (day, platform, quantity, revenue)
+        SELECT date(COALESCE(old.completed_at, 'now')), COALESCE(p.platform, ''), -SUM(oi.quantity), -SUM(oi.quantity * oi.price)
+        FROM order_items oi JOIN products p ON p.id = oi.product_id
+        WHERE oi.order_id = new.id GROUP BY COALESCE(p.platform, '')
+        ON CONFLICT(day, platform) DO UPDATE SET
+            quantity = quantity + excluded.quantity, revenue = revenue + excluded.revenue;
+        INSERT INTO sales_daily_totals (day, order_count, revenue)
+        VALUES (date(COALESCE(old.completed_at, 'now')), -1, -new.total_price)
+        ON CONFLICT(day) DO UPDATE SET
+            order_count = order_count - 1, revenue = revenue + excluded.revenue;
+    END;
+'''
+
+# Rebuilds the rollups from the orders history
+SALES_ROLLUP_BACKFILL = '''
+    DELETE FROM sales_daily_product;
+    DELETE FROM sales_daily_platform;
+    DELETE FROM sales_daily_totals;
+    INSERT INTO sales_daily_product (day, product_id, quantity, revenue)
+    SELECT date(COALESCE(o.completed_at, o.created_at, 'now')) AS sale_day, oi.product_id,
+           SUM(oi.quantity), SUM(oi.quantity * oi.price)
+    FROM orders o JOIN order_items oi ON oi.order_id = o.id
+    WHERE o.status NOT IN ('pending', 'cancelled')
+    GROUP BY sale_day, oi.product_id;
+    INSERT INTO sales_daily_platform (day, platform, quantity, revenue)
+    SELECT date(COALESCE(o.completed_at, o.created_at, 'now')) AS sale_day, COALESCE(p.platform, ''),
+           SUM(oi.quantity), SUM(oi.quantity * oi.price)
+    FROM orders o JOIN order_items oi ON oi.order_id = o.id JOIN products p ON p.id = oi.product_id
+    WHERE o.status NOT IN ('pending', 'cancelled')
+    GROUP BY sale_day, COALESCE(p.platform, '');
+    INSERT INTO sales_daily_totals (day, order_count, revenue)
+    SELECT date(COALESCE(o.completed_at, o.created_at, 'now')) AS sale_day, COUNT(*), SUM(o.total_price)
+    FROM orders o
+    WHERE o.status NOT IN ('pending', 'cancelled')
+    GROUP BY sale_day;
+'''
+
+# Old orders are moved to archive.db (same orders and order_items schema) by the
+# admin dashboard's archival job. archive_totals keeps the number of rows moved
+# per table, so totals such as the order count stay whole without reading the
+# archive. While rebuilding rollups, these temp views shadow the hot tables with
+# both databases, so archived sales still count.
+ARCHIVE_TOTALS_SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS archive_totals (
+        table_name TEXT PRIMARY KEY,
+        row_count INTEGER NOT NULL DEFAULT 0
+    );
+'''
+ARCHIVE_UNION_VIEWS = '''
+    CREATE TEMP VIEW IF NOT EXISTS orders AS
+        SELECT * FROM main.orders UNION ALL SELECT * FROM archive.orders;
+    CREATE TEMP VIEW IF NOT EXISTS order_items AS
+        SELECT * FROM main.order_items UNION ALL SELECT * FROM archive.order_items;
+'''
+
+# Change log tailed by the admin dashboard's live feed. Triggers record order and
+# stock changes from any writer; the table keeps roughly the last 10000 entries.
+CHANGE_LOG_SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS change_log (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        kind TEXT NOT NULL,
+        payload TEXT NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+
+    DROP TRIGGER IF EXISTS trg_change_log_order_created;
+    CREATE TRIGGER trg_change_log_order_created
+    AFTER INSERT ON orders
+    BEGIN
+        INSERT INTO change_log (kind, payload) VALUES ('order_created', json_object(
+            'id', new.id, 'user_id', new.user_id, 'total_price', new.total_price, 'status', new.status
+        ));
+    END;
+
+    DROP TRIGGER IF EXISTS trg_change_log_order_status;
+    CREATE TRIGGER trg_change_log_order_status
+    AFTER UPDATE OF status ON orders
+    WHEN old.status IS NOT new.status
+    BEGIN
+        INSERT INTO change_log (kind, payload) VALUES ('order_status', json_object(
+            'id', new.id, 'user_id', new.user_id, 'total_price', new.total_price,
+            'old_status', old.status, 'status', new.status,
+            'month', strftime('%Y-%m', COALESCE(old.completed_at, 'now'))
+        ));
+    END;
+
+    DROP TRIGGER IF EXISTS trg_change_log_stock;
+    CREATE TRIGGER trg_change_log_stock
+    AFTER UPDATE OF stock ON products
+    WHEN old.stock IS NOT new.stock
+    BEGIN
+        INSERT INTO change_log (kind, payload) VALUES ('stock_changed', json_object(
+            'id', new.id, 'name', new.name, 'platform', new.platform,
+            'stock', new.stock, 'previous', old.stock
+        ));
+    END;
+
+    DROP TRIGGER IF EXISTS trg_change_log_prune;
+    CREATE TRIGGER trg_change_log_prune
+    AFTER INSERT ON change_log
+    WHEN new.id % 1000 = 0
+    BEGIN
+        DELETE FROM change_log WHERE id <= new.id - 10000;
+    END;
+'''
+
+# Units held for pending orders between confirm_order and checkout, so buyers
+# typing their details cannot be outsold. A product's available stock is its
+# stock minus unexpired holds. Holds are dropped when their order leaves
+# 'pending' (completion deducts the stock first) and swept once they expire.
+STOCK_HOLDS_SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS stock_holds (
+        order_id INTEGER NOT NULL,
+        product_id INTEGER NOT NULL,
+        quantity INTEGER NOT NULL,
+        expires_at TIMESTAMP NOT NULL,
+        PRIMARY KEY (order_id, product_id),
+        FOREIGN KEY(order_id) REFERENCES orders(id),
+        FOREIGN KEY(product_id) REFERENCES products(id)
+    );
+    -- Covers the per-product sum of active holds without reading the table
+    CREATE INDEX IF NOT EXISTS idx_stock_holds_product ON stock_holds(product_id, expires_at, quantity);
+    CREATE INDEX IF NOT EXISTS idx_stock_holds_expires ON stock_holds(expires_at);
+
+    DROP TRIGGER IF EXISTS trg_stock_holds_release;
+    CREATE TRIGGER trg_stock_holds_release
+    AFTER UPDATE OF status ON orders
+    WHEN old.status = 'pending' AND new.status IS NOT 'pending'
+    BEGIN
+        DELETE FROM stock_holds WHERE order_id = new.id;
+    END;
+
+    DROP TRIGGER IF EXISTS trg_stock_holds_order_deleted;
+    CREATE TRIGGER trg_stock_holds_order_deleted
+    AFTER DELETE ON orders
+    BEGIN
+        DELETE FROM stock_holds WHERE order_id = old.id;
+    END;
+'''
+
+# Units of product `p` held by unexpired reservations
+HELD_STOCK = '''(
+    SELECT COALESCE(SUM(h.quantity), 0) FROM stock_holds h
+    WHERE h.product_id = p.id AND h.expires_at > datetime('now')
+)'''
+
+# Outcomes of Database.complete_order
+ORDER_COMPLETED = 'completed'
+ORDER_NOT_PENDING = 'not_pending'
+ORDER_OUT_OF_STOCK = 'out_of_stock'
+
+# How long confirm_order holds stock while the buyer enters their details
+STOCK_HOLD_MINUTES = int(os.environ.get('STOCK_HOLD_MINUTES', 30))
+
+# Abandoned checkouts: pending orders older than this are cancelled, and carts
+# untouched for CART_MAX_IDLE_DAYS are emptied
+PENDING_ORDER_MAX_AGE_HOURS = float(os.environ.get('PENDING_ORDER_MAX_AGE_HOURS', 24))
+CART_MAX_IDLE_DAYS = float(os.environ.get('CART_MAX_IDLE_DAYS', 30))
+
+# Rows changed per transaction by the stale data sweeps, keeping each write lock short
+SWEEP_BATCH_SIZE = int(os.environ.get('SWEEP_BATCH_SIZE', 200))
+
+@instrument_methods
 class Database:
     def __init__(self, db_path: str = None):
         if db_path is None:
@@ -16,13 +240,22 @@ class Database:
             # Ensure the directory exists
             base_dir.mkdir(exist_ok=True)
         self.db_path = db_path
-        logger.info(f"Database path set to: {self.db_path}")
-    
+        self.archive_path = os.environ.get(
+            'ARCHIVE_DB_PATH', os.path.join(os.path.dirname(os.path.abspath(db_path)), 'archive.db')
+        )
+        logger.info("Database path set to: %s", self.db_path)
+
+    def connect(self) -> aiosqlite.Connection:
+        """Open a connection whose statements are timed into the slow-query log."""
+        return aiosqlite.connect(self.db_path, factory=ProfiledConnection)
+
     async def initialize(self):
         """Initialize the database and create tables."""
         try:
-            async with aiosqlite.connect(self.db_path) as conn:
+            async with self.connect() as conn:
                 await conn.execute("PRAGMA foreign_keys = ON")
+                # WAL is persistent: admin reports read from snapshots without blocking checkout writes
+                await conn.execute("PRAGMA journal_mode = WAL")
                 # Users table
                 await conn.execute('''
                     CREATE TABLE IF NOT EXISTS users (
@@ -50,6 +283,7 @@ class Database:
                         user_id INTEGER NOT NULL,
                         product_id INTEGER NOT NULL,
                         quantity INTEGER NOT NULL,
+                        updated_at TIMESTAMP,
                         PRIMARY KEY (user_id, product_id),
                         FOREIGN KEY(user_id) REFERENCES users(id),
                         FOREIGN KEY(product_id) REFERENCES products(id)
@@ -63,6 +297,8 @@ class Database:
                         total_price REAL NOT NULL,
                         status TEXT NOT NULL,
                         user_details TEXT,
+                        created_at TIMESTAMP,
+                        completed_at TIMESTAMP,
                         FOREIGN KEY(user_id) REFERENCES users(id)
                     )
                 ''')
@@ -78,19 +314,84 @@ class Database:
                         FOREIGN KEY(product_id) REFERENCES products(id)
                     )
                 ''')
+                # Timestamp columns for databases created before orders were dated. Existing
+                # rows carry no time information, so they are stamped with the migration time.
+                cursor = await conn.execute("PRAGMA table_info(orders)")
+                order_columns = {row[1] for row in await cursor.fetchall()}
+                timestamps_added = False
+                for column in ('created_at', 'completed_at'):
+                    if column not in order_columns:
+                        await conn.execute(f"ALTER TABLE orders ADD COLUMN {column} TIMESTAMP")
+                        timestamps_added = True
+                if timestamps_added:
+                    await conn.execute("UPDATE orders SET created_at = datetime('now') WHERE created_at IS NULL")
+                    await conn.execute('''
+                        UPDATE orders SET completed_at = created_at
+                        WHERE completed_at IS NULL AND status NOT IN ('pending', 'cancelled')
+                    ''')
+                await conn.execute('CREATE INDEX IF NOT EXISTS idx_orders_created_at ON orders(created_at)')
+                await conn.execute('CREATE INDEX IF NOT EXISTS idx_orders_completed_at ON orders(completed_at)')
+                # Indexes for the admin dashboard's filtered, id-ordered order listings
+                await conn.execute('CREATE INDEX IF NOT EXISTS idx_orders_status ON orders(status, id)')
+                await conn.execute('CREATE INDEX IF NOT EXISTS idx_orders_user ON orders(user_id, id)')
+                # Partial index so the abandoned-order sweep only reads pending orders
+                await conn.execute(
+                    "CREATE INDEX IF NOT EXISTS idx_orders_pending_created ON orders(created_at) WHERE status = 'pending'"
+                )
+                # Last-touched time for carts, so abandoned carts can be pruned
+                cursor = await conn.execute("PRAGMA table_info(cart)")
+                if 'updated_at' not in {row[1] for row in await cursor.fetchall()}:
+                    await conn.execute("ALTER TABLE cart ADD COLUMN updated_at TIMESTAMP")
+                    await conn.execute("UPDATE cart SET updated_at = datetime('now')")
+                await conn.execute('CREATE INDEX IF NOT EXISTS idx_cart_updated_at ON cart(updated_at)')
                 await conn.commit()
-            logger.info(f"Database initialized at {self.db_path}")
+                # Sales rollup tables and the triggers that maintain them
+                cursor = await conn.execute(
+                    "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sales_daily_totals'"
+                )
+                rollups_exist = await cursor.fetchone() is not None
+                await conn.executescript(SALES_ROLLUP_SCHEMA)
+                await conn.executescript(ARCHIVE_TOTALS_SCHEMA)
+                if not rollups_exist or timestamps_added:
+                    await self._backfill_rollups(conn)
+                # Change log for the admin dashboard's live feed
+                await conn.executescript(CHANGE_LOG_SCHEMA)
+                # Stock reservations for pending orders
+                await conn.executescript(STOCK_HOLDS_SCHEMA)
+            logger.info("Database initialized at %s", self.db_path)
         except aiosqlite.OperationalError as e:
-            logger.error(f"Database error: {e}", exc_info=True)
+            logger.error("Database error: %s", e, exc_info=True)
             raise
         except Exception as e:
-            logger.error(f"Unexpected error initializing database: {e}", exc_info=True)
+            logger.error("Unexpected error initializing database: %s", e, exc_info=True)
             raise
     
+    async def backfill_sales_rollups(self) -> None:
+        """Rebuild the daily sales rollup tables from the order history."""
+        try:
+            async with self.connect() as conn:
+                await self._backfill_rollups(conn)
+            logger.info("Rebuilt daily sales rollups")
+        except Exception as e:
+            logger.error("Error rebuilding daily sales rollups: %s", e, exc_info=True)
+            raise
+    
+    async def _backfill_rollups(self, conn: aiosqlite.Connection) -> None:
+        """Rebuild the rollups on `conn`, counting archived orders when there is an archive."""
+        archived = os.path.exists(self.archive_path)
+        if archived:
+            await conn.execute("ATTACH DATABASE ? AS archive", (self.archive_path,))
+            await conn.executescript(ARCHIVE_UNION_VIEWS)
+        try:
+            await conn.executescript(f"BEGIN; {SALES_ROLLUP_BACKFILL} COMMIT;")
+        finally:
+            if archived:
+                await conn.executescript("DROP VIEW temp.orders; DROP VIEW temp.order_items; DETACH DATABASE archive;")
+    
     async def add_to_cart(self, user_id: int, product_id: int, quantity: int) -> None:
         """Add or update a product in the user's cart."""
         try:
-            async with aiosqlite.connect(self.db_path) as conn:
+            async with self.connect() as conn:
                 # Check if the product is already in the cart
                 cursor = await conn.execute('''
                     SELECT quantity FROM cart
@@ -101,31 +402,32 @@ class Database:
                     new_quantity = row[0] + quantity
                     await conn.execute('''
                         UPDATE cart
-                        SET quantity = ?
+                        SET quantity = ?, updated_at = datetime('now')
                         WHERE user_id = ? AND product_id = ?
                     ''', (new_quantity, user_id, product_id))
                 else:
                     await conn.execute('''
-                        INSERT INTO cart (user_id, product_id, quantity)
-                        VALUES (?, ?, ?)
+                        INSERT INTO cart (user_id, product_id, quantity, updated_at)
+                        VALUES (?, ?, ?, datetime('now'))
                     ''', (user_id, product_id, quantity))
                 await conn.commit()
         except aiosqlite.OperationalError as e:
-            logger.error(f"Database error adding to cart for user {user_id}: {e}", exc_info=True)
+            logger.error("Database error adding to cart for user %s: %s", user_id, e, exc_info=True)
             raise
         except Exception as e:
-            logger.error(f"Error adding to cart for user {user_id}: {e}", exc_info=True)
+            logger.error("Error adding to cart for user %s: %s", user_id, e, exc_info=True)
             raise
 
     # database.py (add to the Database class, e.g., after the initialize method)
     async def get_all_products(self) -> List[Dict[str, Any]]:
         """Retrieve all products from the database."""
         try:
-            async with aiosqlite.connect(self.db_path) as conn:
+            async with self.connect() as conn:
                 conn.row_factory = aiosqlite.Row
-                cursor = await conn.execute('''
-                    SELECT id, name, platform, price, stock, description, image_url
-                    FROM products
+                cursor = await conn.execute(f'''
+                    SELECT p.id, p.name, p.platform, p.price, p.stock, p.description, p.image_url,
+                        p.stock - {HELD_STOCK} AS available
+                    FROM products p
                 ''')
                 rows = await cursor.fetchall()
                 return [
@@ -135,38 +437,40 @@ class Database:
                         'platform': json.loads(row['platform']),
                         'price': float(row['price']),
                         'stock': row['stock'],
+                        'available': max(row['available'], 0),
                         'description': row['description'],
                         'image_url': row['image_url']
                     } for row in rows
                 ]
         except aiosqlite.OperationalError as e:
-            logger.error(f"Database error retrieving products: {e}", exc_info=True)
+            logger.error("Database error retrieving products: %s", e, exc_info=True)
             raise
         except Exception as e:
-            logger.error(f"Error retrieving all products: {e}", exc_info=True)
+            logger.error("Error retrieving all products: %s", e, exc_info=True)
             raise
 
     async def add_user(self, user_id: int, username: str, first_name: str, last_name: str) -> None:
             """Add or update a user."""
             try:
-                async with aiosqlite.connect(self.db_path) as conn:
+                async with self.connect() as conn:
                     await conn.execute('''
                         INSERT OR REPLACE INTO users (id, username, first_name, last_name)
                         VALUES (?, ?, ?, ?)
                     ''', (user_id, username, first_name, last_name))
                     await conn.commit()
-                logger.info(f"Added/updated user {user_id}")
+                logger.info("Added/updated user %s", user_id)
             except Exception as e:
-                logger.error(f"Error adding user {user_id}: {e}", exc_info=True)
+                logger.error("Error adding user %s: %s", user_id, e, exc_info=True)
                 raise
 
     async def get_product(self, product_id: int) -> Dict[str, Any]:
             """Retrieve a product by ID."""
             try:
-                async with aiosqlite.connect(self.db_path) as conn:
-                    cursor = await conn.execute('''
-                        SELECT id, name, platform, price, stock, description, image_url
-                        FROM products WHERE id = ?
+                async with self.connect() as conn:
+                    cursor = await conn.execute(f'''
+                        SELECT p.id, p.name, p.platform, p.price, p.stock, p.description, p.image_url,
+                            p.stock - {HELD_STOCK}
+                        FROM products p WHERE p.id = ?
                     ''', (product_id,))
                     row = await cursor.fetchone()
                     if row:
@@ -176,18 +480,19 @@ class Database:
                             'platform': json.loads(row[2]),
                             'price': row[3],  # e.g., "$59.99"
                             'stock': row[4],
+                            'available': max(row[7], 0),
                             'description': row[5],
                             'image_url': row[6]
                         }
                     return None
             except Exception as e:
-                logger.error(f"Error retrieving product {product_id}: {e}", exc_info=True)
+                logger.error("Error retrieving product %s: %s", product_id, e, exc_info=True)
                 raise
 
     async def get_cart(self, user_id: int) -> List[Dict[str, Any]]:
         """Retrieve all items in the user's cart."""
         try:
-            async with aiosqlite.connect(self.db_path) as conn:
+            async with self.connect() as conn:
                 conn.row_factory = aiosqlite.Row
                 cursor = await conn.execute('''
                     SELECT c.user_id, c.product_id, c.quantity,
@@ -212,127 +517,274 @@ class Database:
                     } for row in rows
                 ]
         except aiosqlite.OperationalError as e:
-            logger.error(f"Database error retrieving cart for user {user_id}: {e}", exc_info=True)
+            logger.error("Database error retrieving cart for user %s: %s", user_id, e, exc_info=True)
             raise
         except Exception as e:
-            logger.error(f"Error retrieving cart for user {user_id}: {e}", exc_info=True)
+            logger.error("Error retrieving cart for user %s: %s", user_id, e, exc_info=True)
             raise
 
     async def remove_from_cart(self, user_id: int, product_id: int) -> None:
             """Remove product from user's cart."""
             try:
-                async with aiosqlite.connect(self.db_path) as conn:
+                async with self.connect() as conn:
                     await conn.execute('''
                         DELETE FROM cart
                         WHERE user_id = ? AND product_id = ?
                     ''', (user_id, product_id))
                     await conn.commit()
-                logger.info(f"Removed product {product_id} from cart for user {user_id}")
+                logger.info("Removed product %s from cart for user %s", product_id, user_id)
             except Exception as e:
-                logger.error(f"Error removing product {product_id} from cart for user {user_id}: {e}", exc_info=True)
+                logger.error("Error removing product %s from cart for user %s: %s", product_id, user_id, e, exc_info=True)
                 raise
 
     async def clear_cart(self, user_id: int) -> None:
             """Clear user's cart."""
             try:
-                async with aiosqlite.connect(self.db_path) as conn:
+                async with self.connect() as conn:
                     await conn.execute('''
                         DELETE FROM cart
                         WHERE user_id = ?
                     ''', (user_id,))
                     await conn.commit()
-                logger.info(f"Cleared cart for user {user_id}")
+                logger.info("Cleared cart for user %s", user_id)
             except Exception as e:
-                logger.error(f"Error clearing cart for user {user_id}: {e}", exc_info=True)
+                logger.error("Error clearing cart for user %s: %s", user_id, e, exc_info=True)
                 raise
 
     async def create_order(self, user_id: int, total_price: float, cart_items: List[Dict[str, Any]]) -> int:
-            """Create an order from cart items."""
+            """Create a pending order from cart items and hold their stock.
+
+            Raises ValueError, without creating anything, if an item has less
+            available stock than the cart asks for.
+            """
             try:
-                async with aiosqlite.connect(self.db_path) as conn:
-                    # Insert order
-                    cursor = await conn.execute('''
-                        INSERT INTO orders (user_id, total_price, status)
-                        VALUES (?, ?, ?)
-                    ''', (user_id, total_price, 'pending'))
-                    order_id = cursor.lastrowid
-                    
-                    # Insert order items
-                    for item in cart_items:
-                        await conn.execute('''
+                async with self.connect() as conn:
+                    # Take the write lock first so the availability check and the holds are atomic
+                    await conn.execute("BEGIN IMMEDIATE")
+                    try:
+                        for item in cart_items:
+                            cursor = await conn.execute(f'''
+                                SELECT p.name, p.stock - {HELD_STOCK} FROM products p WHERE p.id = ?
+                            ''', (item['product_id'],))
+                            row = await cursor.fetchone()
+                            if not row:
+                                raise ValueError(f"Product {item['product_id']} is no longer available")
+                            if row[1] < item['quantity']:
+                                raise ValueError(f"Only {max(row[1], 0)} units of {row[0]} available")
+                        
+                        # Insert order
+                        cursor = await conn.execute('''
+                            INSERT INTO orders (user_id, total_price, status, created_at)
+                            VALUES (?, ?, ?, datetime('now'))
+                        ''', (user_id, total_price, 'pending'))
+                        order_id = cursor.lastrowid
+                        
+                        # Insert order items and their holds
+                        await conn.executemany('''
                             INSERT INTO order_items (order_id, product_id, quantity, price)
                             VALUES (?, ?, ?, ?)
-                        ''', (order_id, item['product_id'], item['quantity'], item['price']))
-                    
-                    await conn.commit()
-                logger.info(f"Created order {order_id} for user {user_id}")
+                        ''', [(order_id, item['product_id'], item['quantity'], item['price']) for item in cart_items])
+                        await conn.executemany('''
+                            INSERT INTO stock_holds (order_id, product_id, quantity, expires_at)
+                            VALUES (?, ?, ?, datetime('now', ?))
+                        ''', [
+                            (order_id, item['product_id'], item['quantity'], f"+{STOCK_HOLD_MINUTES} minutes")
+                            for item in cart_items
+                        ])
+                        
+                        await conn.commit()
+                    except Exception:
+                        await conn.rollback()
+                        raise
+                logger.info("Created order %s for user %s", order_id, user_id)
                 return order_id
+            except ValueError as e:
+                logger.warning("Not enough stock to create order for user %s: %s", user_id, e)
+                raise
             except Exception as e:
-                logger.error(f"Error creating order for user {user_id}: {e}", exc_info=True)
+                logger.error("Error creating order for user %s: %s", user_id, e, exc_info=True)
                 raise
 
-    async def update_order_details(self, order_id: int, details: Dict[str, Any]) -> None:
-            """Update order with user details."""
+    async def complete_order(self, order_id: int, details: Dict[str, Any]) -> str:
+            """Complete a pending order with user details, turning its holds into stock deductions.
+
+            An item whose hold has expired is still taken if enough stock is
+            available. Returns ORDER_COMPLETED, or, leaving everything unchanged,
+            ORDER_NOT_PENDING if the order is no longer pending (for example an
+            admin already moved it on) or ORDER_OUT_OF_STOCK if an item is short.
+            """
             try:
-                async with aiosqlite.connect(self.db_path) as conn:
-                    await conn.execute('''
-                        UPDATE orders
-                        SET user_details = ?, status = 'completed'
-                        WHERE id = ?
-                    ''', (json.dumps(details), order_id))
-                    await conn.commit()
-                logger.info(f"Updated order {order_id} with user details")
+                async with self.connect() as conn:
+                    await conn.execute("BEGIN IMMEDIATE")
+                    try:
+                        cursor = await conn.execute("SELECT status FROM orders WHERE id = ?", (order_id,))
+                        row = await cursor.fetchone()
+                        if not row or row[0] != 'pending':
+                            logger.warning("Order %s is not pending and cannot be completed", order_id)
+                            await conn.rollback()
+                            return ORDER_NOT_PENDING
+                        # Stock available to this order: everything not held by other orders
+                        cursor = await conn.execute(f'''
+                            SELECT oi.product_id, oi.quantity,
+                                p.stock - {HELD_STOCK} + COALESCE((
+                                    SELECT h.quantity FROM stock_holds h
+                                    WHERE h.order_id = oi.order_id AND h.product_id = oi.product_id
+                                        AND h.expires_at > datetime('now')
+                                ), 0)
+                            FROM order_items oi
+                            JOIN products p ON p.id = oi.product_id
+                            WHERE oi.order_id = ?
+                        ''', (order_id,))
+                        items = await cursor.fetchall()
+                        for product_id, quantity, available in items:
+                            if available < quantity:
+                                logger.warning("Insufficient stock for product %s in order %s: %s available, %s requested", product_id, order_id, available, quantity)
+                                await conn.rollback()
+                                return ORDER_OUT_OF_STOCK
+                        await conn.executemany('''
+                            UPDATE products
+                            SET stock = stock - ?
+                            WHERE id = ?
+                        ''', [(quantity, product_id) for product_id, quantity, _ in items])
+                        # Leaving 'pending' drops the order's holds (trg_stock_holds_release)
+                        await conn.execute('''
+                            UPDATE orders
+                            SET user_details = ?, status = 'completed', completed_at = datetime('now')
+                            WHERE id = ?
+                        ''', (json.dumps(details), order_id))
+                        await conn.commit()
+                    except Exception:
+                        await conn.rollback()
+                        raise
+                logger.info("Completed order %s and deducted stock for %s item(s)", order_id, len(items))
+                return ORDER_COMPLETED
             except Exception as e:
-                logger.error(f"Error updating order {order_id} details: {e}", exc_info=True)
+                logger.error("Error completing order %s: %s", order_id, e, exc_info=True)
                 raise
 
-    async def cancel_order(self, order_id: int) -> None:
-            """Cancel an order."""
+    async def cancel_order(self, order_id: int) -> bool:
+            """Cancel a pending order, releasing any stock it holds.
+
+            Returns False, changing nothing, if the order is no longer pending:
+            a completed order keeps its sale and its stock deduction.
+            """
             try:
-                async with aiosqlite.connect(self.db_path) as conn:
-                    await conn.execute('''
+                async with self.connect() as conn:
+                    cursor = await conn.execute('''
                         UPDATE orders
                         SET status = 'cancelled'
-                        WHERE id = ?
+                        WHERE id = ? AND status = 'pending'
                     ''', (order_id,))
                     await conn.commit()
-                logger.info(f"Cancelled order {order_id}")
+                    cancelled = cursor.rowcount == 1
+                if cancelled:
+                    logger.info("Cancelled order %s", order_id)
+                else:
+                    logger.warning("Order %s is not pending and was not cancelled", order_id)
+                return cancelled
             except Exception as e:
-                logger.error(f"Error cancelling order {order_id}: {e}", exc_info=True)
+                logger.error("Error cancelling order %s: %s", order_id, e, exc_info=True)
                 raise
 
-    async def deduct_stock(self, product_id: int, quantity: int) -> bool:
-        """Deduct the specified quantity from the product's stock."""
+    async def release_expired_holds(self) -> int:
+        """Delete stock holds whose TTL has passed and return how many were released."""
         try:
-            async with aiosqlite.connect(self.db_path) as conn:
-                # Check current stock
+            async with self.connect() as conn:
                 cursor = await conn.execute('''
-                    SELECT stock FROM products
-                    WHERE id = ?
-                ''', (product_id,))
-                row = await cursor.fetchone()
-                if not row:
-                    logger.error(f"Product {product_id} not found for stock deduction")
-                    return False
-
-                current_stock = row[0]
-                if current_stock < quantity:
-                    logger.warning(f"Insufficient stock for product {product_id}: {current_stock} available, {quantity} requested")
-                    return False
-
-                # Deduct stock
-                new_stock = current_stock - quantity
-                await conn.execute('''
-                    UPDATE products
-                    SET stock = ?
-                    WHERE id = ?
-                ''', (new_stock, product_id))
+                    DELETE FROM stock_holds
+                    WHERE expires_at <= datetime('now')
+                ''')
                 await conn.commit()
-                logger.info(f"Deducted {quantity} from stock of product {product_id}. New stock: {new_stock}")
-                return True
+                released = cursor.rowcount
+            if released:
+                logger.info("Released %s expired stock hold(s)", released)
+            return released
         except aiosqlite.OperationalError as e:
-            logger.error(f"Database error deducting stock for product {product_id}: {e}", exc_info=True)
+            logger.error("Database error releasing expired stock holds: %s", e, exc_info=True)
+            raise
+        except Exception as e:
+            logger.error("Error releasing expired stock holds: %s", e, exc_info=True)
+            raise
+
+    async def expire_pending_orders(self, max_age_hours: float = PENDING_ORDER_MAX_AGE_HOURS, batch_size: int = SWEEP_BATCH_SIZE) -> int:
+        """Cancel orders left pending for longer than `max_age_hours`, a batch per transaction.
+
+        Returns how many orders were expired. Their stock holds are released by
+        the status change.
+        """
+        expired = 0
+        try:
+            async with self.connect() as conn:
+                while True:
+                    await conn.execute("BEGIN IMMEDIATE")
+                    try:
+                        # Pinned to the partial index: without ANALYZE stats the planner
+                        # prefers idx_orders_status and sorts every pending order
+                        cursor = await conn.execute('''
+                            UPDATE orders
+                            SET status = 'cancelled'
+                            WHERE id IN (
+                                SELECT id FROM orders INDEXED BY idx_orders_pending_created
+                                WHERE status = 'pending' AND created_at < datetime('now', ?)
+                                ORDER BY created_at
+                                LIMIT ?
+                            )
+                        ''', (f"-{max_age_hours} hours", batch_size))
+                        await conn.commit()
+                    except Exception:
+                        await conn.rollback()
+                        raise
+                    expired += cursor.rowcount
+                    if cursor.rowcount < batch_size:
+                        break
+                    # Let checkout writes in between batches
+                    await asyncio.sleep(0)
+            if expired:
+                logger.info("Expired %s pending order(s) older than %s hours", expired, max_age_hours)
+            return expired
+        except Exception as e:
+            logger.error("Error expiring pending orders: %s", e, exc_info=True)
             raise
+
+    async def prune_stale_carts(self, max_idle_days: float = CART_MAX_IDLE_DAYS, batch_size: int = SWEEP_BATCH_SIZE) -> int:
+        """Empty the carts of users who have not touched them in `max_idle_days`.
+
+        Works a batch of users per transaction and returns how many cart rows
+        were removed.
+        """
+        removed = 0
+        cutoff = f"-{max_idle_days} days"
+        try:
+            async with self.connect() as conn:
+                while True:
+                    await conn.execute("BEGIN IMMEDIATE")
+                    try:
+                        # A cart is stale only if none of its rows were touched since the cutoff
+                        cursor = await conn.execute('''
+                            SELECT DISTINCT user_id FROM cart
+                            WHERE updated_at < datetime('now', ?)
+                                AND user_id NOT IN (
+                                    SELECT user_id FROM cart WHERE updated_at >= datetime('now', ?)
+                                )
+                            LIMIT ?
+                        ''', (cutoff, cutoff, batch_size))
+                        user_ids = [row[0] for row in await cursor.fetchall()]
+                        if user_ids:
+                            placeholders = ', '.join('?' * len(user_ids))
+                            cursor = await conn.execute(
+                                f"DELETE FROM cart WHERE user_id IN ({placeholders})", user_ids
+                            )
+                            removed += cursor.rowcount
+                        await conn.commit()
+                    except Exception:
+                        await conn.rollback()
+                        raise
+                    if len(user_ids) < batch_size:
+                        break
+                    await asyncio.sleep(0)
+            if removed:
+                logger.info("Pruned %s cart row(s) idle for more than %s days", removed, max_idle_days)
+            return removed
         except Exception as e:
-            logger.error(f"Error deducting stock for product {product_id}: {e}", exc_info=True)
+            logger.error("Error pruning stale carts: %s", e, exc_info=True)
             raise
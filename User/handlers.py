@@ -12,7 +12,10 @@ from telegram.ext import (
     ContextTypes,
 )
 from telegram.error import TelegramError
-from .database import Database
+from .database import Database, STOCK_HOLD_MINUTES, ORDER_NOT_PENDING, ORDER_OUT_OF_STOCK
+from .image_store import ImageStore
+from .metrics import instrument_handler
+from .tracing import tracer
 from .catalog import get_products_by_platform, get_product_by_id, search_products
 from .config import CATEGORIES
 from .utils import format_price, is_valid_ethiopian_phone
@@ -22,10 +25,13 @@ from typing import Optional
 
 # Logger setup
 logger = logging.getLogger(__name__)
+# Per-update activity lines; sampled by default (see LOG_SAMPLE in utils.py)
+activity_logger = logging.getLogger(f"{__name__}.activity")
 
 # Conversation states
 SELECT_QUANTITY, CONFIRM_ORDER, COLLECT_NAME, COLLECT_EMAIL, COLLECT_PHONE, COLLECT_ADDRESS = range(6)
 
+@instrument_handler
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Handle the /start command."""
     db = context.bot_data.get('db')
@@ -42,7 +48,7 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
             last_name=user.last_name or ""
         )
     except Exception as e:
-        logger.error(f"Failed to add user {user.id} to database: {e}", exc_info=True)
+        logger.error("Failed to add user %s to database: %s", user.id, e, exc_info=True)
         await update.message.reply_text(
             "❌ An error occurred while initializing your account. Please try again later.",
             reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🏠 Main Menu", callback_data="main_menu")]])
@@ -60,6 +66,7 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         reply_markup=reply_markup
     )
 
+@instrument_handler
 async def search_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Handle the /search command."""
     await update.message.reply_text(
@@ -69,8 +76,9 @@ async def search_command(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
             [InlineKeyboardButton("Start Search", switch_inline_query_current_chat="")]
         ])
     )
-    logger.info(f"User {update.effective_user.id} triggered /search command")
+    activity_logger.info("User %s triggered /search command", update.effective_user.id)
 
+@instrument_handler
 async def cart_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Handle the /cart command."""
     db = context.bot_data.get('db')
@@ -110,6 +118,7 @@ async def cart_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
     ])
     await update.message.reply_text(cart_text, reply_markup=InlineKeyboardMarkup(keyboard))
 
+@instrument_handler
 async def handle_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> Optional[int]:
     """Handle callback queries."""
     query = update.callback_query
@@ -124,7 +133,7 @@ async def handle_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     user_id = query.from_user.id
     is_inline = bool(query.inline_message_id)
     is_photo = query.message.photo if query.message else False
-    logger.info(f"Handling callback for user {user_id}, data: {data}, inline: {is_inline}, is_photo: {is_photo}")
+    activity_logger.info("Handling callback for user %s, data: %s, inline: %s, is_photo: %s", user_id, data, is_inline, is_photo)
     
     async def edit_or_reply(text: str, reply_markup: Optional[InlineKeyboardMarkup] = None) -> None:
         """Helper to edit inline message, photo caption, or reply in chat."""
@@ -138,7 +147,7 @@ async def handle_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
             else:
                 await context.bot.send_message(chat_id=user_id, text=text, reply_markup=reply_markup)
         except TelegramError as e:
-            logger.error(f"Error editing/replying for user {user_id}: {e}", exc_info=True)
+            logger.error("Error editing/replying for user %s: %s", user_id, e, exc_info=True)
             raise
     
     if data == "main_menu":
@@ -223,7 +232,7 @@ async def handle_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
             f"🎮 {product['name']}\n"
             f"Platform: {', '.join(product['platform'])}\n"
             f"Price: {format_price(product['price'])}\n"
-            f"Stock: {product['stock']}\n"
+            f"Stock: {product['available']}\n"
             f"Description: {product['description']}"
         )
         keyboard = [
@@ -231,40 +240,53 @@ async def handle_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
             [InlineKeyboardButton("🏠 Main Menu", callback_data="main_menu")]
         ]
         
+        image_store = context.bot_data.get('image_store')
+        if not image_store:
+            image_store = ImageStore()
+            context.bot_data['image_store'] = image_store
+        
+        # Manifest lookup only; the file is opened just below
+        image_path = image_store.product_image_path(product_id, product['image_url'])
+        if not image_path:
+            logger.warning("No stored image for product %s: %s", product_id, product['image_url'])
+            await edit_or_reply(
+                f"{caption}\n⚠️ Image not available.",
+                reply_markup=InlineKeyboardMarkup(keyboard)
+            )
+            return None
+        
         try:
-            image_path = os.path.join(os.path.dirname(__file__), product['image_url'])
-            logger.info(f"Attempting to load image for product {product_id} at: {image_path}")
-            if not os.path.exists(image_path):
-                logger.warning(f"Image not found for product {product_id}: {image_path}")
-                image_path = os.path.join(os.path.dirname(__file__), 'images/default.jpg')
-
-            with open(image_path, 'rb') as photo:
-                if is_inline:
-                    await query.edit_message_media(
-                        media=InputFile(photo, filename=f"{product['name']}.jpg"),
+            with tracer.child_span("file.read", attributes={'file.path': image_path}) as span:
+                with open(image_path, 'rb') as f:
+                    photo = f.read()
+                if span is not None:
+                    span.set_attribute('file.size', len(photo))
+            if is_inline:
+                await query.edit_message_media(
+                    media=InputFile(photo, filename=f"{product['name']}.jpg"),
+                    reply_markup=InlineKeyboardMarkup(keyboard)
+                )
+                await query.edit_message_caption(caption=caption, reply_markup=InlineKeyboardMarkup(keyboard))
+            else:
+                if query.message:
+                    await query.message.reply_photo(
+                        photo=InputFile(photo, filename=os.path.basename(image_path)),
+                        caption=caption,
                         reply_markup=InlineKeyboardMarkup(keyboard)
                     )
-                    await query.edit_message_caption(caption=caption, reply_markup=InlineKeyboardMarkup(keyboard))
+                    try:
+                        await query.message.delete()
+                    except TelegramError as e:
+                        logger.warning("Failed to delete message for product %s: %s", product_id, e)
                 else:
-                    if query.message:
-                        await query.message.reply_photo(
-                            photo=InputFile(photo),
-                            caption=caption,
-                            reply_markup=InlineKeyboardMarkup(keyboard)
-                        )
-                        try:
-                            await query.message.delete()
-                        except TelegramError as e:
-                            logger.warning(f"Failed to delete message for product {product_id}: {e}")
-                    else:
-                        await context.bot.send_photo(
-                            chat_id=user_id,
-                            photo=InputFile(photo),
-                            caption=caption,
-                            reply_markup=InlineKeyboardMarkup(keyboard)
-                        )
+                    await context.bot.send_photo(
+                        chat_id=user_id,
+                        photo=InputFile(photo, filename=os.path.basename(image_path)),
+                        caption=caption,
+                        reply_markup=InlineKeyboardMarkup(keyboard)
+                    )
         except (FileNotFoundError, TelegramError) as e:
-            logger.error(f"Error sending image for product {product_id}: {e}", exc_info=True)
+            logger.error("Error sending image for product %s: %s", product_id, e, exc_info=True)
             await edit_or_reply(
                 f"{caption}\n⚠️ Image not available.",
                 reply_markup=InlineKeyboardMarkup(keyboard)
@@ -286,7 +308,7 @@ async def handle_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         if is_inline or is_photo:
             await context.bot.send_message(
                 chat_id=user_id,
-                text=f"How many units of {product['name']} would you like to add to your cart? (Available: {product['stock']})",
+                text=f"How many units of {product['name']} would you like to add to your cart? (Available: {product['available']})",
                 reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("Cancel", callback_data="main_menu")]])
             )
             if is_inline:
@@ -302,7 +324,7 @@ async def handle_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
             return SELECT_QUANTITY
         else:
             await edit_or_reply(
-                f"How many units of {product['name']} would you like to add to your cart? (Available: {product['stock']})",
+                f"How many units of {product['name']} would you like to add to your cart? (Available: {product['available']})",
                 reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("Cancel", callback_data="main_menu")]])
             )
             return SELECT_QUANTITY
@@ -343,7 +365,7 @@ async def handle_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
             await edit_or_reply(cart_text, reply_markup=InlineKeyboardMarkup(keyboard))
             return CONFIRM_ORDER
         except Exception as e:
-            logger.error(f"Error removing product {product_id} from cart for user {user_id}: {e}", exc_info=True)
+            logger.error("Error removing product %s from cart for user %s: %s", product_id, user_id, e, exc_info=True)
             await edit_or_reply(
                 "❌ Error removing item. Please try again.",
                 reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🏠 Main Menu", callback_data="main_menu")]])
@@ -367,28 +389,28 @@ async def handle_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
             total_price += item_total
         
         try:
-            logger.info(f"Creating order for user {user_id} with {len(cart_items)} items, total: {total_price}")
+            logger.info("Creating order for user %s with %s items, total: %s", user_id, len(cart_items), total_price)
             order_id = await db.create_order(user_id, total_price, cart_items)
             context.user_data['order_id'] = order_id
             context.user_data['total_price'] = total_price
             context.user_data['cart_items'] = cart_items
-            logger.info(f"Created order {order_id} for user {user_id}")
+            logger.info("Created order %s for user %s", order_id, user_id)
             await edit_or_reply(
-                "✅ Order created! Please provide your full name.",
+                f"✅ Order created! Your items are reserved for {STOCK_HOLD_MINUTES} minutes. Please provide your full name.",
                 reply_markup=InlineKeyboardMarkup([
                     [InlineKeyboardButton("Cancel Order", callback_data="cancel_order")]
                 ])
             )
             return COLLECT_NAME
         except ValueError as e:
-            logger.error(f"Order creation failed for user {user_id}: {e}", exc_info=True)
+            logger.error("Order creation failed for user %s: %s", user_id, e, exc_info=True)
             await edit_or_reply(
                 f"❌ Order failed: {e}",
                 reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🏠 Main Menu", callback_data="main_menu")]])
             )
             return None
         except Exception as e:
-            logger.error(f"Unexpected error creating order for user {user_id}: {e}", exc_info=True)
+            logger.error("Unexpected error creating order for user %s: %s", user_id, e, exc_info=True)
             await edit_or_reply(
                 "❌ An error occurred while creating the order. Please try again.",
                 reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🏠 Main Menu", callback_data="main_menu")]])
@@ -399,14 +421,14 @@ async def handle_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         order_id = context.user_data.get('order_id')
         if order_id:
             try:
-                await db.cancel_order(order_id)
+                cancelled = await db.cancel_order(order_id)
                 context.user_data.clear()
                 await edit_or_reply(
-                    "✅ Order cancelled.",
+                    "✅ Order cancelled." if cancelled else "ℹ️ This order has already been processed and can no longer be cancelled.",
                     reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🏠 Main Menu", callback_data="main_menu")]])
                 )
             except Exception as e:
-                logger.error(f"Error cancelling order {order_id} for user {user_id}: {e}", exc_info=True)
+                logger.error("Error cancelling order %s for user %s: %s", order_id, user_id, e, exc_info=True)
                 await edit_or_reply(
                     "❌ Error cancelling order. Please try again.",
                     reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🏠 Main Menu", callback_data="main_menu")]])
@@ -418,6 +440,7 @@ async def handle_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
             )
         return None
 
+@instrument_handler
 async def select_quantity(update: Update, context: ContextTypes.DEFAULT_TYPE) -> Optional[int]:
     """Handle quantity input for adding to cart."""
     user_id = update.effective_user.id
@@ -449,8 +472,8 @@ async def select_quantity(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         quantity = int(quantity_text)
         if quantity <= 0:
             raise ValueError("Quantity must be positive")
-        if quantity > product['stock']:
-            raise ValueError(f"Only {product['stock']} units available")
+        if quantity > product['available']:
+            raise ValueError(f"Only {product['available']} units available")
         
         await db.add_to_cart(user_id, product_id, quantity)
         await update.message.reply_text(
@@ -462,27 +485,28 @@ async def select_quantity(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         )
         return ConversationHandler.END
     except ValueError as e:
-        logger.error(f"Invalid quantity input by user {user_id}: {quantity_text} - {e}", exc_info=True)
+        logger.error("Invalid quantity input by user %s: %s - %s", user_id, quantity_text, e, exc_info=True)
         await update.message.reply_text(
             f"❌ Invalid input: {e}. Please enter a valid number (e.g., 1, 2).",
             reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("Cancel", callback_data="main_menu")]])
         )
         return SELECT_QUANTITY
     except Exception as e:
-        logger.error(f"Error adding to cart for user {user_id}, product {product_id}: {e}", exc_info=True)
+        logger.error("Error adding to cart for user %s, product %s: %s", user_id, product_id, e, exc_info=True)
         await update.message.reply_text(
             "❌ An error occurred. Please try again.",
             reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🏠 Main Menu", callback_data="main_menu")]])
         )
         return ConversationHandler.END
 
+@instrument_handler
 async def collect_name(update: Update, context: ContextTypes.DEFAULT_TYPE) -> Optional[int]:
     """Collect user's full name."""
     user_id = update.effective_user.id
     order_id = context.user_data.get('order_id')
     
     if not order_id:
-        logger.error(f"No order_id found for user {user_id} in COLLECT_NAME")
+        logger.error("No order_id found for user %s in COLLECT_NAME", user_id)
         await update.message.reply_text(
             "❌ No order found. Please start a new order.",
             reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🏠 Main Menu", callback_data="main_menu")]])
@@ -498,20 +522,21 @@ async def collect_name(update: Update, context: ContextTypes.DEFAULT_TYPE) -> Op
         return COLLECT_NAME
     
     context.user_data['user_details'] = {'name': text}
-    logger.info(f"Collected name for user {user_id}, order {order_id}: {text}")
+    logger.info("Collected name for user %s, order %s", user_id, order_id)
     await update.message.reply_text(
         "Please provide your email address.",
         reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("Cancel Order", callback_data="cancel_order")]])
     )
     return COLLECT_EMAIL
 
+@instrument_handler
 async def collect_email(update: Update, context: ContextTypes.DEFAULT_TYPE) -> Optional[int]:
     """Collect user's email address."""
     user_id = update.effective_user.id
     order_id = context.user_data.get('order_id')
     
     if not order_id:
-        logger.error(f"No order_id found for user {user_id} in COLLECT_EMAIL")
+        logger.error("No order_id found for user %s in COLLECT_EMAIL", user_id)
         await update.message.reply_text(
             "❌ No order found. Please start a new order.",
             reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🏠 Main Menu", callback_data="main_menu")]])
@@ -527,13 +552,14 @@ async def collect_email(update: Update, context: ContextTypes.DEFAULT_TYPE) -> O
         return COLLECT_EMAIL
     
     context.user_data['user_details']['email'] = text
-    logger.info(f"Collected email for user {user_id}, order {order_id}: {text}")
+    logger.info("Collected email for user %s, order %s", user_id, order_id)
     await update.message.reply_text(
         "Please provide your phone number (e.g., +251912345678 or 0912345678).",
         reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("Cancel Order", callback_data="cancel_order")]])
     )
     return COLLECT_PHONE
 
+@instrument_handler
 async def collect_phone(update: Update, context: ContextTypes.DEFAULT_TYPE) -> Optional[int]:
     """Collect user's phone number."""
     user_id = update.effective_user.id
@@ -541,7 +567,7 @@ async def collect_phone(update: Update, context: ContextTypes.DEFAULT_TYPE) -> O
     phone = update.message.text.strip()
     
     if not order_id:
-        logger.error(f"No order_id found for user {user_id} in COLLECT_PHONE")
+        logger.error("No order_id found for user %s in COLLECT_PHONE", user_id)
         await update.message.reply_text(
             "❌ No order found. Please start a new order.",
             reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🏠 Main Menu", callback_data="main_menu")]])
@@ -556,22 +582,23 @@ async def collect_phone(update: Update, context: ContextTypes.DEFAULT_TYPE) -> O
         return COLLECT_PHONE
         
     context.user_data['user_details']['phone_number'] = phone
-    logger.info(f"Collected phone for user {user_id}, order {order_id}: {phone}")
+    logger.info("Collected phone for user %s, order %s", user_id, order_id)
     await update.message.reply_text(
         "Please provide your delivery address.",
         reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("Cancel Order", callback_data="cancel_order")]])
     )
     return COLLECT_ADDRESS
 
+@instrument_handler
 async def collect_address(update: Update, context: ContextTypes.DEFAULT_TYPE) -> Optional[int]:
-    """Collect user's delivery address, deduct stock, and finalize order."""
+    """Collect user's delivery address and finalize the order, taking its held stock."""
     user_id = update.effective_user.id
     order_id = context.user_data.get('order_id')
     total_price = context.user_data.get('total_price')
     cart_items = context.user_data.get('cart_items')
     
     if not order_id:
-        logger.error(f"No order_id found for user {user_id} in COLLECT_ADDRESS")
+        logger.error("No order_id found for user %s in COLLECT_ADDRESS", user_id)
         await update.message.reply_text(
             "❌ No order found. Please start a new order.",
             reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🏠 Main Menu", callback_data="main_menu")]])
@@ -591,28 +618,33 @@ async def collect_address(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         db = Database()
         context.bot_data['db'] = db
     
-    # Deduct stock for each item
-    for item in cart_items:
-        product_id = item['product_id']
-        quantity = item['quantity']
-        success = await db.deduct_stock(product_id, quantity)
-        if not success:
-            await update.message.reply_text(
-                f"⚠️ Insufficient stock for {item['name']}. Please adjust your cart and try again.",
-                reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🏠 Main Menu", callback_data="main_menu")]])
-            )
-            return ConversationHandler.END
-    
-    # Clear cart
-    await db.clear_cart(user_id)
-    
-    # Update order details
+    # Order details
     details = context.user_data['user_details']
     details['delivery_address'] = text
     details['username'] = update.effective_user.username or "N/A"
     
     try:
-        await db.update_order_details(order_id, details)
+        # Turns the stock held since confirm_order into deductions
+        outcome = await db.complete_order(order_id, details)
+        if outcome == ORDER_OUT_OF_STOCK:
+            await db.cancel_order(order_id)
+            context.user_data.clear()
+            await update.message.reply_text(
+                "⚠️ Some items in your order are no longer in stock. Please adjust your cart and try again.",
+                reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🏠 Main Menu", callback_data="main_menu")]])
+            )
+            return ConversationHandler.END
+        if outcome == ORDER_NOT_PENDING:
+            # Already completed, cancelled or moved on by an admin; leave it as it is
+            context.user_data.clear()
+            await update.message.reply_text(
+                "ℹ️ This order has already been processed or cancelled. Please start a new order if you need to.",
+                reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🏠 Main Menu", callback_data="main_menu")]])
+            )
+            return ConversationHandler.END
+        
+        # Clear cart
+        await db.clear_cart(user_id)
         
         # Generate receipt
         from datetime import datetime
@@ -645,17 +677,18 @@ async def collect_address(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
             receipt,
             reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🏠 Main Menu", callback_data="main_menu")]])
         )
-        logger.info(f"Order {order_id} finalized for user {user_id}: {details}")
+        logger.info("Order %s finalized for user %s", order_id, user_id)
         context.user_data.clear()
         return ConversationHandler.END
     except Exception as e:
-        logger.error(f"Error finalizing order {order_id} for user {user_id}: {e}", exc_info=True)
+        logger.error("Error finalizing order %s for user %s: %s", order_id, user_id, e, exc_info=True)
         await update.message.reply_text(
             "❌ Error finalizing order. Please try again.",
             reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("Cancel Order", callback_data="cancel_order")]])
         )
         return ConversationHandler.END
 
+@instrument_handler
 async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Cancel the current operation or order."""
     user_id = update.effective_user.id
@@ -668,13 +701,13 @@ async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     
     if order_id:
         try:
-            await db.cancel_order(order_id)
+            cancelled = await db.cancel_order(order_id)
             await update.message.reply_text(
-                "✅ Order cancelled.",
+                "✅ Order cancelled." if cancelled else "ℹ️ This order has already been processed and can no longer be cancelled.",
                 reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🏠 Main Menu", callback_data="main_menu")]])
             )
         except Exception as e:
-            logger.error(f"Error cancelling order {order_id} for user {user_id}: {e}", exc_info=True)
+            logger.error("Error cancelling order %s for user %s: %s", order_id, user_id, e, exc_info=True)
             await update.message.reply_text(
                 "❌ Error cancelling order. Please try again.",
                 reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🏠 Main Menu", callback_data="main_menu")]])
@@ -688,15 +721,16 @@ async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     context.user_data.clear()
     return ConversationHandler.END
 
+@instrument_handler
 async def inline_query(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Handle inline queries for game search."""
     query = update.inline_query.query.strip()
     user_id = update.inline_query.from_user.id
-    logger.info(f"Inline query by user {user_id}: '{query}'")
+    activity_logger.info("Inline query by user %s: '%s'", user_id, query)
     
     if not query:
         await update.inline_query.answer([], cache_time=10)
-        logger.info(f"Empty inline query by user {user_id}")
+        activity_logger.info("Empty inline query by user %s", user_id)
         return
     
     try:
@@ -710,7 +744,7 @@ async def inline_query(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
             description = (
                 f"Price: {format_price(product['price'])}\n"
                 f"Platform: {', '.join(product['platform'])}\n"
-                f"Stock: {product['stock']}"
+                f"Stock: {product['available']}"
             )
             results.append(
                 InlineQueryResultArticle(
@@ -726,14 +760,15 @@ async def inline_query(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
                 )
             )
         await update.inline_query.answer(results, cache_time=10)
-        logger.info(f"Inline query by user {user_id}: '{query}' returned {len(results)} results")
+        activity_logger.info("Inline query by user %s: '%s' returned %s results", user_id, query, len(results))
     except Exception as e:
-        logger.error(f"Error in inline query '{query}' by user_id {user_id}: {e}", exc_info=True)
+        logger.error("Error in inline query '%s' by user_id %s: %s", query, user_id, e, exc_info=True)
         await update.inline_query.answer([], cache_time=10)
 
 async def error_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Handle errors."""
-    logger.error(f"Update {update} caused error: {context.error}", exc_info=True)
+    # The update id is enough to correlate; its full repr carries user details and message text
+    logger.error("Update %s caused error: %s", getattr(update, 'update_id', None), context.error, exc_info=context.error)
     if update and (update.message or update.callback_query):
         try:
             if update.callback_query:
@@ -761,7 +796,7 @@ async def error_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
                     reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🏠 Main Menu", callback_data="main_menu")]])
                 )
         except TelegramError as e:
-            logger.error(f"Error sending error message: {e}", exc_info=True)
+            logger.error("Error sending error message: %s", e, exc_info=True)
 
 # Define command handlers
 command_handlers = [
@@ -0,0 +1,106 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+IMAGE_STORE_DIR = os.environ.get(
+    'IMAGE_STORE_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'images')
+)
+
+class ImageStore:
+    """Content-addressed product images shared by the bot and the admin dashboard.
+
+    Each image is stored once as objects/<first two hex digits>/<sha256>.<ext>
+    under the store root. manifest.json lists the stored objects, maps product
+    IDs to image hashes, and maps legacy image_url names (such as
+    'images/FC_25.jpg') to hashes, so existing products rows keep resolving.
+    Lookups only consult the manifest loaded in memory; nothing touches the
+    filesystem until the image is actually opened.
+    """
+
+    def __init__(self, root: str = IMAGE_STORE_DIR):
+        self.root = os.path.abspath(root)
+        self.manifest_path = os.path.join(self.root, 'manifest.json')
+        self.objects: Dict[str, str] = {}
+        self.names: Dict[str, str] = {}
+        self.products: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        self.load()
+
+    def load(self) -> None:
+        """(Re)load the manifest from disk."""
+        try:
+            with open(self.manifest_path, 'r') as f:
+                manifest = json.load(f)
+        except FileNotFoundError:
+            logger.warning("Image manifest not found at %s", self.manifest_path)
+            manifest = {}
+        self.objects = manifest.get('objects', {})
+        self.names = manifest.get('names', {})
+        self.products = manifest.get('products', {})
+
+    def save(self) -> None:
+        """Write the manifest atomically."""
+        manifest = {'objects': self.objects, 'names': self.names, 'products': self.products}
+        partial_path = self.manifest_path + '.part'
+        with open(partial_path, 'w') as f:
+            json.dump(manifest, f, indent=4, sort_keys=True)
+            f.write('\n')
+        os.replace(partial_path, self.manifest_path)
+
+    def resolve(self, image_ref: Optional[str]) -> Optional[str]:
+        """Return the hash for an image_url, legacy name, or hash, if it is stored."""
+        if not image_ref:
+            return None
+        ref = image_ref.strip('/')
+        if ref in self.objects:
+            return ref
+        digest = self.names.get(ref)
+        if digest is None:
+            # images/<hash>.jpg, as produced by name_for()
+            stem = os.path.splitext(os.path.basename(ref))[0]
+            digest = stem if stem in self.objects else None
+        return digest
+
+    def product_image(self, product_id: int, image_url: Optional[str] = None) -> Optional[str]:
+        """Return the image hash for a product, falling back to its image_url."""
+        return self.products.get(str(product_id)) or self.resolve(image_url)
+
+    def path(self, digest: Optional[str]) -> Optional[str]:
+        """Return the file path of a stored image, or None if it is not in the manifest."""
+        relative = self.objects.get(digest) if digest else None
+        return os.path.join(self.root, relative) if relative else None
+
+    def product_image_path(self, product_id: int, image_url: Optional[str] = None) -> Optional[str]:
+        """Return the file path of a product's image, or None if it has none stored."""
+        return self.path(self.product_image(product_id, image_url))
+
+    @staticmethod
+    def name_for(digest: str, ext: str = '.jpg') -> str:
+        """Return the image_url that refers to a stored image by hash."""
+        return f"images/{digest}{ext}"
+
+    def add(self, data: bytes, ext: str = '.jpg', name: Optional[str] = None,
+            product_id: Optional[int] = None) -> str:
+        """Store image bytes (once per distinct content) and return their hash."""
+        digest = hashlib.sha256(data).hexdigest()
+        relative = f"objects/{digest[:2]}/{digest}{ext.lower()}"
+        with self._lock:
+            if digest not in self.objects:
+                path = os.path.join(self.root, relative)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(path + '.part', 'wb') as f:
+                    f.write(data)
+                os.replace(path + '.part', path)
+                self.objects[digest] = relative
+            if name:
+                self.names[name.strip('/')] = digest
+            if product_id is not None:
+                self.products[str(product_id)] = digest
+            self.save()
+        return digest
@@ -2,10 +2,11 @@ import asyncio
 import json
 import logging
 import os
-import aiosqlite
-from telegram.ext import Application
+from telegram.ext import Application, ContextTypes
 from .handlers import command_handlers, conv_handler, callback_query_handler, inline_query_handler, error_handler
 from .database import Database
+from .image_store import ImageStore
+from .metrics import InstrumentedRequest
 from .utils import setup_logging
 from .config import BOT_TOKEN
 from admin_dashboard.app import set_telegram_app
@@ -14,26 +15,29 @@ from admin_dashboard.app import set_telegram_app
 setup_logging()
 logger = logging.getLogger(__name__)
 
+# Seconds between sweeps of expired stock holds
+HOLD_SWEEP_INTERVAL = int(os.getenv('HOLD_SWEEP_INTERVAL', 60))
+# Seconds between sweeps of abandoned pending orders and stale carts
+STALE_SWEEP_INTERVAL = int(os.getenv('STALE_SWEEP_INTERVAL', 900))
+
 async def initialize_database():
-    logger.info(f"Current working directory: {os.getcwd()}")
-    logger.info(f"Script directory: {os.path.dirname(__file__)}")
+    logger.info("Current working directory: %s", os.getcwd())
+    logger.info("Script directory: %s", os.path.dirname(__file__))
     db = Database()
     try:
         await db.initialize()
         products_json_path = os.path.join(os.path.dirname(__file__), 'products.json')
-        logger.info(f"Loading products from: {products_json_path}")
+        logger.info("Loading products from: %s", products_json_path)
         if not os.path.exists(products_json_path):
             raise FileNotFoundError(f"products.json not found at {products_json_path}")
         with open(products_json_path, 'r') as f:
             products = json.load(f)
-        async with aiosqlite.connect(db.db_path) as conn:
+        image_store = ImageStore()
+        async with db.connect() as conn:
             valid_products = 0
             for product in products:
-                image_path = os.path.join(os.path.dirname(__file__), product['image_url'])
-                logger.info(f"Checking image for product {product['id']}: {image_path}")
-                if not os.path.exists(image_path):
-                    logger.warning(f"Image not found for product {product['id']}: {product['image_url']}, using default")
-                    product['image_url'] = 'images/default.jpg'
+                if not image_store.product_image(product['id'], product['image_url']):
+                    logger.warning("No stored image for product %s: %s", product['id'], product['image_url'])
                 platform = json.dumps(product['platform'])
                 price = float(product['price']) if isinstance(product['price'], (int, float)) else float(product['price'].lstrip('$').replace(',', ''))
                 await conn.execute('''
@@ -50,20 +54,38 @@ async def initialize_database():
                 ))
                 valid_products += 1
             await conn.commit()
-        logger.info(f"Populated {valid_products} valid products into the database")
+        logger.info("Populated %s valid products into the database", valid_products)
         return db
     except Exception as e:
-        logger.error(f"Error populating products: {e}", exc_info=True)
+        logger.error("Error populating products: %s", e, exc_info=True)
         raise
 
+async def release_expired_holds(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """JobQueue callback returning stock held by abandoned checkouts."""
+    try:
+        await context.bot_data['db'].release_expired_holds()
+    except Exception as e:
+        logger.error("Stock hold sweep failed: %s", e, exc_info=True)
+
+async def sweep_abandoned_checkouts(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """JobQueue callback expiring abandoned pending orders and pruning stale carts."""
+    db = context.bot_data['db']
+    try:
+        await db.expire_pending_orders()
+        await db.prune_stale_carts()
+    except Exception as e:
+        logger.error("Abandoned checkout sweep failed: %s", e, exc_info=True)
+
 async def run_bot():
     """Run the Telegram bot with webhook."""
     try:
         if not BOT_TOKEN or BOT_TOKEN == 'YOUR_BOT_TOKEN':
             raise ValueError("BOT_TOKEN is not set or invalid")
-        telegram_app = Application.builder().token(BOT_TOKEN).build()
+        # Same pool size as the builder's default request, timed per Bot API method
+        telegram_app = Application.builder().token(BOT_TOKEN).request(InstrumentedRequest(connection_pool_size=256)).build()
         
         telegram_app.bot_data['db'] = await initialize_database()
+        telegram_app.bot_data['image_store'] = ImageStore()
         
         for handler in command_handlers:
             telegram_app.add_handler(handler)
@@ -72,24 +94,31 @@ async def run_bot():
         telegram_app.add_handler(inline_query_handler)
         telegram_app.add_handler(error_handler)
         
+        # Expired stock holds are already ignored by availability checks; the sweeps keep tables small
+        if telegram_app.job_queue:
+            telegram_app.job_queue.run_repeating(release_expired_holds, interval=HOLD_SWEEP_INTERVAL, first=HOLD_SWEEP_INTERVAL)
+            telegram_app.job_queue.run_repeating(sweep_abandoned_checkouts, interval=STALE_SWEEP_INTERVAL, first=60)
+        else:
+            logger.warning("JobQueue unavailable (install python-telegram-bot[job-queue]); stock holds, pending orders and carts will not be swept")
+        
         # Set up webhook
         webhook_url = f"https://{os.getenv('RENDER_EXTERNAL_HOSTNAME')}/webhook"
-        logger.info(f"Setting webhook to: {webhook_url}")
+        logger.info("Setting webhook to: %s", webhook_url)
         await telegram_app.bot.set_webhook(webhook_url)
         
-        # Pass telegram_app to Flask app for webhook processing
-        set_telegram_app(telegram_app)
-        
         logger.info("Starting bot...")
         await telegram_app.initialize()
         await telegram_app.start()
         
+        # Pass telegram_app to Flask app for webhook processing, once it can take updates
+        set_telegram_app(telegram_app)
+        
         # Keep the bot running
         while True:
             await asyncio.sleep(3600)
             
     except Exception as e:
-        logger.error(f"Bot crashed: {e}", exc_info=True)
+        logger.error("Bot crashed: %s", e, exc_info=True)
         raise
 
 if __name__ == '__main__':
@@ -0,0 +1,44 @@
+import argparse
+import asyncio
+import logging
+from .database import Database
+from .utils import setup_logging
+
+# Logger setup
+setup_logging()
+logger = logging.getLogger(__name__)
+
+async def backfill_rollups(db: Database) -> None:
+    """Rebuild the daily sales rollups used by the admin dashboard."""
+    await db.initialize()
+    await db.backfill_sales_rollups()
+    print("Daily sales rollups rebuilt")
+
+async def sweep_stale(db: Database) -> None:
+    """Expire abandoned pending orders and stock holds, and prune stale carts, once."""
+    await db.initialize()
+    orders = await db.expire_pending_orders()
+    holds = await db.release_expired_holds()
+    carts = await db.prune_stale_carts()
+    print(f"Expired {orders} pending order(s), released {holds} stock hold(s), pruned {carts} cart row(s)")
+
+COMMANDS = {
+    'backfill-rollups': backfill_rollups,
+    'sweep-stale': sweep_stale,
+}
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Exodus Game Store database maintenance")
+    parser.add_argument('command', choices=sorted(COMMANDS))
+    parser.add_argument('--db-path', help="Path to data.db (defaults to User/data.db)")
+    args = parser.parse_args()
+    
+    db = Database(args.db_path)
+    try:
+        asyncio.run(COMMANDS[args.command](db))
+    except Exception as e:
+        logger.error("Maintenance command %s failed: %s", args.command, e, exc_info=True)
+        raise
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,403 @@
+import bisect
+import functools
+import inspect
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+from telegram.request import HTTPXRequest
+from .tracing import tracer, SPAN_KIND_CLIENT, SPAN_KIND_SERVER
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds (seconds) of the latency histogram buckets
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Seconds between publishing this process's metrics for the other workers' /metrics
+METRICS_PUBLISH_INTERVAL = float(os.environ.get('METRICS_PUBLISH_INTERVAL', 15))
+
+# Callback data prefixes used as handler route labels; anything else is reported as 'other'
+CALLBACK_ROUTES = (
+    'main_menu', 'view_cart', 'platform:', 'product:', 'add_to_cart:',
+    'remove_from_cart:', 'confirm_order', 'cancel_order',
+)
+
+class _Metric:
+    kind = ''
+
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], Any] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, Any]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+    def samples(self) -> Dict[Tuple[str, ...], Any]:
+        with self._lock:
+            return dict(self._values)
+
+class Counter(_Metric):
+    """A monotonically increasing count per label set."""
+
+    kind = 'counter'
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def set_total(self, value: float, **labels) -> None:
+        """Mirror a count kept elsewhere (for collectors)."""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+class Gauge(_Metric):
+    """A value that can go up and down, such as a queue depth."""
+
+    kind = 'gauge'
+
+    def set(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+class Histogram(_Metric):
+    """Observations counted into fixed buckets, with their sum and count."""
+
+    kind = 'histogram'
+
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...] = (), buckets: Iterable[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                # Per-bucket (not cumulative) counts with a final +Inf slot, then sum
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][index] += 1
+            entry[1] += value
+
+    def samples(self) -> Dict[Tuple[str, ...], Any]:
+        with self._lock:
+            return {key: [list(counts), total] for key, (counts, total) in self._values.items()}
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def _format_labels(labelnames: Tuple[str, ...], values: Tuple[str, ...], extra: str = '') -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, values)]
+    if extra:
+        parts.append(extra)
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class MetricsRegistry:
+    """Process-wide metrics, rendered in the Prometheus text exposition format.
+
+    Recording a sample is a dict update under a lock, so instruments can stay
+    on in production. Each process also publishes a snapshot of its metrics to
+    the host-wide SharedCache every METRICS_PUBLISH_INTERVAL seconds, and
+    exposition() adds up the snapshots of every live process, so a scrape of
+    any web worker covers the bot (which runs in only one of them) too.
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Callable[[], None]] = []
+        self._caches: List[Any] = []
+        self._lock = threading.Lock()
+        self._publisher = None
+
+    def _register(self, cls, name: str, help: str, labelnames: Tuple[str, ...], **kwargs) -> Any:
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = cls(name, help, labelnames, **kwargs)
+            return self._metrics[name]
+
+    def counter(self, name: str, help: str, labelnames: Tuple[str, ...] = ()) -> Counter:
+        return self._register(Counter, name, help, labelnames)
+
+    def gauge(self, name: str, help: str, labelnames: Tuple[str, ...] = ()) -> Gauge:
+        return self._register(Gauge, name, help, labelnames)
+
+    def histogram(self, name: str, help: str, labelnames: Tuple[str, ...] = (),
+                  buckets: Iterable[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram, name, help, labelnames, buckets=buckets)
+
+    def register_collector(self, collect: Callable[[], None]) -> None:
+        """Run `collect` before every snapshot, to set gauges from state kept elsewhere."""
+        self._collectors.append(collect)
+
+    def track_cache(self, cache: Any) -> None:
+        """Report a SharedCache's hit, miss and set counts."""
+        self._caches.append(cache)
+
+    def _collect_caches(self) -> None:
+        totals: Dict[str, Dict[str, int]] = {}
+        for cache in self._caches:
+            for prefix, counters in cache.stats().items():
+                if prefix == 'metrics':  # Our own snapshots
+                    continue
+                merged = totals.setdefault(prefix, {'hits': 0, 'misses': 0, 'sets': 0})
+                for outcome in merged:
+                    merged[outcome] += counters[outcome]
+        for prefix, counters in totals.items():
+            for outcome, value in counters.items():
+                CACHE_OPERATIONS.set_total(value, cache=prefix, result=outcome)
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """Return this process's metrics as plain data, suitable for pickling and merging."""
+        self._collect_caches()
+        for collect in self._collectors:
+            try:
+                collect()
+            except Exception as e:
+                logger.warning("Metrics collector %s failed: %s", collect.__name__, e)
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return {
+            metric.name: {
+                'kind': metric.kind,
+                'help': metric.help,
+                'labelnames': metric.labelnames,
+                'buckets': getattr(metric, 'buckets', None),
+                'samples': metric.samples(),
+            }
+            for metric in metrics
+        }
+
+    def publish(self, shared) -> None:
+        """Store this process's snapshot in the shared cache for the other workers to merge."""
+        shared.set(f"metrics:{os.getpid()}", self.snapshot(), ttl=METRICS_PUBLISH_INTERVAL * 4)
+
+    def start_publishing(self, shared, interval: float = METRICS_PUBLISH_INTERVAL) -> None:
+        """Publish a snapshot every `interval` seconds from a daemon thread."""
+        if self._publisher is not None:
+            return
+
+        def run():
+            while True:
+                try:
+                    self.publish(shared)
+                except Exception as e:
+                    logger.warning("Publishing metrics failed: %s", e)
+                time.sleep(interval)
+
+        self._publisher = threading.Thread(target=run, name='metrics-publisher', daemon=True)
+        self._publisher.start()
+
+    def exposition(self, shared=None) -> str:
+        """Render this process's metrics, plus those published by other live processes, as text."""
+        snapshots = [self.snapshot()]
+        if shared is not None:
+            own_key = f"metrics:{os.getpid()}"
+            snapshots.extend(value for key, value in shared.entries('metrics:').items() if key != own_key)
+        return render(merge_snapshots(snapshots))
+
+def merge_snapshots(snapshots: List[Dict[str, Dict[str, Any]]]) -> Dict[str, Dict[str, Any]]:
+    """Add up per-process snapshots; counters, histograms and gauges are all summed."""
+    merged: Dict[str, Dict[str, Any]] = {}
+    for snapshot in snapshots:
+        for name, family in snapshot.items():
+            target = merged.setdefault(name, dict(family, samples={}))
+            if target['kind'] != family['kind'] or target['buckets'] != family['buckets']:
+                continue
+            for key, value in family['samples'].items():
+                current = target['samples'].get(key)
+                if current is None:
+                    target['samples'][key] = [list(value[0]), value[1]] if family['kind'] == 'histogram' else value
+                elif family['kind'] == 'histogram':
+                    current[0] = [a + b for a, b in zip(current[0], value[0])]
+                    current[1] += value[1]
+                else:
+                    target['samples'][key] = current + value
+    _derive_hit_ratios(merged)
+    return merged
+
+def _derive_hit_ratios(merged: Dict[str, Dict[str, Any]]) -> None:
+    operations = merged.get(CACHE_OPERATIONS.name)
+    if not operations:
+        return
+    counts: Dict[str, Dict[str, float]] = {}
+    for (cache, result), value in operations['samples'].items():
+        counts.setdefault(cache, {})[result] = value
+    samples = {}
+    for cache, results in counts.items():
+        lookups = results.get('hits', 0) + results.get('misses', 0)
+        if lookups:
+            samples[(cache,)] = results.get('hits', 0) / lookups
+    merged['exodus_cache_hit_ratio'] = {
+        'kind': 'gauge',
+        'help': 'Share of cache lookups that were hits, across all processes on the host',
+        'labelnames': ('cache',),
+        'buckets': None,
+        'samples': samples,
+    }
+
+def render(families: Dict[str, Dict[str, Any]]) -> str:
+    """Format metric families in the Prometheus text exposition format (version 0.0.4)."""
+    lines = []
+    for name in sorted(families):
+        family = families[name]
+        lines.append(f"# HELP {name} {family['help']}")
+        lines.append(f"# TYPE {name} {family['kind']}")
+        labelnames = family['labelnames']
+        for key in sorted(family['samples']):
+            value = family['samples'][key]
+            if family['kind'] != 'histogram':
+                lines.append(f"{name}{_format_labels(labelnames, key)} {_format_value(value)}")
+                continue
+            counts, total = value
+            cumulative = 0
+            for bound, count in zip(list(family['buckets']) + [float('inf')], counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{name}_bucket{_format_labels(labelnames, key, le)} {cumulative}")
+            lines.append(f"{name}_sum{_format_labels(labelnames, key)} {_format_value(float(total))}")
+            lines.append(f"{name}_count{_format_labels(labelnames, key)} {cumulative}")
+    return '\n'.join(lines) + '\n'
+
+registry = MetricsRegistry()
+
+HANDLER_DURATION = registry.histogram(
+    'exodus_bot_handler_duration_seconds', 'Time spent handling a bot update, by handler route', ('route',))
+HANDLER_ERRORS = registry.counter(
+    'exodus_bot_handler_errors_total', 'Bot handler calls that raised, by handler route', ('route',))
+DB_QUERY_DURATION = registry.histogram(
+    'exodus_db_query_duration_seconds', 'Time spent in Database methods, by database and method', ('db', 'method'))
+DB_QUERY_ERRORS = registry.counter(
+    'exodus_db_query_errors_total', 'Database method calls that raised, by database and method', ('db', 'method'))
+TELEGRAM_API_DURATION = registry.histogram(
+    'exodus_telegram_api_duration_seconds', 'Latency of Telegram Bot API requests, by API method', ('method',))
+TELEGRAM_API_RESPONSES = registry.counter(
+    'exodus_telegram_api_responses_total',
+    'Telegram Bot API responses by API method and HTTP status code (or "network" for failed requests)',
+    ('method', 'code'))
+UPDATE_QUEUE_DEPTH = registry.gauge(
+    'exodus_bot_update_queue_depth', 'Updates waiting in the bot Application update queue')
+CACHE_OPERATIONS = registry.counter(
+    'exodus_cache_operations_total', 'Shared cache lookups and stores by key prefix and result', ('cache', 'result'))
+HTTP_REQUEST_DURATION = registry.histogram(
+    'exodus_http_request_duration_seconds', 'Dashboard request latency by Flask endpoint and status code',
+    ('endpoint', 'status'))
+
+def callback_route(data: Optional[str]) -> str:
+    """Reduce callback data such as 'product:42' to a bounded route label such as 'product:'."""
+    if not data:
+        return 'other'
+    route = data.split(':', 1)[0] + ':' if ':' in data else data
+    return route if route in CALLBACK_ROUTES else 'other'
+
+def instrument_handler(func: Callable) -> Callable:
+    """Time and trace a bot handler.
+
+    Callback queries are labelled by callback route, others by handler name.
+    Each call is the root span of the update's trace.
+    """
+    @functools.wraps(func)
+    async def wrapper(update, context, *args, **kwargs):
+        query = getattr(update, 'callback_query', None)
+        route = callback_route(query.data) if query is not None else func.__name__
+        attributes = {'bot.route': route, 'bot.handler': func.__name__,
+                      'bot.update_id': getattr(update, 'update_id', None)}
+        start = time.perf_counter()
+        with tracer.span(f"bot.update {route}", SPAN_KIND_SERVER, attributes):
+            try:
+                return await func(update, context, *args, **kwargs)
+            except Exception:
+                HANDLER_ERRORS.inc(route=route)
+                raise
+            finally:
+                HANDLER_DURATION.observe(time.perf_counter() - start, route=route)
+    return wrapper
+
+@functools.lru_cache(maxsize=None)
+def _db_label(db_path: str) -> str:
+    return os.path.splitext(os.path.basename(db_path))[0]
+
+def timed_query(func: Callable) -> Callable:
+    """Time a Database method (sync or async), labelled by its database file and method name.
+
+    Inside a traced update the call is also a child span.
+    """
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(self, *args, **kwargs):
+            labels = {'db': _db_label(self.db_path), 'method': func.__name__}
+            start = time.perf_counter()
+            with tracer.child_span(f"db {func.__name__}", SPAN_KIND_CLIENT,
+                                   {'db.system': 'sqlite', 'db.name': labels['db']}):
+                try:
+                    return await func(self, *args, **kwargs)
+                except Exception:
+                    DB_QUERY_ERRORS.inc(**labels)
+                    raise
+                finally:
+                    DB_QUERY_DURATION.observe(time.perf_counter() - start, **labels)
+        return async_wrapper
+
+    @functools.wraps(func)
+    def wrapper(self, *args, **kwargs):
+        labels = {'db': _db_label(self.db_path), 'method': func.__name__}
+        start = time.perf_counter()
+        with tracer.child_span(f"db {func.__name__}", SPAN_KIND_CLIENT,
+                               {'db.system': 'sqlite', 'db.name': labels['db']}):
+            try:
+                return func(self, *args, **kwargs)
+            except Exception:
+                DB_QUERY_ERRORS.inc(**labels)
+                raise
+            finally:
+                DB_QUERY_DURATION.observe(time.perf_counter() - start, **labels)
+    return wrapper
+
+def instrument_methods(cls):
+    """Class decorator applying timed_query to every public coroutine method."""
+    for name, member in list(vars(cls).items()):
+        if not name.startswith('_') and inspect.iscoroutinefunction(member):
+            setattr(cls, name, timed_query(member))
+    return cls
+
+class InstrumentedRequest(HTTPXRequest):
+    """HTTPXRequest that records Bot API latency and response codes per API method.
+
+    Inside a traced update each request is also a child span.
+    """
+
+    async def do_request(self, url: str, method: str, *args, **kwargs) -> Tuple[int, bytes]:
+        # File downloads end in the file path rather than an API method
+        api_method = 'file' if '/file/bot' in url else url.rsplit('/', 1)[-1]
+        start = time.perf_counter()
+        code = 'network'
+        with tracer.child_span(f"telegram {api_method}", SPAN_KIND_CLIENT,
+                               {'http.method': method, 'telegram.method': api_method}) as span:
+            try:
+                code, payload = await super().do_request(url, method, *args, **kwargs)
+                return code, payload
+            finally:
+                TELEGRAM_API_DURATION.observe(time.perf_counter() - start, method=api_method)
+                TELEGRAM_API_RESPONSES.inc(method=api_method, code=code)
+                if span is not None:
+                    span.set_attribute('http.status_code', code)
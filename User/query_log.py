@@ -0,0 +1,286 @@
+import atexit
+import functools
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Statements whose execution (plus fetching) takes at least this many milliseconds are slow
+SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', 100))
+
+# Seconds between writes of the accumulated statistics to admin.db
+QUERY_LOG_FLUSH_INTERVAL = float(os.environ.get('QUERY_LOG_FLUSH_INTERVAL', 30))
+
+# Statements EXPLAIN QUERY PLAN can describe
+EXPLAINABLE = ('SELECT', 'INSERT', 'UPDATE', 'DELETE', 'REPLACE', 'WITH')
+
+_COMMENT = re.compile(r'--[^\n]*|/\*.*?\*/', re.DOTALL)
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'(?<![\w.])-?\d+(?:\.\d+)?\b')
+_PLACEHOLDER_LIST = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+_WHITESPACE = re.compile(r'\s+')
+
+@functools.lru_cache(maxsize=2048)
+def fingerprint(sql: str) -> str:
+    """Normalize SQL text so statements differing only in literals or IN-list length group together.
+
+    Comments are dropped, string and number literals become '?', lists of
+    placeholders become '(...)', and whitespace is collapsed. The result holds
+    no parameter values, so it is safe to store and display.
+    """
+    sql = _COMMENT.sub(' ', sql)
+    sql = _STRING.sub('?', sql)
+    sql = _NUMBER.sub('?', sql)
+    sql = _PLACEHOLDER_LIST.sub('(...)', sql)
+    return _WHITESPACE.sub(' ', sql).strip()
+
+def _db_label(database: Any) -> str:
+    path = str(database).split('?', 1)[0]
+    if path.startswith('file:'):
+        path = path[5:]
+    return os.path.splitext(os.path.basename(path))[0] or 'memory'
+
+def explain(connection: sqlite3.Connection, sql: str, parameters: Any = ()) -> Optional[str]:
+    """Return EXPLAIN QUERY PLAN for `sql` as indented text, or None if it cannot be explained."""
+    if not sql.lstrip().upper().startswith(EXPLAINABLE):
+        return None
+    try:
+        # A plain cursor, so the EXPLAIN itself is not profiled
+        rows = sqlite3.Cursor(connection).execute(f"EXPLAIN QUERY PLAN {sql}", parameters).fetchall()
+    except sqlite3.Error:
+        return None
+    depth = {0: -1}
+    lines = []
+    for row in rows:
+        node_id, parent, detail = row[0], row[1], row[-1]
+        depth[node_id] = depth.get(parent, -1) + 1
+        lines.append('  ' * depth[node_id] + str(detail))
+    return '\n'.join(lines)
+
+class QueryLog:
+    """Per-statement timing aggregated by SQL fingerprint, flushed to admin.db.
+
+    ProfiledConnection reports every statement run through it here. Counts,
+    total and worst latency, slow calls and errors are kept per (database,
+    fingerprint) in memory and added to admin.db's query_stats table every
+    `flush_interval` seconds by a background thread, so all workers and the
+    bot contribute to the same totals. The first time a fingerprint is slow
+    in a process, its EXPLAIN QUERY PLAN is captured on the same connection
+    with the same parameters and stored alongside.
+
+    reset() clears the table for every process. It records the time of the
+    reset in query_stats_resets, and a process whose unflushed numbers were
+    gathered partly before that time drops them at its next flush, so they
+    do not reappear.
+    """
+
+    UPSERT = '''
+        INSERT INTO query_stats
+            (db, fingerprint, calls, total_ms, max_ms, slow_calls, errors, query_plan, last_seen)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+        ON CONFLICT(db, fingerprint) DO UPDATE SET
+            calls = calls + excluded.calls,
+            total_ms = total_ms + excluded.total_ms,
+            max_ms = MAX(max_ms, excluded.max_ms),
+            slow_calls = slow_calls + excluded.slow_calls,
+            errors = errors + excluded.errors,
+            query_plan = COALESCE(excluded.query_plan, query_plan),
+            last_seen = CURRENT_TIMESTAMP
+    '''
+
+    def __init__(self, slow_ms: float = SLOW_QUERY_MS, flush_interval: float = QUERY_LOG_FLUSH_INTERVAL):
+        self.slow_ms = slow_ms
+        self.flush_interval = flush_interval
+        self.admin_db_path = None
+        self._pending: Dict[Tuple[str, str], list] = {}
+        # When the numbers in _pending started accumulating
+        self._window_start = time.time()
+        self._explained = set()
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._thread = None
+
+    def record(self, connection: sqlite3.Connection, db: str, sql: str, parameters: Any,
+               elapsed: float, call_elapsed: float, first: bool, error: bool = False) -> None:
+        """Add one execute or fetch step; `call_elapsed` is the statement's running total so far."""
+        key = (db, fingerprint(sql))
+        elapsed_ms = elapsed * 1000
+        call_ms = call_elapsed * 1000
+        # Counted as slow once per call, when its running total crosses the threshold
+        newly_slow = call_ms >= self.slow_ms and (first or call_ms - elapsed_ms < self.slow_ms)
+        with self._lock:
+            # calls, total_ms, max_ms, slow_calls, errors, query_plan
+            stats = self._pending.get(key)
+            if stats is None:
+                stats = self._pending[key] = [0, 0.0, 0.0, 0, 0, None]
+            stats[0] += first
+            stats[1] += elapsed_ms
+            stats[2] = max(stats[2], call_ms)
+            stats[3] += newly_slow
+            stats[4] += error
+            capture = newly_slow and parameters is not None and key not in self._explained
+            if capture:
+                self._explained.add(key)
+        if capture:
+            plan = explain(connection, sql, parameters)
+            if plan:
+                with self._lock:
+                    self._pending.setdefault(key, [0, 0.0, 0.0, 0, 0, None])[5] = plan
+
+    def start_flushing(self, admin_db_path: str) -> None:
+        """Write accumulated statistics to admin_db_path's query_stats table from a daemon thread."""
+        self.admin_db_path = admin_db_path
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='query-log-writer', daemon=True)
+            self._thread.start()
+            atexit.register(self.flush)
+
+    def _run(self):
+        while True:
+            time.sleep(self.flush_interval)
+            self.flush()
+
+    def flush(self) -> bool:
+        """Add everything recorded since the last flush to query_stats."""
+        if self.admin_db_path is None:
+            return False
+        with self._write_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+                started, self._window_start = self._window_start, time.time()
+            if not pending:
+                return True
+            rows = [(db, key, *stats) for (db, key), stats in pending.items()]
+            try:
+                connection = sqlite3.connect(self.admin_db_path, timeout=5)
+                try:
+                    with connection:
+                        reset_at = connection.execute("SELECT MAX(reset_at) FROM query_stats_resets").fetchone()[0]
+                        if reset_at is not None and reset_at > started:
+                            # Partly from before a reset somewhere else; start over, plans included
+                            with self._lock:
+                                self._explained.clear()
+                        else:
+                            connection.executemany(self.UPSERT, rows)
+                finally:
+                    connection.close()
+                return True
+            except sqlite3.Error as e:
+                logger.warning("Query log error: %s", e)
+                # Keep the numbers for the next attempt
+                with self._lock:
+                    self._window_start = started
+                    for key, stats in pending.items():
+                        current = self._pending.setdefault(key, [0, 0.0, 0.0, 0, 0, None])
+                        for i in (0, 1, 3, 4):
+                            current[i] += stats[i]
+                        current[2] = max(current[2], stats[2])
+                        current[5] = current[5] or stats[5]
+                return False
+
+    def reset(self) -> bool:
+        """Clear query_stats, and make every process drop the numbers it has not flushed yet."""
+        if self.admin_db_path is None:
+            return False
+        with self._write_lock:
+            with self._lock:
+                self._pending = {}
+                self._explained.clear()
+                self._window_start = time.time()
+            try:
+                connection = sqlite3.connect(self.admin_db_path, timeout=5)
+                try:
+                    with connection:
+                        connection.execute("DELETE FROM query_stats")
+                        connection.execute("DELETE FROM query_stats_resets")
+                        connection.execute("INSERT INTO query_stats_resets (reset_at) VALUES (?)", (time.time(),))
+                finally:
+                    connection.close()
+                return True
+            except sqlite3.Error as e:
+                logger.warning("Query log reset error: %s", e)
+                return False
+
+query_log = QueryLog()
+
+class ProfiledCursor(sqlite3.Cursor):
+    """Cursor that reports each statement's execute and fetch time to the query log."""
+
+    _sql = None
+    _parameters = None
+    _call_elapsed = 0.0
+
+    def _record(self, elapsed: float, first: bool, error: bool = False) -> None:
+        self._call_elapsed = elapsed if first else self._call_elapsed + elapsed
+        query_log.record(self.connection, self.connection.profile_label, self._sql, self._parameters,
+                         elapsed, self._call_elapsed, first, error)
+
+    def execute(self, sql, parameters=()):
+        self._sql, self._parameters = sql, parameters
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        except sqlite3.Error:
+            self._record(time.perf_counter() - start, True, error=True)
+            self._sql = None
+            raise
+        finally:
+            if self._sql is not None:
+                self._record(time.perf_counter() - start, True)
+
+    def executemany(self, sql, seq_of_parameters):
+        # Parameters may be a one-shot iterator, so no plan is captured for executemany
+        self._sql, self._parameters = sql, None
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        except sqlite3.Error:
+            self._record(time.perf_counter() - start, True, error=True)
+            self._sql = None
+            raise
+        finally:
+            if self._sql is not None:
+                self._record(time.perf_counter() - start, True)
+
+    def _timed_fetch(self, fetch, *args):
+        if self._sql is None:
+            return fetch(*args)
+        start = time.perf_counter()
+        try:
+            return fetch(*args)
+        finally:
+            self._record(time.perf_counter() - start, False)
+
+    def fetchone(self):
+        return self._timed_fetch(super().fetchone)
+
+    def fetchmany(self, size=None):
+        return self._timed_fetch(super().fetchmany, self.arraysize if size is None else size)
+
+    def fetchall(self):
+        return self._timed_fetch(super().fetchall)
+
+class ProfiledConnection(sqlite3.Connection):
+    """sqlite3 connection whose statements are timed into the query log.
+
+    Pass as `factory=` to sqlite3.connect() or aiosqlite.connect().
+    executescript() (schema setup) is not profiled.
+    """
+
+    def __init__(self, database, *args, **kwargs):
+        super().__init__(database, *args, **kwargs)
+        self.profile_label = _db_label(database)
+
+    def cursor(self, factory=ProfiledCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
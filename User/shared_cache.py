@@ -0,0 +1,307 @@
+import asyncio
+import hashlib
+import logging
+import os
+import pickle
+import sqlite3
+import tempfile
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+from typing import IO, Any, Callable, Dict, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # No flock (Windows): computations are only deduplicated within a process
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+SHARED_CACHE_PATH = os.environ.get(
+    'SHARED_CACHE_PATH', os.path.join(tempfile.gettempdir(), 'exodus_shared_cache.db')
+)
+
+# Number of byte-range lock slots keys are hashed onto for host-wide single flight
+LOCK_SLOTS = 1024
+
+# lockf locks belong to the process, not to a thread or file object: a second
+# lock on a slot this process holds succeeds at once, and any unlock releases
+# it. So every SharedCache on a path shares one lock file, and a thread lock per
+# (lock file, slot) keeps this process's threads from holding a slot together.
+_lock_files: Dict[str, IO] = {}
+_slot_locks: Dict[Tuple[str, int], threading.Lock] = {}
+_slot_locks_lock = threading.Lock()
+
+def _slot_lock(lock_path: str, slot: int) -> threading.Lock:
+    with _slot_locks_lock:
+        if (lock_path, slot) not in _slot_locks:
+            _slot_locks[(lock_path, slot)] = threading.Lock()
+        return _slot_locks[(lock_path, slot)]
+
+def _lock_file(lock_path: str) -> IO:
+    with _slot_locks_lock:
+        if lock_path not in _lock_files:
+            _lock_files[lock_path] = open(lock_path, 'a+')
+        return _lock_files[lock_path]
+
+CACHE_SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS cache_entries (
+        key TEXT PRIMARY KEY,
+        version TEXT,
+        expires_at REAL NOT NULL,
+        value BLOB NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_cache_entries_expires ON cache_entries(expires_at);
+'''
+
+def file_version(db_path: str) -> Optional[str]:
+    """Return a host-wide version stamp for an SQLite database's committed state.
+
+    A commit rewrites the database file, or in WAL mode its -wal file, so their
+    modification times and sizes change. Unlike PRAGMA data_version, the stamp
+    compares equal across processes. An empty -wal file counts as missing, as
+    SQLite creates and removes it when connections open and close.
+    """
+    parts = []
+    for path in (db_path, db_path + '-wal'):
+        try:
+            stat = os.stat(path)
+            parts.append(f"{stat.st_mtime_ns}:{stat.st_size}" if stat.st_size or path == db_path else '-')
+        except FileNotFoundError:
+            parts.append('-')
+        except OSError as e:
+            logger.warning("Cannot stat %s for cache version: %s", path, e)
+            return None
+    return '|'.join(parts)
+
+def _plain(value: Any) -> Any:
+    """Convert sqlite3.Row values (which cannot be pickled) into dicts, recursively."""
+    if isinstance(value, sqlite3.Row):
+        return dict(value)
+    if isinstance(value, dict):
+        return {k: _plain(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_plain(v) for v in value]
+    if isinstance(value, tuple):
+        return tuple(_plain(v) for v in value)
+    return value
+
+class SharedCache:
+    """Host-wide cache in a local SQLite file, shared by every web worker and the bot.
+
+    Entries carry an expiry time and an optional version stamp (for example
+    file_version() of the database they were computed from); a lookup with a
+    different version is a miss, so writers never have to remember to
+    invalidate. get_or_compute() and get_or_compute_async() hold a per-key
+    flock while computing, so a value is computed once per host rather than
+    once per worker. Hit, miss and
+    set counts are kept per process by key prefix (the part before ':').
+    """
+
+    MISS = object()
+
+    def __init__(self, path: str = SHARED_CACHE_PATH, ttl: float = 30):
+        self.path = path
+        self.ttl = ttl
+        self._local = threading.local()
+        # Per event loop, as asyncio locks cannot be shared between loops
+        self._async_locks: 'weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, asyncio.Lock]]' = \
+            weakref.WeakKeyDictionary()
+        self._stats: Dict[str, Dict[str, int]] = {}
+        self._stats_lock = threading.Lock()
+        self._sets = 0
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute("PRAGMA journal_mode = WAL")
+            # A lost write after a crash is just a cache miss
+            connection.execute("PRAGMA synchronous = OFF")
+            connection.executescript(CACHE_SCHEMA)
+            self._local.connection = connection
+        return connection
+
+    def _count(self, key: str, outcome: str) -> None:
+        prefix = key.split(':', 1)[0]
+        with self._stats_lock:
+            counters = self._stats.setdefault(prefix, {'hits': 0, 'misses': 0, 'sets': 0})
+            counters[outcome] += 1
+
+    def get(self, key: str, version: Optional[str] = None) -> Any:
+        """Return the cached value, or SharedCache.MISS if absent, expired or of another version."""
+        value = self._read(key, version)
+        self._count(key, 'misses' if value is self.MISS else 'hits')
+        return value
+
+    def _read(self, key: str, version: Optional[str]) -> Any:
+        try:
+            row = self._connection().execute(
+                "SELECT version, expires_at, value FROM cache_entries WHERE key = ?", (key,)
+            ).fetchone()
+        except sqlite3.Error as e:
+            logger.warning("Shared cache read error for %s: %s", key, e)
+            row = None
+        if row is None or row[1] <= time.time() or (version is not None and row[0] != version):
+            return self.MISS
+        try:
+            return pickle.loads(row[2])
+        except Exception as e:
+            logger.warning("Shared cache entry %s is unreadable: %s", key, e)
+            return self.MISS
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None, version: Optional[str] = None) -> None:
+        """Store a value for `ttl` seconds (the cache default if None), stamped with `version`."""
+        expires_at = time.time() + (self.ttl if ttl is None else ttl)
+        try:
+            connection = self._connection()
+            connection.execute(
+                "INSERT OR REPLACE INTO cache_entries (key, version, expires_at, value) VALUES (?, ?, ?, ?)",
+                (key, version, expires_at, pickle.dumps(_plain(value), pickle.HIGHEST_PROTOCOL))
+            )
+            self._sets += 1
+            if self._sets % 100 == 0:
+                connection.execute("DELETE FROM cache_entries WHERE expires_at <= ?", (time.time(),))
+        except sqlite3.Error as e:
+            logger.warning("Shared cache write error for %s: %s", key, e)
+            return
+        self._count(key, 'sets')
+
+    def invalidate(self, key: Optional[str] = None) -> None:
+        """Drop one entry, every entry under a 'prefix:' key ending in ':', or everything."""
+        try:
+            connection = self._connection()
+            if key is None:
+                connection.execute("DELETE FROM cache_entries")
+            elif key.endswith(':'):
+                connection.execute("DELETE FROM cache_entries WHERE key >= ? AND key < ?", (key, key[:-1] + ';'))
+            else:
+                connection.execute("DELETE FROM cache_entries WHERE key = ?", (key,))
+        except sqlite3.Error as e:
+            logger.warning("Shared cache invalidation error for %s: %s", key, e)
+
+    def entries(self, prefix: str) -> Dict[str, Any]:
+        """Return every unexpired entry under `prefix` (ending in ':'), without counting lookups."""
+        try:
+            rows = self._connection().execute(
+                "SELECT key, value FROM cache_entries WHERE key >= ? AND key < ? AND expires_at > ?",
+                (prefix, prefix[:-1] + ';', time.time())
+            ).fetchall()
+        except sqlite3.Error as e:
+            logger.warning("Shared cache read error for %s: %s", prefix, e)
+            return {}
+        result = {}
+        for key, value in rows:
+            try:
+                result[key] = pickle.loads(value)
+            except Exception as e:
+                logger.warning("Shared cache entry %s is unreadable: %s", key, e)
+        return result
+
+    def _acquire_host_lock(self, key: str) -> int:
+        """Take the lock slot `key` hashes onto, first within this process, then against other processes.
+
+        Blocks; returns the slot to pass to _release_host_lock().
+        """
+        lock_path = self.path + '.lock'
+        slot = int(hashlib.sha1(key.encode()).hexdigest(), 16) % LOCK_SLOTS
+        thread_lock = _slot_lock(lock_path, slot)
+        thread_lock.acquire()
+        if fcntl is None:
+            return slot
+        try:
+            fcntl.lockf(_lock_file(lock_path), fcntl.LOCK_EX, 1, slot)
+        except BaseException:
+            thread_lock.release()
+            raise
+        return slot
+
+    def _release_host_lock(self, slot: int) -> None:
+        lock_path = self.path + '.lock'
+        try:
+            if fcntl is not None:
+                fcntl.lockf(_lock_file(lock_path), fcntl.LOCK_UN, 1, slot)
+        finally:
+            _slot_lock(lock_path, slot).release()
+
+    @contextmanager
+    def _host_lock(self, key: str):
+        """Hold this key's lock slot against other processes, alongside the in-process lock."""
+        slot = self._acquire_host_lock(key)
+        try:
+            yield
+        finally:
+            self._release_host_lock(slot)
+
+    def _async_lock(self, key: str) -> asyncio.Lock:
+        locks = self._async_locks.setdefault(asyncio.get_running_loop(), {})
+        if key not in locks:
+            locks[key] = asyncio.Lock()
+        return locks[key]
+
+    async def _acquire_host_lock_async(self, key: str) -> int:
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(None, self._acquire_host_lock, key)
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            # The thread still takes the lock; give it back once it has
+            def release(done):
+                if not done.cancelled() and done.exception() is None:
+                    self._release_host_lock(done.result())
+            future.add_done_callback(release)
+            raise
+
+    def get_or_compute(self, key: str, compute: Callable[[], Any], ttl: Optional[float] = None,
+                       version: Optional[str] = None) -> Any:
+        """Return the cached value for `key`, computing it at most once per host when missing."""
+        value = self._read(key, version)
+        if value is self.MISS:
+            with self._host_lock(key):
+                # Another worker may have filled it while we waited
+                value = self._read(key, version)
+                if value is self.MISS:
+                    self._count(key, 'misses')
+                    value = _plain(compute())
+                    self.set(key, value, ttl, version)
+                    return value
+        self._count(key, 'hits')
+        return value
+
+    async def get_or_compute_async(self, key: str, compute: Callable[[], Any], ttl: Optional[float] = None,
+                                   version: Optional[str] = None) -> Any:
+        """Async form for the bot, where `compute` is a coroutine function.
+
+        Cache reads and writes, and waiting for the host lock, run in the default
+        executor so the event loop never blocks on the cache file. Concurrent
+        misses in this process wait on an asyncio lock rather than each holding
+        an executor thread.
+        """
+        value = await asyncio.to_thread(self._read, key, version)
+        if value is self.MISS:
+            async with self._async_lock(key):
+                value = await asyncio.to_thread(self._read, key, version)
+                if value is self.MISS:
+                    slot = await self._acquire_host_lock_async(key)
+                    try:
+                        # Another worker may have filled it while we waited
+                        value = await asyncio.to_thread(self._read, key, version)
+                        if value is self.MISS:
+                            self._count(key, 'misses')
+                            value = _plain(await compute())
+                            await asyncio.to_thread(self.set, key, value, ttl, version)
+                            return value
+                    finally:
+                        await asyncio.to_thread(self._release_host_lock, slot)
+        self._count(key, 'hits')
+        return value
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Return this process's hit/miss/set counts and hit ratio per key prefix."""
+        with self._stats_lock:
+            result = {}
+            for prefix, counters in self._stats.items():
+                lookups = counters['hits'] + counters['misses']
+                result[prefix] = dict(counters, hit_ratio=counters['hits'] / lookups if lookups else None)
+            return result
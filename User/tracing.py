@@ -0,0 +1,238 @@
+import atexit
+import contextvars
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+TRACE_PATH = os.environ.get('TRACE_PATH', os.path.join(os.path.dirname(__file__), 'traces.jsonl'))
+# Share of updates traced regardless of duration (0 to 1)
+TRACE_SAMPLE_RATE = float(os.environ.get('TRACE_SAMPLE_RATE', 0.01))
+# Updates taking at least this many milliseconds are always kept; negative disables
+TRACE_SLOW_MS = float(os.environ.get('TRACE_SLOW_MS', 1000))
+# traces.jsonl is moved to traces.jsonl.1 once it grows past this size
+TRACE_MAX_BYTES = int(os.environ.get('TRACE_MAX_BYTES', 10 * 1024 * 1024))
+# Spans beyond this many in one trace are counted but not kept
+MAX_SPANS_PER_TRACE = 256
+
+# OTLP span kinds
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_SERVER = 2
+SPAN_KIND_CLIENT = 3
+
+# OTLP status codes
+STATUS_UNSET = 0
+STATUS_ERROR = 2
+
+class _Trace:
+    __slots__ = ('trace_id', 'sampled', 'spans', 'dropped')
+
+    def __init__(self, sampled: bool):
+        self.trace_id = os.urandom(16).hex()
+        self.sampled = sampled
+        self.spans: List['Span'] = []
+        self.dropped = 0
+
+class Span:
+    """One timed operation within a trace."""
+
+    __slots__ = ('trace', 'span_id', 'parent_id', 'name', 'kind', 'start_ns', 'end_ns',
+                 'attributes', 'status', 'status_message')
+
+    def __init__(self, trace: _Trace, parent_id: Optional[str], name: str, kind: int,
+                 attributes: Optional[Dict[str, Any]]):
+        self.trace = trace
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.attributes = dict(attributes) if attributes else {}
+        self.status = STATUS_UNSET
+        self.status_message = None
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def record_error(self, error: BaseException) -> None:
+        self.status = STATUS_ERROR
+        self.status_message = f"{type(error).__name__}: {error}"
+
+    def to_otlp(self) -> Dict[str, Any]:
+        span = {
+            'traceId': self.trace.trace_id,
+            'spanId': self.span_id,
+            'name': self.name,
+            'kind': self.kind,
+            'startTimeUnixNano': str(self.start_ns),
+            'endTimeUnixNano': str(self.end_ns or self.start_ns),
+            'attributes': _otlp_attributes(self.attributes),
+            'status': {'code': self.status},
+        }
+        if self.parent_id:
+            span['parentSpanId'] = self.parent_id
+        if self.status_message:
+            span['status']['message'] = self.status_message
+        return span
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {'boolValue': value}
+    if isinstance(value, int):
+        return {'intValue': str(value)}
+    if isinstance(value, float):
+        return {'doubleValue': value}
+    return {'stringValue': str(value)}
+
+def _otlp_attributes(attributes: Dict[str, Any]) -> List[Dict[str, Any]]:
+    return [{'key': key, 'value': _otlp_value(value)} for key, value in attributes.items() if value is not None]
+
+_current_span: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar('current_span', default=None)
+
+def current_span() -> Optional[Span]:
+    """Return the span open in the current context, if any."""
+    return _current_span.get()
+
+class JsonlExporter:
+    """Appends finished traces to a JSONL file from a background thread.
+
+    Each line is one OTLP/JSON ExportTraceServiceRequest (resourceSpans), the
+    format the OpenTelemetry Collector's otlpjsonfile receiver reads. export()
+    only puts the trace on a bounded queue, so the event loop never waits on
+    disk; traces that arrive while the queue is full are dropped.
+    """
+
+    def __init__(self, path: str = TRACE_PATH, max_bytes: int = TRACE_MAX_BYTES,
+                 service_name: str = 'exodus-game-bot', max_queue: int = 1000):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.resource = {'attributes': _otlp_attributes({'service.name': service_name, 'process.pid': os.getpid()})}
+        self.dropped = 0
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue)
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def export(self, trace: _Trace) -> None:
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='trace-exporter', daemon=True)
+                self._thread.start()
+                atexit.register(self.close)
+        try:
+            self._queue.put_nowait(trace)
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self) -> None:
+        """Write whatever is still queued."""
+        self._queue.put(None)
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def _run(self) -> None:
+        while True:
+            trace = self._queue.get()
+            if trace is None:
+                return
+            lines = [self._line(trace)]
+            # Write everything already waiting in one go
+            while True:
+                try:
+                    trace = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if trace is None:
+                    self._write(lines)
+                    return
+                lines.append(self._line(trace))
+            self._write(lines)
+
+    def _line(self, trace: _Trace) -> str:
+        scope_spans = {'scope': {'name': 'exodus.tracing'}, 'spans': [span.to_otlp() for span in trace.spans]}
+        if trace.dropped:
+            scope_spans['spans'][0]['attributes'].append(
+                {'key': 'trace.dropped_spans', 'value': _otlp_value(trace.dropped)})
+        return json.dumps({'resourceSpans': [{'resource': self.resource, 'scopeSpans': [scope_spans]}]},
+                          separators=(',', ':'))
+
+    def _write(self, lines: List[str]) -> None:
+        try:
+            if os.path.exists(self.path) and os.path.getsize(self.path) >= self.max_bytes:
+                os.replace(self.path, self.path + '.1')
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write('\n'.join(lines) + '\n')
+        except OSError as e:
+            logger.warning("Could not write traces to %s: %s", self.path, e)
+
+class Tracer:
+    """Minimal tracer: one trace per bot update, with child spans for the work inside it.
+
+    The current span lives in a context variable, so spans opened anywhere in
+    the handling of an update (database methods, Bot API requests, file reads)
+    nest under it. A trace is exported if it was picked by head sampling
+    (`sample_rate`) or if its root span took at least `slow_ms`, so slow
+    updates are always kept while the rest are sampled. With a zero sample
+    rate and a negative slow_ms, spans are not recorded at all.
+    """
+
+    def __init__(self, exporter: Optional[JsonlExporter] = None, sample_rate: float = TRACE_SAMPLE_RATE,
+                 slow_ms: float = TRACE_SLOW_MS):
+        self.exporter = exporter or JsonlExporter()
+        self.sample_rate = sample_rate
+        self.slow_ms = slow_ms
+
+    @property
+    def enabled(self) -> bool:
+        return self.sample_rate > 0 or self.slow_ms >= 0
+
+    @contextmanager
+    def span(self, name: str, kind: int = SPAN_KIND_INTERNAL, attributes: Optional[Dict[str, Any]] = None):
+        """Open a span under the current one, or start a new trace if there is none."""
+        if not self.enabled:
+            yield None
+            return
+        parent = _current_span.get()
+        if parent is None:
+            trace = _Trace(sampled=random.random() < self.sample_rate)
+        else:
+            trace = parent.trace
+        span = Span(trace, parent.span_id if parent else None, name, kind, attributes)
+        if len(trace.spans) < MAX_SPANS_PER_TRACE:
+            trace.spans.append(span)
+        else:
+            trace.dropped += 1
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.record_error(e)
+            raise
+        finally:
+            span.end_ns = time.time_ns()
+            _current_span.reset(token)
+            if parent is None:
+                self._finish(trace, span)
+
+    @contextmanager
+    def child_span(self, name: str, kind: int = SPAN_KIND_INTERNAL, attributes: Optional[Dict[str, Any]] = None):
+        """Like span(), but only inside an existing trace; elsewhere it yields None and records nothing."""
+        if _current_span.get() is None:
+            yield None
+            return
+        with self.span(name, kind, attributes) as span:
+            yield span
+
+    def _finish(self, trace: _Trace, root: Span) -> None:
+        duration_ms = (root.end_ns - root.start_ns) / 1e6
+        if trace.sampled or (self.slow_ms >= 0 and duration_ms >= self.slow_ms):
+            self.exporter.export(trace)
+
+tracer = Tracer()
@@ -1,23 +1,196 @@
+import atexit
+import json
 import logging
+import os
+import queue
+import random
 import re
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Dict, Optional
+from .tracing import current_span
+
+try:
+    import fcntl
+except ImportError:  # No flock (Windows): rotation is not coordinated between processes
+    fcntl = None
+
+LOG_PATH = os.environ.get('LOG_PATH', os.path.join(os.path.dirname(__file__), 'bot.log'))
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
+# 'json' (one object per line) or 'text'
+LOG_FORMAT = os.environ.get('LOG_FORMAT', 'json')
+LOG_MAX_BYTES = int(os.environ.get('LOG_MAX_BYTES', 10 * 1024 * 1024))
+LOG_BACKUP_COUNT = int(os.environ.get('LOG_BACKUP_COUNT', 5))
+# Records waiting for the writer thread; beyond this they are dropped instead of blocking
+LOG_QUEUE_SIZE = int(os.environ.get('LOG_QUEUE_SIZE', 10000))
+# Share of INFO-and-below records kept per logger (and its children), e.g. "httpx=0.01,User.handlers.activity=0.1"
+LOG_SAMPLE = os.environ.get('LOG_SAMPLE', 'httpx=0.05,apscheduler=0.1,User.handlers.activity=0.1')
+
+_listener = None
+
+def parse_sample_rates(spec: Optional[str]) -> Dict[str, float]:
+    """Parse "logger=rate,..." into a dict, ignoring malformed entries."""
+    rates = {}
+    for item in (spec or '').split(','):
+        name, _, rate = item.partition('=')
+        try:
+            rates[name.strip()] = min(max(float(rate), 0.0), 1.0)
+        except ValueError:
+            continue
+    return rates
+
+class SamplingFilter(logging.Filter):
+    """Keeps only a share of INFO-and-below records from chatty loggers.
+
+    The rate for a record comes from the most specific configured logger name
+    it falls under. Warnings and errors always pass.
+    """
+
+    def __init__(self, rates: Dict[str, float]):
+        super().__init__()
+        self.rates = rates
+        self._resolved: Dict[str, float] = {}
+
+    def _rate(self, name: str) -> float:
+        rate = self._resolved.get(name)
+        if rate is None:
+            rate = 1.0
+            candidate = name
+            while candidate:
+                if candidate in self.rates:
+                    rate = self.rates[candidate]
+                    break
+                candidate = candidate.rpartition('.')[0]
+            self._resolved[name] = rate
+        return rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self._rate(record.name)
+        return rate >= 1.0 or random.random() < rate
+
+class JsonFormatter(logging.Formatter):
+    """Formats each record as one JSON object per line."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        trace_id = getattr(record, 'trace_id', None)
+        if trace_id:
+            entry['trace_id'] = trace_id
+            entry['span_id'] = record.span_id
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        if record.stack_info:
+            entry['stack'] = self.formatStack(record.stack_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+class NonBlockingQueueHandler(QueueHandler):
+    """QueueHandler that leaves all formatting to the listener thread and never blocks.
+
+    The stock prepare() merges the message arguments and formats tracebacks in
+    the calling thread, which here is the bot's event loop; records are passed
+    on as they are instead (the queue stays in-process, so nothing needs
+    pickling). When the queue is full the record is dropped and counted.
+    """
+
+    dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Lets log lines be joined to the update's trace in traces.jsonl
+        span = current_span()
+        if span is not None:
+            record.trace_id = span.trace.trace_id
+            record.span_id = span.span_id
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+class SharedRotatingFileHandler(RotatingFileHandler):
+    """RotatingFileHandler for a file written by several processes (the web workers).
+
+    Before each write it reopens the file if another process has rotated it,
+    and rotation takes an flock, so two processes never rotate at once or keep
+    appending to a file that has already been moved aside.
+    """
+
+    def _rotated_elsewhere(self) -> bool:
+        try:
+            return os.stat(self.baseFilename).st_ino != os.fstat(self.stream.fileno()).st_ino
+        except OSError:
+            return True
+
+    def _reopen(self) -> None:
+        self.stream.close()
+        self.stream = self._open()
+
+    def shouldRollover(self, record: logging.LogRecord) -> bool:
+        if self.stream is not None and self._rotated_elsewhere():
+            self._reopen()
+        return super().shouldRollover(record)
+
+    def doRollover(self) -> None:
+        if fcntl is None:
+            super().doRollover()
+            return
+        with open(self.baseFilename + '.lock', 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            # Another process may have rotated while we waited for the lock
+            if self.stream is not None and self._rotated_elsewhere():
+                self._reopen()
+            else:
+                super().doRollover()
 
 def setup_logging():
-    """Configure logging for the application."""
-    logging.basicConfig(
-        filename='User/bot.log',
-        level=logging.INFO,
-        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    """Configure logging for the application.
+
+    Records go through a bounded queue to a writer thread, so logging never
+    blocks the event loop on disk. The writer appends to LOG_PATH, rotated at
+    LOG_MAX_BYTES with LOG_BACKUP_COUNT old files kept. Chatty loggers are
+    sampled per LOG_SAMPLE. Calling it again has no effect.
+    """
+    global _listener
+    if _listener is not None:
+        return
+    file_handler = SharedRotatingFileHandler(
+        LOG_PATH, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT, encoding='utf-8', delay=True
     )
+    if LOG_FORMAT == 'json':
+        file_handler.setFormatter(JsonFormatter())
+    else:
+        file_handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+
+    log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    queue_handler = NonBlockingQueueHandler(log_queue)
+    queue_handler.addFilter(SamplingFilter(parse_sample_rates(LOG_SAMPLE)))
+
+    root = logging.getLogger()
+    root.setLevel(LOG_LEVEL)
+    root.addHandler(queue_handler)
+
+    _listener = QueueListener(log_queue, file_handler, respect_handler_level=True)
+    _listener.start()
+    # Writes out whatever is still queued
+    atexit.register(_listener.stop)
 
 def format_price(price: float) -> str:
     """Format a price as a string with dollar sign and two decimal places."""
     try:
         return f"${price:.2f}"
     except (TypeError, ValueError):
-        logging.error(f"Invalid price value for formatting: {price}", exc_info=True)
+        logging.error("Invalid price value for formatting: %s", price, exc_info=True)
         return "$0.00"
-    
+
 def is_valid_ethiopian_phone(phone: str) -> bool:
     """Validate if the phone number matches Ethiopian format: +251(9|7)******** or 0(9|7)********."""
     pattern = r"^(?:\+251[97]\d{8}|0[97]\d{8})$"
-    return bool(re.match(pattern, phone))
\ No newline at end of file
+    return bool(re.match(pattern, phone))
@@ -1,14 +1,32 @@
+import csv
 import os
 import sys
-from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify
-import bcrypt
+import tempfile
+import threading
+import time
+from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify, send_file, g, Response
 from datetime import datetime, timedelta
 import json
-from telegram import Update
 from telegram.ext import Application
+from User.image_store import ImageStore
+from User.shared_cache import SharedCache
+from User.metrics import registry as metrics_registry, UPDATE_QUEUE_DEPTH, HTTP_REQUEST_DURATION
+from User.query_log import query_log
 
 # Use relative import for Database
-from .src.models.database import Database
+from .src.models.database import Database, with_archive
+from .src.cache import ResponseCache
+from .src.assets import AssetPipeline
+from .src.audit import AuditLogWriter
+from .src.auth import verify_password, PasswordCheckBusy
+from .src.bootstrap import bootstrap_admin_db
+from .src.catalog_import import CATALOG_FIELDS, parse_catalog, import_catalog, sync_categories
+from .src.live import ChangeFeed, sse_message
+from .src.bot_leader import BotLeader
+from .src.archive import ARCHIVE_DB_PATH
+from .src.snapshots import ReadSources, parse_route_modes
+from .src.exports import EXPORT_TYPES, REPORTS, table_export_query, iter_batches, csv_chunks, gzip_chunks
+from .src.export_jobs import ExportWorker, EXPORT_FORMATS
 
 # Initialize Flask app
 app = Flask(__name__, template_folder='src/templates', static_folder='src/static')
@@ -16,28 +34,118 @@ app.secret_key = os.environ.get('Secret_Key')  # For session management
 app.config['SESSION_TYPE'] = 'filesystem'
 app.config['PERMANENT_SESSION_LIFETIME'] = timedelta(hours=2)
 
-# Telegram app for webhook
+# Telegram app for webhook, set in the process that owns the bot
 telegram_app = None
 
+# Exactly one process per host runs the bot; the others forward /webhook to it
+bot_leader = BotLeader(
+    os.environ.get('BOT_LEADER_LOCK', os.path.join(os.path.dirname(__file__), 'instance', 'bot_leader.lock')),
+    os.environ.get('BOT_SOCKET_PATH', os.path.join(tempfile.gettempdir(), 'exodus_bot.sock'))
+)
+
 def set_telegram_app(app_instance):
+    """Register the running Application; call from inside the bot's event loop."""
     global telegram_app
     telegram_app = app_instance
+    bot_leader.attach(app_instance)
 
 # Database paths
 DB_PATH = os.environ.get('DB_PATH', os.path.join(os.path.dirname(__file__), '..', 'User', 'data.db'))
 ADMIN_DB_PATH = os.environ.get('ADMIN_DB_PATH', os.path.join(os.path.dirname(__file__), 'instance', 'admin.db'))
+EXPORT_DIR = os.environ.get('EXPORT_DIR', os.path.join(os.path.dirname(__file__), 'instance', 'exports'))
+
+# Initialize database connection pools
+db = Database(DB_PATH, pool_size=int(os.environ.get('DB_POOL_SIZE', 8)))
+admin_db = Database(ADMIN_DB_PATH, pool_size=int(os.environ.get('DB_POOL_SIZE', 8)))
+
+# Create admin tables and the default admin once per process, not on every login.
+# Run `python -m admin_dashboard.src.bootstrap` to do this ahead of deploys or add admins.
+bootstrap_admin_db(admin_db)
+
+@app.teardown_appcontext
+def release_connections(exception=None):
+    # Hand back connections left checked out by an early return in a route
+    db.release()
+    admin_db.release()
+
+# Read paths for reporting routes, e.g. REPORT_READ_SOURCES="analytics=backup,exports=backup".
+# Routes: dashboard, analytics, api_dashboard_stats, exports. Modes: live, wal, backup.
+read_sources = ReadSources(
+    db,
+    DB_PATH,
+    os.environ.get('SNAPSHOT_PATH', os.path.join(os.path.dirname(__file__), 'instance', 'data_snapshot.db')),
+    modes=parse_route_modes(os.environ.get('REPORT_READ_SOURCES'), default='wal'),
+    snapshot_max_age=int(os.environ.get('SNAPSHOT_MAX_AGE', 300))
+)
+
+# Host-wide cache file shared with the other workers and the bot
+shared_cache = SharedCache()
+
+# Cache for dashboard and analytics figures, invalidated on every data.db commit
+stats_cache = ResponseCache(DB_PATH, ttl=int(os.environ.get('STATS_CACHE_TTL', 30)), shared=shared_cache)
+
+def collect_update_queue_depth():
+    # Reads the leader's current Application, so a bot that has stopped reports 0
+    application = bot_leader.application
+    UPDATE_QUEUE_DEPTH.set(application.update_queue.qsize() if application is not None else 0)
+
+# Prometheus metrics for /metrics; each worker publishes its own for the others to add up
+metrics_registry.track_cache(shared_cache)
+metrics_registry.register_collector(collect_update_queue_depth)
+metrics_registry.start_publishing(shared_cache)
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
 
-# Initialize database connections
-db = Database(DB_PATH)
-admin_db = Database(ADMIN_DB_PATH)
+@app.after_request
+def record_request_duration(response):
+    started = g.pop('request_started', None)
+    if started is not None:
+        HTTP_REQUEST_DURATION.observe(
+            time.perf_counter() - started, endpoint=request.endpoint or 'unmatched', status=response.status_code
+        )
+    return response
+
+# Per-fingerprint SQL timing from this process (dashboard and bot), added to admin.db's query_stats
+query_log.start_flushing(ADMIN_DB_PATH)
+
+# Batched writer for admin_logs entries
+audit_log = AuditLogWriter(ADMIN_DB_PATH)
+
+# Tails data.db's change_log for the dashboard's live event stream
+change_feed = ChangeFeed(DB_PATH)
+
+# Each open dashboard stream holds one of the worker's threads (gunicorn --threads),
+# so only a few are allowed per worker, and each ends after SSE_MAX_STREAM_SECONDS;
+# the browser then reconnects with Last-Event-ID and loses nothing
+SSE_MAX_STREAMS = int(os.environ.get('SSE_MAX_STREAMS', 2))
+SSE_MAX_STREAM_SECONDS = int(os.environ.get('SSE_MAX_STREAM_SECONDS', 300))
+sse_slots = threading.BoundedSemaphore(SSE_MAX_STREAMS)
+
+# Background builder for large report exports
+export_worker = ExportWorker(read_sources, ADMIN_DB_PATH, EXPORT_DIR)
+# Started now so jobs cut off by a restart are marked failed without waiting for a visit to /exports
+export_worker.ensure_started()
+
+# Fingerprinted static assets and thumbnails of the shared product images, built once per process
+assets = AssetPipeline(
+    app.static_folder,
+    os.environ.get('ASSET_BUILD_DIR', os.path.join(os.path.dirname(__file__), 'instance', 'assets')),
+    image_store=ImageStore()
+).build()
+app.jinja_env.globals.update(asset_url=assets.url, thumbnail_url=assets.thumbnail_url)
+
+@app.route('/assets/<path:filename>')
+def asset(filename):
+    return assets.send(filename)
 
 # Webhook endpoint for Telegram
 @app.route('/webhook', methods=['POST'])
 def webhook():
-    if telegram_app is None:
-        return "Telegram bot not initialized", 500
-    update = Update.de_json(request.get_json(), telegram_app.bot)
-    telegram_app.process_update(update)
+    if not bot_leader.dispatch(request.get_data()):
+        # Telegram redelivers the update after an error response
+        return "Telegram bot not available", 503
     return '', 200
 
 # Health check endpoint
@@ -45,6 +153,14 @@ def webhook():
 def health_check():
     return "Telegram bot is running", 200
 
+# Prometheus scrape endpoint; set METRICS_TOKEN to require "Authorization: Bearer <token>"
+@app.route('/metrics')
+def prometheus_metrics():
+    token = os.environ.get('METRICS_TOKEN')
+    if token and request.headers.get('Authorization') != f"Bearer {token}":
+        return "Unauthorized", 401
+    return Response(metrics_registry.exposition(shared_cache), mimetype='text/plain; version=0.0.4')
+
 # Custom Jinja2 filter for timestamp conversion
 @app.template_filter('timestamp_to_date')
 def timestamp_to_date(timestamp):
@@ -54,6 +170,22 @@ def timestamp_to_date(timestamp):
     except:
         return 'Unknown'
 
+def parse_date_arg(name, args=None):
+    """Return a YYYY-MM-DD query argument (or field of `args`), or None if missing or malformed."""
+    value = (request.args if args is None else args).get(name)
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').strftime('%Y-%m-%d')
+    except ValueError:
+        return None
+
+def months_ago_start(months):
+    """First day (YYYY-MM-DD) of the month `months` months before the current one."""
+    today = datetime.now()
+    year, month = divmod(today.year * 12 + today.month - 1 - months, 12)
+    return f"{year:04d}-{month + 1:02d}-01"
+
 # Ensure user is logged in
 def login_required(f):
     def decorated_function(*args, **kwargs):
@@ -81,31 +213,27 @@ def login():
             flash('Please enter both username and password', 'error')
             return render_template('login.html')
         
-        # Connect to admin database
+        # Verify credentials (tables and the default admin are set up at startup)
         admin_db.connect()
-        
-        # Check if admin database exists, if not create it and add default admin
-        admin_db.create_tables()
-        
-        # Check if default admin exists, if not create it
-        default_admin = admin_db.fetch_one("SELECT * FROM admin_users WHERE username = ?", ('admin',))
-        if not default_admin:
-            # Hash the default password
-            hashed_password = bcrypt.hashpw('securepassword123'.encode('utf-8'), bcrypt.gensalt())
-            admin_db.initialize_admin('admin', hashed_password.decode('utf-8'))
-            default_admin = admin_db.fetch_one("SELECT * FROM admin_users WHERE username = ?", ('admin',))
-        
-        # Verify credentials
         admin = admin_db.fetch_one("SELECT * FROM admin_users WHERE username = ?", (username,))
         
-        if admin and bcrypt.checkpw(password.encode('utf-8'), admin['password_hash'].encode('utf-8')):
+        try:
+            password_ok = bool(admin) and verify_password(password, admin['password_hash'])
+        except PasswordCheckBusy:
+            admin_db.disconnect()
+            flash('Too many sign-in attempts right now. Please try again in a few seconds.', 'error')
+            response = app.make_response((render_template('login.html'), 429))
+            response.headers['Retry-After'] = '5'
+            return response
+        
+        if password_ok:
             session['admin_id'] = admin['id']
             session['admin_username'] = admin['username']
             
             # Update last login time
             admin_db.execute_query("UPDATE admin_users SET last_login = ? WHERE id = ?", 
                                   (datetime.now().strftime('%Y-%m-%d %H:%M:%S'), admin['id']))
-            admin_db.log_admin_action(admin['id'], 'login', f"Admin {username} logged in")
+            audit_log.log(admin['id'], 'login', f"Admin {username} logged in")
             
             flash('Login successful!', 'success')
             admin_db.disconnect()
@@ -123,9 +251,7 @@ def logout():
         admin_username = session.get('admin_username', 'Unknown')
         
         # Log the logout action
-        admin_db.connect()
-        admin_db.log_admin_action(admin_id, 'logout', f"Admin {admin_username} logged out")
-        admin_db.disconnect()
+        audit_log.log(admin_id, 'logout', f"Admin {admin_username} logged out")
         
         # Clear session
         session.pop('admin_id', None)
@@ -134,68 +260,86 @@ def logout():
     flash('You have been logged out', 'info')
     return redirect(url_for('login'))
 
-@app.route('/dashboard')
-@login_required
-def dashboard():
-    # Connect to database
-    db.connect()
-    
-    # Get dashboard statistics
-    total_games = len(db.fetch_all("SELECT * FROM products"))
-    total_orders = len(db.fetch_all("SELECT * FROM orders"))
-    total_users = len(db.fetch_all("SELECT * FROM users"))
-    
-    # Calculate total revenue
-    orders = db.fetch_all("SELECT total_price FROM orders")
-    total_revenue = sum(float(order['total_price']) for order in orders)
-    
-    # Get recent orders
-    recent_orders = db.fetch_all("SELECT * FROM orders ORDER BY id DESC LIMIT 5")
-    
-    # Get low stock products (less than 5)
-    low_stock = db.fetch_all("SELECT * FROM products WHERE stock < 5")
-    
-    # Get top selling products
-    top_products_query = """
-    SELECT p.id, p.name, p.platform, SUM(oi.quantity) as total_sold
-    FROM products p
-    JOIN order_items oi ON p.id = oi.product_id
-    GROUP BY p.id
-    ORDER BY total_sold DESC
-    LIMIT 5
-    """
-    top_products = db.fetch_all(top_products_query)
-    
-    # Get platform distribution
-    platform_query = """
-    SELECT platform, COUNT(*) as count
-    FROM products
-    GROUP BY platform
-    """
-    platforms = db.fetch_all(platform_query)
+# Hot orders plus those moved to archive.db, without reading the archive
+ORDER_COUNT_QUERY = """
+SELECT (SELECT COUNT(*) FROM orders)
+     + COALESCE((SELECT row_count FROM archive_totals WHERE table_name = 'orders'), 0) AS count
+"""
+
+def compute_dashboard_stats():
+    """Compute the figures shown on the dashboard page."""
+    reader = read_sources.database('dashboard')
+    with reader.session():
+        # Get dashboard statistics
+        total_games = reader.fetch_one("SELECT COUNT(*) AS count FROM products")['count']
+        total_orders = reader.fetch_one(ORDER_COUNT_QUERY)['count']
+        total_users = reader.fetch_one("SELECT COUNT(*) AS count FROM users")['count']
+    
+        # Calculate total revenue from the daily sales rollup
+        revenue_result = reader.fetch_one("SELECT COALESCE(SUM(revenue), 0) AS revenue FROM sales_daily_totals")
+        total_revenue = float(revenue_result['revenue']) if revenue_result else 0
+    
+        # Get recent orders
+        recent_orders = reader.fetch_all("SELECT * FROM orders ORDER BY id DESC LIMIT 5")
+    
+        # Get low stock products (less than 5)
+        low_stock = reader.fetch_all("SELECT * FROM products WHERE stock < 5")
+    
+        # Get top selling products
+        top_products_query = """
+        SELECT p.id, p.name, p.platform, s.total_sold
+        FROM (
+            SELECT product_id, SUM(quantity) as total_sold
+            FROM sales_daily_product
+            GROUP BY product_id
+            HAVING total_sold > 0
+            ORDER BY total_sold DESC
+            LIMIT 5
+        ) s
+        JOIN products p ON p.id = s.product_id
+        ORDER BY s.total_sold DESC
+        """
+        top_products = reader.fetch_all(top_products_query)
     
-    # Get monthly revenue data for chart
-    monthly_revenue_query = """
-    SELECT strftime('%Y-%m', datetime(rowid, 'unixepoch')) as month, SUM(total_price) as revenue
-    FROM orders
-    GROUP BY month
-    ORDER BY month
-    LIMIT 6
-    """
-    monthly_revenue = db.fetch_all(monthly_revenue_query)
+        # Get platform distribution
+        platform_query = """
+        SELECT platform, COUNT(*) as count
+        FROM products
+        GROUP BY platform
+        """
+        platforms = reader.fetch_all(platform_query)
+    
+        # Get monthly revenue data for chart (last 6 months)
+        monthly_revenue_query = """
+        SELECT substr(day, 1, 7) as month, SUM(revenue) as revenue
+        FROM sales_daily_totals
+        WHERE day >= ?
+        GROUP BY month
+        ORDER BY month
+        """
+        monthly_revenue = reader.fetch_all(monthly_revenue_query, (months_ago_start(5),))
     
-    db.disconnect()
+        # Position in the change log these figures reflect; the live feed resumes from here
+        feed_cursor = reader.fetch_one("SELECT COALESCE(MAX(id), 0) AS id FROM change_log")
     
-    return render_template('dashboard.html', 
-                          total_games=total_games,
-                          total_orders=total_orders,
-                          total_users=total_users,
-                          total_revenue=total_revenue,
-                          recent_orders=recent_orders,
-                          low_stock=low_stock,
-                          top_products=top_products,
-                          platforms=platforms,
-                          monthly_revenue=monthly_revenue)
+    return {
+        'feed_cursor': feed_cursor['id'] if feed_cursor else None,
+        'total_games': total_games,
+        'total_orders': total_orders,
+        'total_users': total_users,
+        'total_revenue': total_revenue,
+        'recent_orders': recent_orders,
+        'low_stock': low_stock,
+        'top_products': top_products,
+        'platforms': platforms,
+        'monthly_revenue': monthly_revenue
+    }
+
+@app.route('/dashboard')
+@login_required
+def dashboard():
+    stats = stats_cache.get_or_compute('dashboard', compute_dashboard_stats)
+    return render_template('dashboard.html', **stats)
 
 # Game Management Routes
 @app.route('/games')
@@ -229,13 +373,11 @@ def add_game():
         
         if result:
             # Log the action
-            admin_db.connect()
-            admin_db.log_admin_action(
+            audit_log.log(
                 session['admin_id'], 
                 'add_game', 
                 f"Added game: {name} ({platform}) at ${price}"
             )
-            admin_db.disconnect()
             
             flash('Game added successfully!', 'success')
             db.disconnect()
@@ -246,6 +388,53 @@ def add_game():
     
     return render_template('add_game.html')
 
+@app.route('/games/import', methods=['GET', 'POST'])
+@login_required
+def import_games():
+    if request.method == 'GET':
+        return render_template('import_games.html', fields=CATALOG_FIELDS, report=None)
+    
+    wants_json = request.is_json or request.args.get('format') == 'json'
+    try:
+        if request.is_json:
+            raw_rows = request.get_json()
+            if not isinstance(raw_rows, list):
+                raise ValueError("JSON catalog must be a list of products")
+        else:
+            upload = request.files.get('file')
+            if not upload or not upload.filename:
+                raise ValueError("Please choose a CSV or JSON file")
+            fmt = request.form.get('format') or os.path.splitext(upload.filename)[1].lstrip('.').lower()
+            raw_rows = parse_catalog(upload.read().decode('utf-8-sig'), fmt)
+    except (ValueError, UnicodeDecodeError, csv.Error) as e:
+        if wants_json:
+            return jsonify({'error': str(e)}), 400
+        flash(f'Could not read catalog: {e}', 'error')
+        return render_template('import_games.html', fields=CATALOG_FIELDS, report=None)
+    
+    dry_run = bool(request.values.get('dry_run'))
+    report = import_catalog(db, raw_rows, dry_run=dry_run)
+    
+    if report['written']:
+        # Refresh derived state once for the whole batch
+        sync_categories(admin_db, report['platforms'])
+        stats_cache.invalidate()
+        audit_log.log(
+            session['admin_id'],
+            'import_games',
+            f"Imported catalog: {report['inserted']} added, {report['updated']} updated"
+        )
+    
+    if wants_json:
+        return jsonify(report), (200 if report['written'] or (dry_run and not report['invalid']) else 400)
+    if report['written']:
+        flash(f"Imported {report['inserted'] + report['updated']} games", 'success')
+    elif report.get('error'):
+        flash(f"Import failed: {report['error']}", 'error')
+    elif report['invalid']:
+        flash(f"{report['invalid']} rows are invalid; nothing was imported", 'error')
+    return render_template('import_games.html', fields=CATALOG_FIELDS, report=report, dry_run=dry_run)
+
 @app.route('/games/edit/<int:game_id>', methods=['GET', 'POST'])
 @login_required
 def edit_game(game_id):
@@ -276,13 +465,11 @@ def edit_game(game_id):
         
         if result:
             # Log the action
-            admin_db.connect()
-            admin_db.log_admin_action(
+            audit_log.log(
                 session['admin_id'], 
                 'edit_game', 
                 f"Edited game ID {game_id}: {name} ({platform}) at ${price}"
             )
-            admin_db.disconnect()
             
             flash('Game updated successfully!', 'success')
             db.disconnect()
@@ -315,13 +502,11 @@ def delete_game(game_id):
     
     if result:
         # Log the action
-        admin_db.connect()
-        admin_db.log_admin_action(
+        audit_log.log(
             session['admin_id'], 
             'delete_game', 
             f"Deleted game ID {game_id}: {game['name']} ({game['platform']})"
         )
-        admin_db.disconnect()
         
         flash('Game deleted successfully!', 'success')
     else:
@@ -355,13 +540,11 @@ def restock_game(game_id):
         
         if result:
             # Log the action
-            admin_db.connect()
-            admin_db.log_admin_action(
+            audit_log.log(
                 session['admin_id'], 
                 'restock_game', 
                 f"Restocked game ID {game_id}: {game['name']} to {stock} units"
             )
-            admin_db.disconnect()
             
             flash('Game restocked successfully!', 'success')
             db.disconnect()
@@ -373,43 +556,121 @@ def restock_game(game_id):
     return render_template('restock_game.html', game=game)
 
 # Order Management Routes
+ORDERS_PAGE_SIZE = 50
+ORDERS_MAX_PAGE_SIZE = 200
+
 @app.route('/orders')
 @login_required
 def orders():
+    # Keyset pagination: ?before=<order id> returns the next page of older orders
+    before = request.args.get('before', type=int)
+    limit = max(1, min(request.args.get('limit', ORDERS_PAGE_SIZE, type=int) or ORDERS_PAGE_SIZE, ORDERS_MAX_PAGE_SIZE))
+    status = request.args.get('status') or None
+    user_id = request.args.get('user_id', type=int)
+    date_from = parse_date_arg('date_from')
+    date_to = parse_date_arg('date_to')
+    
+    conditions = []
+    params = []
+    if before:
+        conditions.append("o.id < ?")
+        params.append(before)
+    if status:
+        conditions.append("o.status = ?")
+        params.append(status)
+    if user_id:
+        conditions.append("o.user_id = ?")
+        params.append(user_id)
+    if date_from:
+        conditions.append("o.created_at >= ?")
+        params.append(date_from)
+    if date_to:
+        conditions.append("o.created_at < date(?, '+1 day')")
+        params.append(date_to)
+    where_clause = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    
+    # One joined query for the page; fetch one extra row to know if there is a next page
+    orders_query = f"""
+    SELECT o.id, o.user_id, o.total_price, o.status, o.created_at,
+           u.id AS u_id, u.username, u.first_name, u.last_name
+    FROM orders o
+    LEFT JOIN users u ON u.id = o.user_id
+    {where_clause}
+    ORDER BY o.id DESC
+    LIMIT ?
+    """
     db.connect()
-    orders = db.fetch_all("SELECT * FROM orders ORDER BY id DESC")
-    
-    # Get user details for each order
-    for order in orders:
-        user = db.fetch_one("SELECT * FROM users WHERE id = ?", (order['user_id'],))
-        order['user'] = user
-    
+    rows = db.fetch_all(orders_query, params + [limit + 1])
     db.disconnect()
-    return render_template('orders.html', orders=orders)
+    
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    orders = []
+    for row in rows:
+        user = None
+        if row['u_id'] is not None:
+            user = {
+                'id': row['u_id'],
+                'username': row['username'],
+                'first_name': row['first_name'],
+                'last_name': row['last_name']
+            }
+        orders.append({
+            'id': row['id'],
+            'user_id': row['user_id'],
+            'total_price': row['total_price'],
+            'status': row['status'],
+            'created_at': row['created_at'],
+            'user': user
+        })
+    next_cursor = orders[-1]['id'] if has_more and orders else None
+    
+    if request.args.get('format') == 'json':
+        return jsonify({'orders': orders, 'next_cursor': next_cursor})
+    
+    filters = {'status': status, 'user_id': user_id, 'date_from': date_from, 'date_to': date_to,
+               'limit': limit if limit != ORDERS_PAGE_SIZE else None}
+    return render_template('orders.html', orders=orders, next_cursor=next_cursor,
+                          is_first_page=not before, filters=filters)
 
 @app.route('/orders/<int:order_id>')
 @login_required
 def order_details(order_id):
     db.connect()
-    order = db.fetch_one("SELECT * FROM orders WHERE id = ?", (order_id,))
+    order_query = """
+    SELECT o.*, u.id AS u_id, u.username, u.first_name, u.last_name
+    FROM orders o
+    LEFT JOIN users u ON u.id = o.user_id
+    WHERE o.id = ?
+    """
+    row = db.fetch_one(order_query, (order_id,))
+    archived = False
     
-    if not order:
+    # Orders moved to archive.db are looked up there on request
+    if not row and archive_requested():
+        with db.attached(ARCHIVE_DB_PATH) as archived:
+            if archived:
+                row = db.fetch_one(order_query.replace("FROM orders o", "FROM archive.orders o"), (order_id,))
+                items = db.fetch_order_items([order_id], archived=True)[order_id] if row else []
+    
+    if not row:
         db.disconnect()
         flash('Order not found', 'error')
         return redirect(url_for('orders'))
     
-    # Get user details
-    user = db.fetch_one("SELECT * FROM users WHERE id = ?", (order['user_id'],))
-    order['user'] = user
+    order = dict(row)
+    order['user'] = None
+    if row['u_id'] is not None:
+        order['user'] = {
+            'id': row['u_id'],
+            'username': row['username'],
+            'first_name': row['first_name'],
+            'last_name': row['last_name']
+        }
     
     # Get order items
-    items_query = """
-    SELECT oi.*, p.name, p.platform, p.image_url
-    FROM order_items oi
-    JOIN products p ON oi.product_id = p.id
-    WHERE oi.order_id = ?
-    """
-    items = db.fetch_all(items_query, (order_id,))
+    if not archived:
+        items = db.fetch_order_items([order_id])[order_id]
     
     # Parse user details JSON if available
     user_details = {}
@@ -420,7 +681,7 @@ def order_details(order_id):
             user_details = {'error': 'Could not parse user details'}
     
     db.disconnect()
-    return render_template('order_details.html', order=order, items=items, user_details=user_details)
+    return render_template('order_details.html', order=order, items=items, user_details=user_details, archived=archived)
 
 @app.route('/orders/update_status/<int:order_id>', methods=['POST'])
 @login_required
@@ -446,13 +707,11 @@ def update_order_status(order_id):
     
     if result:
         # Log the action
-        admin_db.connect()
-        admin_db.log_admin_action(
+        audit_log.log(
             session['admin_id'], 
             'update_order_status', 
             f"Updated order ID {order_id} status to {status}"
         )
-        admin_db.disconnect()
         
         flash(f'Order status updated to {status}!', 'success')
     else:
@@ -505,7 +764,7 @@ def add_category():
         )
         
         if result:
-            admin_db.log_admin_action(
+            audit_log.log(
                 session['admin_id'], 
                 'add_category', 
                 f"Added category: {name}"
@@ -563,7 +822,7 @@ def edit_category(category_name):
                 )
                 db.disconnect()
             
-            admin_db.log_admin_action(
+            audit_log.log(
                 session['admin_id'], 
                 'edit_category', 
                 f"Updated category from {category_name} to {new_name}"
@@ -599,7 +858,7 @@ def delete_category(category_name):
     result = admin_db.execute_query("DELETE FROM categories WHERE name = ?", (category_name,))
     
     if result:
-        admin_db.log_admin_action(
+        audit_log.log(
             session['admin_id'], 
             'delete_category', 
             f"Deleted category: {category_name}"
@@ -614,23 +873,73 @@ def delete_category(category_name):
     return redirect(url_for('categories'))
 
 # Client Management Routes
+CLIENTS_PAGE_SIZE = 50
+CLIENT_SORTS = {
+    'total_spent': 'total_spent',
+    'order_count': 'order_count',
+}
+
 @app.route('/clients')
 @login_required
 def clients():
-    db.connect()
-    clients = db.fetch_all("SELECT * FROM users ORDER BY id DESC")
-    
-    # Get order count for each client
-    for client in clients:
-        orders = db.fetch_all("SELECT * FROM orders WHERE user_id = ?", (client['id'],))
-        client['order_count'] = len(orders)
-        
-        # Calculate total spent
-        total_spent = sum(float(order['total_price']) for order in orders)
-        client['total_spent'] = total_spent
+    sort = request.args.get('sort')
+    if sort not in CLIENT_SORTS:
+        sort = None
+    before = request.args.get('before', type=int)
+    before_value = request.args.get('before_value', type=float)
+    
+    if sort is None:
+        # Newest clients first: page the users table by id, then aggregate only that page
+        page_condition = "WHERE id < ?" if before else ""
+        params = [before] if before else []
+        clients_query = f"""
+        SELECT u.id, u.username, u.first_name, u.last_name,
+               COUNT(o.id) AS order_count,
+               COALESCE(SUM(o.total_price), 0) AS total_spent
+        FROM (SELECT * FROM users {page_condition} ORDER BY id DESC LIMIT ?) u
+        LEFT JOIN orders o ON o.user_id = u.id
+        GROUP BY u.id
+        ORDER BY u.id DESC
+        """
+    else:
+        # Keyset over (aggregate, id) so each page continues where the last one ended
+        column = CLIENT_SORTS[sort]
+        having_clause = ""
+        params = []
+        if before and before_value is not None:
+            having_clause = f"HAVING {column} < ? OR ({column} = ? AND u.id < ?)"
+            params = [before_value, before_value, before]
+        clients_query = f"""
+        SELECT u.id, u.username, u.first_name, u.last_name,
+               COUNT(o.id) AS order_count,
+               COALESCE(SUM(o.total_price), 0) AS total_spent
+        FROM users u
+        LEFT JOIN orders o ON o.user_id = u.id
+        GROUP BY u.id
+        {having_clause}
+        ORDER BY {column} DESC, u.id DESC
+        LIMIT ?
+        """
     
+    db.connect()
+    rows = db.fetch_all(clients_query, params + [CLIENTS_PAGE_SIZE + 1])
     db.disconnect()
-    return render_template('clients.html', clients=clients)
+    
+    has_more = len(rows) > CLIENTS_PAGE_SIZE
+    clients = [dict(row) for row in rows[:CLIENTS_PAGE_SIZE]]
+    next_page = None
+    if has_more and clients:
+        last = clients[-1]
+        next_page = {'sort': sort, 'before': last['id']}
+        if sort:
+            next_page['before_value'] = last[CLIENT_SORTS[sort]]
+    
+    return render_template('clients.html', clients=clients, sort=sort,
+                          next_page=next_page, is_first_page=not before)
+
+def archive_requested():
+    """Whether the request asked for archived rows (?archive=1)."""
+    return request.args.get('archive') == '1'
 
 @app.route('/clients/<int:client_id>')
 @login_required
@@ -643,112 +952,124 @@ def client_details(client_id):
         flash('Client not found', 'error')
         return redirect(url_for('clients'))
     
-    # Get client orders
-    orders = db.fetch_all("SELECT * FROM orders WHERE user_id = ?", (client_id,))
-    
-    # Get order items for each order
-    for order in orders:
-        items_query = """
-        SELECT oi.*, p.name, p.platform
-        FROM order_items oi
-        JOIN products p ON oi.product_id = p.id
-        WHERE oi.order_id = ?
-        """
-        items = db.fetch_all(items_query, (order['id'],))
-        order['items'] = items
+    # Get client orders, including archived ones with ?archive=1
+    with db.attached(ARCHIVE_DB_PATH if archive_requested() else None) as archived:
+        orders = [dict(order) for order in db.fetch_all(
+            f"SELECT * FROM {with_archive('orders', archived)} WHERE user_id = ? ORDER BY id", (client_id,)
+        )]
+        
+        # Get order items for all orders in one batch
+        items_by_order = db.fetch_order_items([order['id'] for order in orders], archived=archived)
+        for order in orders:
+            order['items'] = items_by_order[order['id']]
     
     db.disconnect()
-    return render_template('client_details.html', client=client, orders=orders)
+    return render_template('client_details.html', client=client, orders=orders, archived=archived)
 
 # Analytics Routes
+def compute_analytics():
+    """Compute the figures shown on the analytics page."""
+    reader = read_sources.database('analytics')
+    with reader.session():
+        # All figures below come from the daily sales rollups maintained by data.db triggers
+    
+        # Total games sold
+        total_sold_query = """
+        SELECT SUM(quantity) as total
+        FROM sales_daily_product
+        """
+        total_sold_result = reader.fetch_one(total_sold_query)
+        total_sold = total_sold_result['total'] if total_sold_result and total_sold_result['total'] else 0
+    
+        # Most sold platforms
+        platform_sales_query = """
+        SELECT platform, SUM(quantity) as total
+        FROM sales_daily_platform
+        GROUP BY platform
+        HAVING total > 0
+        ORDER BY total DESC
+        """
+        platform_sales = reader.fetch_all(platform_sales_query)
+    
+        # Most sold games
+        game_sales_query = """
+        SELECT p.id, p.name, p.platform, s.total
+        FROM (
+            SELECT product_id, SUM(quantity) as total
+            FROM sales_daily_product
+            GROUP BY product_id
+            HAVING total > 0
+            ORDER BY total DESC
+            LIMIT 10
+        ) s
+        JOIN products p ON p.id = s.product_id
+        ORDER BY s.total DESC
+        """
+        game_sales = reader.fetch_all(game_sales_query)
+    
+        # Monthly revenue
+        month_start = datetime.now().strftime('%Y-%m-01')
+        monthly_revenue_query = """
+        SELECT SUM(revenue) as revenue
+        FROM sales_daily_totals
+        WHERE day >= ?
+        """
+        monthly_revenue_result = reader.fetch_one(monthly_revenue_query, (month_start,))
+        monthly_revenue = monthly_revenue_result['revenue'] if monthly_revenue_result and monthly_revenue_result['revenue'] else 0
+    
+        # Revenue by platform
+        platform_revenue_query = """
+        SELECT platform, SUM(revenue) as revenue
+        FROM sales_daily_platform
+        GROUP BY platform
+        HAVING revenue > 0
+        ORDER BY revenue DESC
+        """
+        platform_revenue = reader.fetch_all(platform_revenue_query)
+    
+        # Revenue by game
+        game_revenue_query = """
+        SELECT p.id, p.name, p.platform, s.revenue
+        FROM (
+            SELECT product_id, SUM(revenue) as revenue
+            FROM sales_daily_product
+            GROUP BY product_id
+            HAVING revenue > 0
+            ORDER BY revenue DESC
+            LIMIT 10
+        ) s
+        JOIN products p ON p.id = s.product_id
+        ORDER BY s.revenue DESC
+        """
+        game_revenue = reader.fetch_all(game_revenue_query)
+    
+        # Monthly sales trend (last 6 months)
+        sales_trend_query = """
+        SELECT substr(day, 1, 7) as month,
+               SUM(order_count) as order_count,
+               SUM(revenue) as revenue
+        FROM sales_daily_totals
+        WHERE day >= ?
+        GROUP BY month
+        ORDER BY month
+        """
+        sales_trend = reader.fetch_all(sales_trend_query, (months_ago_start(5),))
+    
+    return {
+        'total_sold': total_sold,
+        'platform_sales': platform_sales,
+        'game_sales': game_sales,
+        'monthly_revenue': monthly_revenue,
+        'platform_revenue': platform_revenue,
+        'game_revenue': game_revenue,
+        'sales_trend': sales_trend
+    }
+
 @app.route('/analytics')
 @login_required
 def analytics():
-    db.connect()
-    
-    # Total games sold
-    total_sold_query = """
-    SELECT SUM(quantity) as total
-    FROM order_items
-    """
-    total_sold_result = db.fetch_one(total_sold_query)
-    total_sold = total_sold_result['total'] if total_sold_result and total_sold_result['total'] else 0
-    
-    # Most sold platforms
-    platform_sales_query = """
-    SELECT p.platform, SUM(oi.quantity) as total
-    FROM products p
-    JOIN order_items oi ON p.id = oi.product_id
-    GROUP BY p.platform
-    ORDER BY total DESC
-    """
-    platform_sales = db.fetch_all(platform_sales_query)
-    
-    # Most sold games
-    game_sales_query = """
-    SELECT p.id, p.name, p.platform, SUM(oi.quantity) as total
-    FROM products p
-    JOIN order_items oi ON p.id = oi.product_id
-    GROUP BY p.id
-    ORDER BY total DESC
-    LIMIT 10
-    """
-    game_sales = db.fetch_all(game_sales_query)
-    
-    # Monthly revenue
-    current_month = datetime.now().strftime('%Y-%m')
-    monthly_revenue_query = """
-    SELECT SUM(total_price) as revenue
-    FROM orders
-    WHERE strftime('%Y-%m', datetime(rowid, 'unixepoch')) = ?
-    """
-    monthly_revenue_result = db.fetch_one(monthly_revenue_query, (current_month,))
-    monthly_revenue = monthly_revenue_result['revenue'] if monthly_revenue_result and monthly_revenue_result['revenue'] else 0
-    
-    # Revenue by platform
-    platform_revenue_query = """
-    SELECT p.platform, SUM(oi.quantity * oi.price) as revenue
-    FROM products p
-    JOIN order_items oi ON p.id = oi.product_id
-    GROUP BY p.platform
-    ORDER BY revenue DESC
-    """
-    platform_revenue = db.fetch_all(platform_revenue_query)
-    
-    # Revenue by game
-    game_revenue_query = """
-    SELECT p.id, p.name, p.platform, SUM(oi.quantity * oi.price) as revenue
-    FROM products p
-    JOIN order_items oi ON p.id = oi.product_id
-    GROUP BY p.id
-    ORDER BY revenue DESC
-    LIMIT 10
-    """
-    game_revenue = db.fetch_all(game_revenue_query)
-    
-    # Monthly sales trend (last 6 months)
-    sales_trend_query = """
-    SELECT strftime('%Y-%m', datetime(rowid, 'unixepoch')) as month, 
-           COUNT(*) as order_count,
-           SUM(total_price) as revenue
-    FROM orders
-    GROUP BY month
-    ORDER BY month DESC
-    LIMIT 6
-    """
-    sales_trend = db.fetch_all(sales_trend_query)
-    sales_trend.reverse()  # Show oldest to newest
-    
-    db.disconnect()
-    
-    return render_template('analytics.html',
-                          total_sold=total_sold,
-                          platform_sales=platform_sales,
-                          game_sales=game_sales,
-                          monthly_revenue=monthly_revenue,
-                          platform_revenue=platform_revenue,
-                          game_revenue=game_revenue,
-                          sales_trend=sales_trend)
+    stats = stats_cache.get_or_compute('analytics', compute_analytics)
+    return render_template('analytics.html', **stats)
 
 # Stock Management Routes
 @app.route('/stock')
@@ -809,7 +1130,7 @@ def set_stock_alert(product_id):
         )
     
     if result:
-        admin_db.log_admin_action(
+        audit_log.log(
             session['admin_id'], 
             'set_stock_alert', 
             f"Set stock alert for {product['name']} to {threshold} units"
@@ -887,7 +1208,7 @@ def add_discount(product_id):
             )
         
         if result:
-            admin_db.log_admin_action(
+            audit_log.log(
                 session['admin_id'], 
                 'add_discount', 
                 f"Added {percentage}% discount for {product['name']}"
@@ -921,7 +1242,7 @@ def delete_discount(product_id):
     result = admin_db.execute_query("DELETE FROM discounts WHERE product_id = ?", (product_id,))
     
     if result:
-        admin_db.log_admin_action(
+        audit_log.log(
             session['admin_id'], 
             'delete_discount', 
             f"Removed discount for {product['name']}"
@@ -971,7 +1292,7 @@ def send_broadcast():
         )
         
         if result:
-            admin_db.log_admin_action(
+            audit_log.log(
                 session['admin_id'], 
                 'send_broadcast', 
                 f"Sent broadcast to {target_group}: {message[:50]}..."
@@ -990,6 +1311,8 @@ def send_broadcast():
 @app.route('/logs')
 @login_required
 def logs():
+    # Show entries still waiting in the batched writer too
+    audit_log.flush()
     admin_db.connect()
     
     logs = admin_db.fetch_all("SELECT * FROM admin_logs ORDER BY id DESC LIMIT 100")
@@ -1007,86 +1330,162 @@ def logs():
     
     return render_template('logs.html', logs=logs, admins=admins)
 
+# Slow-query log: SQL statements grouped by fingerprint, from every worker and the bot
+QUERY_STATS_ORDER = {
+    'total': 'total_ms DESC',
+    'avg': 'total_ms / MAX(calls, 1) DESC',
+    'max': 'max_ms DESC',
+    'slow': 'slow_calls DESC, total_ms DESC',
+    'calls': 'calls DESC',
+}
+
+@app.route('/queries')
+@login_required
+def query_stats():
+    # Include this process's numbers not yet written
+    query_log.flush()
+    sort = request.args.get('sort', 'total')
+    if sort not in QUERY_STATS_ORDER:
+        sort = 'total'
+    with admin_db.session():
+        stats = admin_db.fetch_all(f"""
+            SELECT *, total_ms / MAX(calls, 1) AS avg_ms FROM query_stats
+            ORDER BY {QUERY_STATS_ORDER[sort]}
+            LIMIT 200
+        """)
+    return render_template('query_stats.html', stats=stats, sort=sort, slow_ms=query_log.slow_ms)
+
+@app.route('/queries/reset', methods=['POST'])
+@login_required
+def reset_query_stats():
+    if not query_log.reset():
+        flash('Could not clear query statistics', 'error')
+        return redirect(url_for('query_stats'))
+    audit_log.log(session['admin_id'], 'reset_query_stats', "Cleared query statistics")
+    flash('Query statistics cleared', 'success')
+    return redirect(url_for('query_stats'))
+
 # Export Data Routes
 @app.route('/export/<string:data_type>')
 @login_required
 def export_data(data_type):
-    db.connect()
-    
-    if data_type == 'orders':
-        data = db.fetch_all("SELECT * FROM orders")
-        filename = 'orders.csv'
-        headers = ['id', 'user_id', 'total_price', 'status', 'user_details']
-    elif data_type == 'clients':
-        data = db.fetch_all("SELECT * FROM users")
-        filename = 'clients.csv'
-        headers = ['id', 'username', 'first_name', 'last_name']
-    elif data_type == 'products':
-        data = db.fetch_all("SELECT * FROM products")
-        filename = 'products.csv'
-        headers = ['id', 'name', 'platform', 'price', 'stock', 'description', 'image_url']
-    else:
-        db.disconnect()
+    if data_type not in EXPORT_TYPES:
         flash('Invalid export type', 'error')
         return redirect(url_for('dashboard'))
     
-    db.disconnect()
-    
-    # Convert to CSV
-    csv_data = ','.join(headers) + '\n'
-    for row in data:
-        csv_data += ','.join(str(row[header]) for header in headers) + '\n'
+    # Optional filters (orders only): ?status=&date_from=YYYY-MM-DD&date_to=YYYY-MM-DD&archive=1
+    archived = data_type == 'orders' and archive_requested() and os.path.exists(ARCHIVE_DB_PATH)
+    query, params = table_export_query(
+        data_type,
+        status=request.args.get('status') or None,
+        date_from=parse_date_arg('date_from'),
+        date_to=parse_date_arg('date_to'),
+        archived=archived
+    )
+    spec = EXPORT_TYPES[data_type]
+    filename = spec['filename']
     
     # Log the export
-    admin_db.connect()
-    admin_db.log_admin_action(
+    audit_log.log(
         session['admin_id'], 
         'export_data', 
         f"Exported {data_type} data"
     )
-    admin_db.disconnect()
     
-    # Create response
-    response = app.response_class(
-        response=csv_data,
-        status=200,
-        mimetype='text/csv'
+    # Stream the CSV in batches so memory stays flat for large tables
+    chunks = csv_chunks(
+        iter_batches(read_sources.database('exports'), query, params, archive_path=ARCHIVE_DB_PATH if archived else None),
+        spec['headers']
     )
+    if request.args.get('compress') == 'gzip':
+        response = app.response_class(gzip_chunks(chunks), status=200, mimetype='application/gzip')
+        filename += '.gz'
+    else:
+        response = app.response_class(chunks, status=200, mimetype='text/csv')
     response.headers["Content-Disposition"] = f"attachment; filename={filename}"
     return response
 
-# API Endpoints for AJAX requests
-@app.route('/api/dashboard/stats')
+# Background Export Job Routes
+@app.route('/exports')
 @login_required
-def api_dashboard_stats():
-    db.connect()
+def export_jobs():
+    export_worker.ensure_started()
+    admin_db.connect()
+    jobs = admin_db.fetch_all("SELECT * FROM export_jobs ORDER BY id DESC LIMIT 50")
+    admin_db.disconnect()
+    return render_template('exports.html', jobs=jobs, reports=REPORTS, formats=EXPORT_FORMATS)
+
+@app.route('/exports', methods=['POST'])
+@login_required
+def submit_export_job():
+    report = request.form.get('report')
+    export_format = request.form.get('format')
+    filters = {
+        'status': request.form.get('status') or None,
+        'date_from': parse_date_arg('date_from', request.form),
+        'date_to': parse_date_arg('date_to', request.form)
+    }
+    # Reject bad dates now rather than failing inside the job
+    if any(request.form.get(name) and filters[name] is None for name in ('date_from', 'date_to')):
+        flash('Dates must be in YYYY-MM-DD format', 'error')
+        return redirect(url_for('export_jobs'))
+    
+    job_id = export_worker.submit(report, export_format, session['admin_id'], filters)
+    if not job_id:
+        flash('Invalid report or format', 'error')
+        return redirect(url_for('export_jobs'))
+    
+    audit_log.log(
+        session['admin_id'],
+        'submit_export',
+        f"Queued {report} export as {export_format} (job #{job_id})"
+    )
     
-    # Get dashboard statistics
-    total_games = len(db.fetch_all("SELECT * FROM products"))
-    total_orders = len(db.fetch_all("SELECT * FROM orders"))
-    total_users = len(db.fetch_all("SELECT * FROM users"))
-    
-    # Calculate total revenue
-    orders = db.fetch_all("SELECT total_price FROM orders")
-    total_revenue = sum(float(order['total_price']) for order in orders)
-    
-    # Get monthly revenue data for chart
-    monthly_revenue_query = """
-    SELECT strftime('%Y-%m', datetime(rowid, 'unixepoch')) as month, SUM(total_price) as revenue
-    FROM orders
-    GROUP BY month
-    ORDER BY month
-    LIMIT 6
-    """
-    monthly_revenue = db.fetch_all(monthly_revenue_query)
+    flash(f'Export job #{job_id} queued. Refresh this page to follow its progress.', 'success')
+    return redirect(url_for('export_jobs'))
+
+@app.route('/exports/<int:job_id>/download')
+@login_required
+def download_export(job_id):
+    admin_db.connect()
+    job = admin_db.fetch_one("SELECT * FROM export_jobs WHERE id = ?", (job_id,))
+    admin_db.disconnect()
     
-    # Format for Chart.js
-    months = [item['month'] for item in monthly_revenue]
-    revenues = [float(item['revenue']) for item in monthly_revenue]
+    if not job or job['status'] != 'done' or not job['file_path'] or not os.path.exists(job['file_path']):
+        flash('Export is not available for download', 'error')
+        return redirect(url_for('export_jobs'))
     
-    db.disconnect()
+    return send_file(job['file_path'], as_attachment=True, download_name=os.path.basename(job['file_path']))
+
+# API Endpoints for AJAX requests
+def compute_api_dashboard_stats():
+    """Compute the dashboard summary served to AJAX clients."""
+    reader = read_sources.database('api_dashboard_stats')
+    with reader.session():
+        # Get dashboard statistics
+        total_games = reader.fetch_one("SELECT COUNT(*) AS count FROM products")['count']
+        total_orders = reader.fetch_one(ORDER_COUNT_QUERY)['count']
+        total_users = reader.fetch_one("SELECT COUNT(*) AS count FROM users")['count']
+    
+        # Calculate total revenue from the daily sales rollup
+        revenue_result = reader.fetch_one("SELECT COALESCE(SUM(revenue), 0) AS revenue FROM sales_daily_totals")
+        total_revenue = float(revenue_result['revenue']) if revenue_result else 0
+    
+        # Get monthly revenue data for chart (last 6 months)
+        monthly_revenue_query = """
+        SELECT substr(day, 1, 7) as month, SUM(revenue) as revenue
+        FROM sales_daily_totals
+        WHERE day >= ?
+        GROUP BY month
+        ORDER BY month
+        """
+        monthly_revenue = reader.fetch_all(monthly_revenue_query, (months_ago_start(5),))
     
-    return jsonify({
+        # Format for Chart.js
+        months = [item['month'] for item in monthly_revenue]
+        revenues = [float(item['revenue']) for item in monthly_revenue]
+    
+    return {
         'total_games': total_games,
         'total_orders': total_orders,
         'total_users': total_users,
@@ -1101,13 +1500,60 @@ def api_dashboard_stats():
                 'borderWidth': 1
             }]
         }
-    })
+    }
+
+@app.route('/api/dashboard/events')
+@login_required
+def dashboard_events():
+    """Stream order, stock and counter changes to the dashboard as server-sent events."""
+    if not sse_slots.acquire(blocking=False):
+        # The dashboard retries later; the page itself still works without the feed
+        response = Response("Too many live dashboard streams", status=503, mimetype='text/plain')
+        response.headers['Retry-After'] = '30'
+        return response
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('after')
+    try:
+        subscription = change_feed.subscribe(int(last_event_id) if last_event_id and last_event_id.isdigit() else None)
+    except Exception:
+        # Replaying missed events reads data.db, which may not exist yet; don't leak the slot
+        sse_slots.release()
+        raise
+    released = []
+    
+    def release():
+        # Runs when the server closes the response, even if the stream never started
+        if not released:
+            released.append(True)
+            change_feed.unsubscribe(subscription)
+            sse_slots.release()
+    
+    def stream():
+        deadline = time.monotonic() + SSE_MAX_STREAM_SECONDS
+        yield "retry: 5000\n\n"
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            event = subscription.get(timeout=min(15, remaining))
+            if event is None:
+                # Keep proxies from closing an idle connection
+                yield ": keepalive\n\n"
+                continue
+            yield sse_message(event)
+            if event['type'] == 'resync':
+                break
+    
+    response = app.response_class(stream(), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    response.call_on_close(release)
+    return response
+
+@app.route('/api/dashboard/stats')
+@login_required
+def api_dashboard_stats():
+    return jsonify(stats_cache.get_or_compute('api_dashboard_stats', compute_api_dashboard_stats))
 
 if __name__ == '__main__':
-    # Initialize admin database
-    admin_db.connect()
-    admin_db.create_tables()
-    admin_db.disconnect()
-    
     port = int(os.getenv('PORT', 8000))
     app.run(host='0.0.0.0', port=port)
\ No newline at end of file
@@ -0,0 +1,140 @@
+import argparse
+import os
+import re
+import sqlite3
+import time
+
+ARCHIVE_DB_PATH = os.environ.get(
+    'ARCHIVE_DB_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(os.environ.get(
+        'DB_PATH', os.path.join(os.path.dirname(__file__), '..', '..', 'User', 'data.db')))), 'archive.db')
+)
+
+# Orders in these statuses never change again and can leave the hot tables
+ARCHIVABLE_STATUSES = ('completed', 'delivered', 'cancelled')
+ARCHIVE_BATCH_SIZE = 500
+
+# Indexes the archive needs for the read paths that union it in
+ARCHIVE_INDEXES = {
+    'orders': ["CREATE INDEX IF NOT EXISTS main.idx_orders_user ON orders(user_id, id)"],
+    'admin_logs': ["CREATE INDEX IF NOT EXISTS main.idx_admin_logs_timestamp ON admin_logs(timestamp)"],
+}
+
+def ensure_archive_table(connection, table):
+    """Create <table> in the archive with hot.<table>'s schema, adding any columns it is missing.
+
+    Columns are only ever appended to the hot tables, so the archive keeps the
+    same column order and the two can be combined with SELECT *.
+    """
+    row = connection.execute(
+        "SELECT sql FROM hot.sqlite_master WHERE type = 'table' AND name = ?", (table,)
+    ).fetchone()
+    if row is None:
+        raise sqlite3.OperationalError(f"no such table: {table}")
+    create_sql = re.sub(
+        r'^\s*CREATE\s+TABLE\s+(IF\s+NOT\s+EXISTS\s+)?["`\[]?\w+["`\]]?',
+        f'CREATE TABLE IF NOT EXISTS main.{table}',
+        row[0], count=1, flags=re.IGNORECASE
+    )
+    connection.execute(create_sql)
+    archived_columns = {column[1] for column in connection.execute(f"PRAGMA main.table_info({table})")}
+    for column in connection.execute(f"PRAGMA hot.table_info({table})").fetchall():
+        if column[1] not in archived_columns:
+            connection.execute(f"ALTER TABLE main.{table} ADD COLUMN {column[1]} {column[2]}")
+    for statement in ARCHIVE_INDEXES.get(table, []):
+        connection.execute(statement)
+
+def _move_batches(hot_path, archive_path, select_ids, moves, totals_table=None, batch_size=ARCHIVE_BATCH_SIZE):
+    """Move rows from the hot database to the archive a batch per transaction.
+
+    `select_ids` returns up to `batch_size` keys from hot tables; each
+    (table, key column) in `moves` is copied to the archive and deleted for
+    those keys. Returns how many keys were moved.
+
+    The archive is opened as the main database with the hot one attached, so
+    on commit SQLite makes the archive durable first. A crash in between leaves
+    at worst rows in both, which the next run's INSERT OR REPLACE overwrites
+    before deleting them.
+    """
+    moved = 0
+    connection = sqlite3.connect(archive_path)
+    try:
+        connection.execute("PRAGMA busy_timeout = 5000")
+        connection.execute("ATTACH DATABASE ? AS hot", (hot_path,))
+        for table, _ in moves:
+            ensure_archive_table(connection, table)
+        connection.commit()
+        while True:
+            try:
+                connection.execute("BEGIN IMMEDIATE")
+                ids = [row[0] for row in connection.execute(select_ids, (batch_size,))]
+                if ids:
+                    placeholders = ', '.join('?' * len(ids))
+                    for table, key in moves:
+                        connection.execute(
+                            f"INSERT OR REPLACE INTO main.{table} SELECT * FROM hot.{table} WHERE {key} IN ({placeholders})",
+                            ids
+                        )
+                    for table, key in reversed(moves):
+                        connection.execute(f"DELETE FROM hot.{table} WHERE {key} IN ({placeholders})", ids)
+                    if totals_table:
+                        connection.execute("""
+                            INSERT INTO hot.archive_totals (table_name, row_count) VALUES (?, ?)
+                            ON CONFLICT(table_name) DO UPDATE SET row_count = row_count + excluded.row_count
+                        """, (totals_table, len(ids)))
+                connection.commit()
+            except sqlite3.Error:
+                connection.rollback()
+                raise
+            moved += len(ids)
+            if len(ids) < batch_size:
+                break
+            # Give the bot's checkout writes a turn at the lock
+            time.sleep(0.01)
+    finally:
+        connection.close()
+    return moved
+
+def archive_orders(db_path, archive_path=ARCHIVE_DB_PATH, months=12, batch_size=ARCHIVE_BATCH_SIZE):
+    """Move finished orders older than `months` months, with their items, from data.db to archive.db."""
+    statuses = ', '.join(f"'{status}'" for status in ARCHIVABLE_STATUSES)
+    select_ids = f"""
+        SELECT id FROM hot.orders
+        WHERE status IN ({statuses})
+            AND COALESCE(completed_at, created_at) < datetime('now', '-{int(months)} months')
+        ORDER BY id
+        LIMIT ?
+    """
+    return _move_batches(db_path, archive_path, select_ids, [('orders', 'id'), ('order_items', 'order_id')],
+                         totals_table='orders', batch_size=batch_size)
+
+def archive_admin_logs(admin_db_path, archive_path=ARCHIVE_DB_PATH, months=6, batch_size=ARCHIVE_BATCH_SIZE):
+    """Move admin log entries older than `months` months from admin.db to archive.db."""
+    select_ids = f"""
+        SELECT id FROM hot.admin_logs
+        WHERE timestamp < datetime('now', '-{int(months)} months')
+        ORDER BY id
+        LIMIT ?
+    """
+    return _move_batches(admin_db_path, archive_path, select_ids, [('admin_logs', 'id')], batch_size=batch_size)
+
+def main():
+    parser = argparse.ArgumentParser(description="Move old orders and admin logs into archive.db")
+    parser.add_argument('--db-path', default=os.environ.get(
+        'DB_PATH', os.path.join(os.path.dirname(__file__), '..', '..', 'User', 'data.db')))
+    parser.add_argument('--admin-db-path', default=os.environ.get(
+        'ADMIN_DB_PATH', os.path.join(os.path.dirname(__file__), '..', 'instance', 'admin.db')))
+    parser.add_argument('--archive-path', default=ARCHIVE_DB_PATH)
+    parser.add_argument('--order-months', type=int, default=int(os.environ.get('ARCHIVE_ORDER_MONTHS', 12)),
+                        help="Archive finished orders older than this many months")
+    parser.add_argument('--log-months', type=int, default=int(os.environ.get('ARCHIVE_LOG_MONTHS', 6)),
+                        help="Archive admin logs older than this many months")
+    parser.add_argument('--batch-size', type=int, default=ARCHIVE_BATCH_SIZE)
+    args = parser.parse_args()
+
+    orders = archive_orders(args.db_path, args.archive_path, args.order_months, args.batch_size)
+    logs = archive_admin_logs(args.admin_db_path, args.archive_path, args.log_months, args.batch_size)
+    print(f"Archived {orders} order(s) and {logs} admin log entries to {args.archive_path}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,158 @@
+import gzip
+import hashlib
+import mimetypes
+import os
+import tempfile
+from flask import request, send_file, abort
+
+try:
+    from PIL import Image
+except ImportError:  # Thumbnails are skipped and full images served instead
+    Image = None
+
+ASSET_MAX_AGE = 365 * 24 * 3600
+THUMBNAIL_SIZES = (96, 160, 256)
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.webp'}
+COMPRESSIBLE_EXTENSIONS = {'.css', '.js', '.svg', '.json', '.txt', '.map'}
+
+class AssetPipeline:
+    """Fingerprinted, long-cached static assets for the admin pages.
+
+    On build() every file under `static_dir` is hashed and given a URL with the
+    hash in its name (images/logo.jpg -> /assets/images/logo.<hash>.jpg), so the
+    file can be cached forever and a change produces a new URL. Images also get
+    JPEG thumbnails at THUMBNAIL_SIZES, and text assets a gzip copy, written once
+    into `build_dir` and reused while the source hash is unchanged. Product images
+    come from the shared `image_store`, whose objects are already named by hash.
+    """
+
+    def __init__(self, static_dir, build_dir, image_store=None, url_prefix='/assets'):
+        self.static_dir = static_dir
+        self.build_dir = build_dir
+        self.image_store = image_store
+        self.url_prefix = url_prefix
+        # logical path -> hash, and fingerprinted name -> (file path, etag, gzip path)
+        self.hashes = {}
+        self.files = {}
+
+    def build(self):
+        """Hash static files and generate any missing thumbnails and gzip copies."""
+        for root, _, names in os.walk(self.static_dir):
+            for name in names:
+                source = os.path.join(root, name)
+                logical = os.path.relpath(source, self.static_dir).replace(os.sep, '/')
+                with open(source, 'rb') as f:
+                    data = f.read()
+                digest = hashlib.sha256(data).hexdigest()[:12]
+                self.hashes[logical] = digest
+                base, ext = os.path.splitext(logical)
+                gzip_path = self._gzip(data, f"{base}.{digest}{ext}") if ext.lower() in COMPRESSIBLE_EXTENSIONS else None
+                self.files[f"{base}.{digest}{ext}"] = (source, digest, gzip_path)
+                if ext.lower() in IMAGE_EXTENSIONS:
+                    self._add_thumbnails(source, f"{base}.{digest}", digest)
+        if self.image_store is not None:
+            for digest, relative in self.image_store.objects.items():
+                source = os.path.join(self.image_store.root, relative)
+                self.files[f"store/{digest}{os.path.splitext(relative)[1]}"] = (source, digest, None)
+                self._add_thumbnails(source, f"store/{digest}", digest)
+        return self
+
+    def _add_thumbnails(self, source, base, digest):
+        for size in THUMBNAIL_SIZES:
+            thumb_name = f"thumbs/{size}/{base}.jpg"
+            thumb_path = self._thumbnail(source, thumb_name, size)
+            if thumb_path:
+                self.files[thumb_name] = (thumb_path, f"{digest}-{size}", None)
+
+    def _build_path(self, name):
+        path = os.path.join(self.build_dir, *name.split('/'))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        return path
+
+    def _write_atomic(self, path, write):
+        """Write `path` through a temp file of this process's own, then move it into place.
+
+        Every worker builds at import, so several may write the same file at once;
+        if this one fails but another already produced the file, that counts too.
+        """
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.part')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                write(f)
+            os.replace(temp_path, path)
+        except OSError:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+            if not os.path.exists(path):
+                raise
+        return path
+
+    def _gzip(self, data, name):
+        path = self._build_path(name + '.gz')
+        if not os.path.exists(path):
+            self._write_atomic(path, lambda f: f.write(gzip.compress(data, 9)))
+        return path
+
+    def _thumbnail(self, source, name, size):
+        path = self._build_path(name)
+        if os.path.exists(path):
+            return path
+        if Image is None:
+            return None
+        try:
+            with Image.open(source) as image:
+                image = image.convert('RGB')
+                image.thumbnail((size, size))
+                return self._write_atomic(
+                    path, lambda f: image.save(f, 'JPEG', quality=82, optimize=True, progressive=True))
+        except OSError as e:
+            print(f"Thumbnail error for {source}: {e}")
+            return None
+
+    def url(self, path):
+        """Return the fingerprinted URL of a static file, or the plain static URL if unknown."""
+        digest = self.hashes.get(path)
+        if digest is None:
+            return f"/static/{path}"
+        base, ext = os.path.splitext(path)
+        return f"{self.url_prefix}/{base}.{digest}{ext}"
+
+    def thumbnail_url(self, image_url, size=96):
+        """Return a thumbnail URL for a product image_url.
+
+        Catalog images resolve through the image store manifest (by legacy name
+        such as 'images/FC_25.jpg' or by hash) to a pre-generated thumbnail of at
+        least `size` pixels. Anything else, such as an external URL, is returned
+        as is.
+        """
+        digest = self.image_store.resolve(image_url) if self.image_store is not None else None
+        if digest is None:
+            return image_url
+        size = next((s for s in THUMBNAIL_SIZES if s >= size), THUMBNAIL_SIZES[-1])
+        thumb_name = f"thumbs/{size}/store/{digest}.jpg"
+        if thumb_name in self.files:
+            return f"{self.url_prefix}/{thumb_name}"
+        return f"{self.url_prefix}/store/{os.path.basename(self.image_store.objects[digest])}"
+
+    def send(self, name):
+        """Serve a fingerprinted asset with immutable caching, preferring the gzip copy."""
+        entry = self.files.get(name)
+        if entry is None:
+            abort(404)
+        path, etag, gzip_path = entry
+        use_gzip = gzip_path is not None and 'gzip' in request.headers.get('Accept-Encoding', '')
+        response = send_file(
+            gzip_path if use_gzip else path,
+            mimetype=mimetypes.guess_type(path)[0] or 'application/octet-stream',
+            download_name=os.path.basename(path),
+            etag=etag + ('-gz' if use_gzip else ''),
+            conditional=True,
+            max_age=ASSET_MAX_AGE
+        )
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+        if gzip_path is not None:
+            response.vary.add('Accept-Encoding')
+        if use_gzip:
+            response.headers['Content-Encoding'] = 'gzip'
+        return response
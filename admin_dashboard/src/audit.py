@@ -0,0 +1,106 @@
+import atexit
+import queue
+import sqlite3
+import threading
+import time
+
+class AuditLogWriter:
+    """Writes admin_logs entries in batches from a background thread.
+
+    log() only puts the entry on an in-memory queue, stamped with the time of the
+    action. A flusher thread writes queued entries to admin.db in one transaction
+    once `batch_size` have built up or `flush_interval` seconds have passed, and
+    whatever is left is written at interpreter exit. The queue holds at most
+    `max_queue` entries: if the flusher falls behind, log() writes the entry
+    itself rather than dropping it, so the trail stays complete and memory bounded.
+    """
+
+    INSERT = "INSERT INTO admin_logs (admin_id, action, details, timestamp) VALUES (?, ?, ?, ?)"
+
+    def __init__(self, admin_db_path, batch_size=50, flush_interval=1.0, max_queue=10000):
+        self.admin_db_path = admin_db_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._pending = []
+        self._write_lock = threading.Lock()
+        self._flush_requested = threading.Event()
+        self._stopping = threading.Event()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        atexit.register(self.close)
+
+    def ensure_started(self):
+        """Start the flusher thread if it is not already running."""
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stopping.clear()
+                self._thread = threading.Thread(target=self._run, name='audit-log-writer', daemon=True)
+                self._thread.start()
+
+    def log(self, admin_id, action, details=None):
+        """Queue an admin action for the audit log."""
+        # Same format as CURRENT_TIMESTAMP, taken now rather than at flush time
+        entry = (admin_id, action, details, time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime()))
+        self.ensure_started()
+        try:
+            self._queue.put_nowait(entry)
+        except queue.Full:
+            self._write([entry])
+            return True
+        if self._queue.qsize() >= self.batch_size:
+            self._flush_requested.set()
+        return True
+
+    def flush(self):
+        """Write every queued entry now, e.g. before reading the log back."""
+        with self._write_lock:
+            # A batch that failed earlier goes first; until it is written, new
+            # entries stay on the bounded queue instead of piling up here
+            if not self._write_pending():
+                return False
+            self._drain()
+            return self._write_pending()
+
+    def close(self):
+        """Stop the flusher thread and write any remaining entries."""
+        self._stopping.set()
+        self._flush_requested.set()
+        if self._thread is not None and self._thread.is_alive():
+            self._thread.join(timeout=5)
+        self.flush()
+
+    def _run(self):
+        while not self._stopping.is_set():
+            self._flush_requested.wait(self.flush_interval)
+            self._flush_requested.clear()
+            self.flush()
+
+    def _drain(self):
+        while True:
+            try:
+                self._pending.append(self._queue.get_nowait())
+            except queue.Empty:
+                return
+
+    def _write_pending(self):
+        """Write the pending batch, keeping it for the next attempt on failure."""
+        if not self._pending:
+            return True
+        if self._write(self._pending):
+            self._pending = []
+            return True
+        return False
+
+    def _write(self, entries):
+        try:
+            connection = sqlite3.connect(self.admin_db_path, timeout=5)
+            try:
+                with connection:
+                    connection.executemany(self.INSERT, entries)
+            finally:
+                connection.close()
+            return True
+        except sqlite3.Error as e:
+            print(f"Admin log error: {e}")
+            return False
@@ -0,0 +1,31 @@
+import os
+import threading
+import bcrypt
+
+# bcrypt is deliberately slow; at most this many request threads hash at once
+BCRYPT_WORKERS = int(os.environ.get('BCRYPT_WORKERS', 2))
+_bcrypt_slots = threading.BoundedSemaphore(BCRYPT_WORKERS)
+
+class PasswordCheckBusy(Exception):
+    """Raised by verify_password when BCRYPT_WORKERS checks are already running."""
+
+def hash_password(password):
+    """Hash a password with a fresh salt, returning the hash as text."""
+    with _bcrypt_slots:
+        return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+
+def verify_password(password, password_hash):
+    """Check a password against a stored bcrypt hash.
+
+    Raises PasswordCheckBusy rather than waiting for a free slot, so a burst
+    of logins is turned away instead of tying up every request thread.
+    """
+    if not _bcrypt_slots.acquire(blocking=False):
+        raise PasswordCheckBusy()
+    try:
+        return bcrypt.checkpw(password.encode('utf-8'), password_hash.encode('utf-8'))
+    except ValueError:
+        # Malformed stored hash
+        return False
+    finally:
+        _bcrypt_slots.release()
@@ -0,0 +1,49 @@
+import argparse
+import os
+from .models.database import Database
+from .auth import hash_password
+
+DEFAULT_ADMIN_USERNAME = os.environ.get('ADMIN_DEFAULT_USERNAME', 'admin')
+DEFAULT_ADMIN_PASSWORD = os.environ.get('ADMIN_DEFAULT_PASSWORD', 'securepassword123')
+
+def bootstrap_admin_db(admin_db, admins=None):
+    """Create the admin tables and provision admin accounts.
+
+    Safe to run repeatedly: tables are created only if missing, and passwords
+    are hashed only for admins that do not exist yet. `admins` maps usernames to
+    passwords and defaults to the single default admin. Returns the usernames
+    that were created.
+    """
+    if admins is None:
+        admins = {DEFAULT_ADMIN_USERNAME: DEFAULT_ADMIN_PASSWORD}
+    created = []
+    with admin_db.session():
+        admin_db.create_tables()
+        for username, password in admins.items():
+            if admin_db.fetch_one("SELECT id FROM admin_users WHERE username = ?", (username,)):
+                continue
+            if admin_db.initialize_admin(username, hash_password(password)):
+                created.append(username)
+    return created
+
+def main():
+    parser = argparse.ArgumentParser(description="Set up admin.db for the Exodus Game Store admin dashboard")
+    parser.add_argument('--admin-db-path', help="Path to admin.db (defaults to admin_dashboard/instance/admin.db)")
+    parser.add_argument('--username', help="Provision this admin instead of the default one")
+    parser.add_argument('--password', help="Password for --username")
+    args = parser.parse_args()
+    if bool(args.username) != bool(args.password):
+        parser.error("--username and --password must be given together")
+
+    admin_db_path = args.admin_db_path or os.environ.get(
+        'ADMIN_DB_PATH',
+        os.path.join(os.path.dirname(__file__), '..', 'instance', 'admin.db')
+    )
+    admins = {args.username: args.password} if args.username else None
+    created = bootstrap_admin_db(Database(admin_db_path), admins)
+    print(f"admin.db ready at {admin_db_path}")
+    for username in created:
+        print(f"Created admin {username}")
+
+if __name__ == '__main__':
+    main()
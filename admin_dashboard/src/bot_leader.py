@@ -0,0 +1,159 @@
+import asyncio
+import json
+import os
+import socket
+import threading
+import time
+from telegram import Update
+
+try:
+    import fcntl
+except ImportError:  # No flock (Windows): every process runs its own bot, as before
+    fcntl = None
+
+class BotLeader:
+    """Picks the one process on this host that owns the Telegram Application.
+
+    Every web worker calls start(), which waits on an exclusive flock on
+    `lock_path` in a background thread. The worker that gets it becomes the
+    leader: it runs the bot (and so is the only one to call set_webhook) and
+    listens on the Unix socket `socket_path`. Other workers forward /webhook
+    payloads to that socket. When the leader's process dies, the kernel drops
+    its lock. When only the bot fails (run_bot() raises or returns), the leader
+    stops the Application, releases the lock itself and rejoins the election
+    after `retry_delay` seconds, doubling up to `max_retry_delay` while the bot
+    keeps failing. Either way one of the waiting workers takes over.
+    """
+
+    def __init__(self, lock_path, socket_path, forward_timeout=5.0, retry_delay=5.0, max_retry_delay=300.0):
+        self.lock_path = lock_path
+        self.socket_path = socket_path
+        self.forward_timeout = forward_timeout
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self.is_leader = False
+        self.application = None
+        self.loop = None
+        self._lock_file = None
+        self._thread = None
+
+    def start(self, run_bot):
+        """Join the election; if this process wins, run `run_bot()` and serve forwarded updates."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, args=(run_bot,), name='bot-leader', daemon=True)
+            self._thread.start()
+
+    def attach(self, application):
+        """Called from inside the bot's event loop once the Application has started."""
+        self.application = application
+        self.loop = asyncio.get_running_loop()
+
+    def _run(self, run_bot):
+        delay = self.retry_delay
+        while True:
+            self._acquire()
+            self.is_leader = True
+            print(f"Process {os.getpid()} now owns the Telegram bot")
+            started = time.monotonic()
+            try:
+                asyncio.run(self._lead(run_bot))
+                print("Telegram bot stopped")
+            except Exception as e:
+                print(f"Telegram bot stopped: {e}")
+            finally:
+                self._resign()
+            # A bot that ran for a while gets a fresh backoff; one failing at startup backs off further
+            if time.monotonic() - started > self.max_retry_delay:
+                delay = self.retry_delay
+            time.sleep(delay)
+            delay = min(delay * 2, self.max_retry_delay)
+
+    def _acquire(self):
+        if fcntl is None:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.lock_path)), exist_ok=True)
+        # Kept open while leading: closing it gives up the lock
+        self._lock_file = open(self.lock_path, 'a+')
+        fcntl.flock(self._lock_file, fcntl.LOCK_EX)
+        self._lock_file.seek(0)
+        self._lock_file.truncate()
+        self._lock_file.write(f"{os.getpid()}\n")
+        self._lock_file.flush()
+
+    def _resign(self):
+        # Forwarded updates get an error (and a redelivery) until a new leader attaches
+        self.is_leader = False
+        self.loop = None
+        self.application = None
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+
+    async def _lead(self, run_bot):
+        server = None
+        if fcntl is not None:
+            # A socket file left by a dead leader would make bind() fail
+            if os.path.exists(self.socket_path):
+                os.unlink(self.socket_path)
+            server = await asyncio.start_unix_server(self._handle_forward, path=self.socket_path)
+        try:
+            await run_bot()
+        finally:
+            if server is not None:
+                server.close()
+            await self._stop_application()
+
+    async def _stop_application(self):
+        application = self.application
+        if application is None:
+            return
+        try:
+            if application.running:
+                await application.stop()
+            await application.shutdown()
+        except Exception as e:
+            print(f"Error stopping Telegram bot: {e}")
+
+    async def _handle_forward(self, reader, writer):
+        try:
+            payload = await reader.read()
+            writer.write(b'OK' if await self._enqueue(payload) else b'ERR')
+            await writer.drain()
+        finally:
+            writer.close()
+
+    async def _enqueue(self, payload):
+        if self.application is None:
+            return False
+        try:
+            update = Update.de_json(json.loads(payload), self.application.bot)
+        except (ValueError, TypeError) as e:
+            print(f"Invalid webhook payload: {e}")
+            return False
+        await self.application.update_queue.put(update)
+        return True
+
+    def dispatch(self, payload):
+        """Hand a raw webhook payload to the bot, wherever it runs. Returns False if it could not."""
+        if self.is_leader:
+            loop = self.loop
+            if loop is None:
+                # Still starting up; a failed bot resigns, after which updates are forwarded
+                return False
+            try:
+                future = asyncio.run_coroutine_threadsafe(self._enqueue(payload), loop)
+                return future.result(self.forward_timeout)
+            except Exception as e:
+                print(f"Webhook dispatch error: {e}")
+                return False
+        try:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+                sock.settimeout(self.forward_timeout)
+                sock.connect(self.socket_path)
+                sock.sendall(payload)
+                sock.shutdown(socket.SHUT_WR)
+                return sock.recv(16) == b'OK'
+        except OSError as e:
+            # No leader yet, or it just died: Telegram retries on an error response
+            print(f"Webhook forward error: {e}")
+            return False
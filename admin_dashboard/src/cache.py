@@ -0,0 +1,32 @@
+from User.shared_cache import SharedCache, file_version
+
+class ResponseCache:
+    """Cache for computed dashboard data, shared by every worker on the host.
+
+    Entries live in the host-wide SharedCache, stamped with the file_version()
+    of the database. Any commit (by the bot or a dashboard request) changes the
+    stamp, so cached values are never older than the last committed write, and
+    a value is computed once per change for all workers rather than once per
+    worker. Entries also expire after `ttl` seconds, which covers values that
+    depend on the clock, such as month boundaries.
+    """
+
+    def __init__(self, db_path, ttl=30, shared=None):
+        self.db_path = db_path
+        self.ttl = ttl
+        self.shared = shared or SharedCache(ttl=ttl)
+
+    def data_version(self):
+        """Return the current version stamp of the database, or None if unavailable."""
+        return file_version(self.db_path)
+
+    def get_or_compute(self, key, compute):
+        """Return the cached value for `key`, computing it at most once per change."""
+        version = self.data_version()
+        if version is None:
+            return compute()
+        return self.shared.get_or_compute(f"stats:{key}", compute, ttl=self.ttl, version=version)
+
+    def invalidate(self, key=None):
+        """Drop one cached entry, or all of them."""
+        self.shared.invalidate('stats:' if key is None else f"stats:{key}")
@@ -0,0 +1,214 @@
+import argparse
+import csv
+import io
+import json
+import os
+import sqlite3
+from .models.database import Database, MAX_QUERY_PARAMS
+
+# Columns of a catalog row, as in User/products.json
+CATALOG_FIELDS = ['id', 'name', 'price', 'platform', 'description', 'image_url', 'stock']
+
+UPSERT_PRODUCT = """
+    INSERT INTO products (id, name, platform, price, stock, description, image_url)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(id) DO UPDATE SET
+        name = excluded.name,
+        platform = excluded.platform,
+        price = excluded.price,
+        stock = excluded.stock,
+        description = excluded.description,
+        image_url = excluded.image_url
+"""
+
+def parse_catalog(text, fmt):
+    """Parse CSV or JSON catalog text into a list of raw row dicts.
+
+    JSON is a list of objects in the products.json schema. CSV has a header row
+    with the same field names, and lists platforms separated by '|' (or as a
+    JSON array).
+    """
+    if fmt == 'json':
+        rows = json.loads(text)
+        if not isinstance(rows, list):
+            raise ValueError("JSON catalog must be a list of products")
+        return rows
+    if fmt == 'csv':
+        return [dict(row) for row in csv.DictReader(io.StringIO(text))]
+    raise ValueError(f"Unsupported catalog format: {fmt}")
+
+def _parse_platform(value):
+    if isinstance(value, str):
+        value = value.strip()
+        if value.startswith('['):
+            value = json.loads(value)
+        else:
+            value = value.split('|')
+    if not isinstance(value, list):
+        raise ValueError("platform must be a list")
+    platforms = [str(part).strip() for part in value if str(part).strip()]
+    if not platforms:
+        raise ValueError("platform is required")
+    return platforms
+
+def validate_row(raw):
+    """Return (clean row, errors) for one raw catalog row."""
+    errors = []
+    row = {}
+
+    product_id = raw.get('id')
+    if product_id in (None, ''):
+        row['id'] = None
+    else:
+        try:
+            row['id'] = int(product_id)
+            if row['id'] <= 0:
+                errors.append("id must be positive")
+        except (TypeError, ValueError):
+            row['id'] = None
+            errors.append("id must be an integer")
+
+    row['name'] = str(raw.get('name') or '').strip()
+    if not row['name']:
+        errors.append("name is required")
+
+    price = raw.get('price')
+    try:
+        # Same price formats the bot accepts when loading products.json
+        row['price'] = float(price) if isinstance(price, (int, float)) else float(str(price).lstrip('$').replace(',', ''))
+        if row['price'] < 0:
+            errors.append("price must not be negative")
+    except (TypeError, ValueError):
+        errors.append("price must be a number")
+
+    try:
+        row['platform'] = _parse_platform(raw.get('platform'))
+    except (TypeError, json.JSONDecodeError):
+        errors.append("platform must be a list")
+    except ValueError as e:
+        errors.append(str(e))
+
+    try:
+        row['stock'] = int(raw.get('stock'))
+        if row['stock'] < 0:
+            errors.append("stock must not be negative")
+    except (TypeError, ValueError):
+        errors.append("stock must be an integer")
+
+    row['description'] = str(raw.get('description') or '').strip()
+    row['image_url'] = str(raw.get('image_url') or '').strip()
+    if not row['image_url']:
+        errors.append("image_url is required")
+
+    return row, errors
+
+def import_catalog(db, raw_rows, dry_run=False):
+    """Validate every row, then upsert them all in one transaction.
+
+    Nothing is written unless every row is valid. Rows with an id update that
+    product (or create it with that id); rows without one get new ids. Returns a
+    report with one entry per row, plus the platforms the catalog uses.
+    """
+    report = {'rows': [], 'inserted': 0, 'updated': 0, 'invalid': 0, 'written': False, 'platforms': []}
+    clean_rows = []
+    seen_ids = set()
+    for number, raw in enumerate(raw_rows, start=1):
+        row, errors = validate_row(raw if isinstance(raw, dict) else {})
+        if row['id'] is not None:
+            if row['id'] in seen_ids:
+                errors.append(f"duplicate id {row['id']}")
+            seen_ids.add(row['id'])
+        report['rows'].append({'row': number, 'id': row['id'], 'name': row['name'], 'action': None, 'errors': errors})
+        clean_rows.append(row)
+    report['invalid'] = sum(1 for entry in report['rows'] if entry['errors'])
+    for entry in report['rows']:
+        entry['action'] = 'invalid' if entry['errors'] else 'skipped'
+    if report['invalid'] or not clean_rows:
+        return report
+
+    with db.session():
+        connection = db.connection
+        try:
+            # Take the write lock up front so new ids cannot collide with another writer
+            connection.execute("BEGIN IMMEDIATE")
+            existing = set()
+            ids = sorted(seen_ids)
+            for start in range(0, len(ids), MAX_QUERY_PARAMS):
+                chunk = ids[start:start + MAX_QUERY_PARAMS]
+                placeholders = ', '.join('?' * len(chunk))
+                existing.update(
+                    row[0] for row in connection.execute(f"SELECT id FROM products WHERE id IN ({placeholders})", chunk)
+                )
+            next_id = max(
+                connection.execute("SELECT COALESCE(MAX(id), 0) FROM products").fetchone()[0],
+                max(seen_ids, default=0)
+            ) + 1
+            for row, entry in zip(clean_rows, report['rows']):
+                if row['id'] is None:
+                    row['id'] = entry['id'] = next_id
+                    next_id += 1
+                entry['action'] = 'updated' if row['id'] in existing else 'inserted'
+            connection.executemany(UPSERT_PRODUCT, [
+                (row['id'], row['name'], json.dumps(row['platform']), row['price'],
+                 row['stock'], row['description'], row['image_url'])
+                for row in clean_rows
+            ])
+            if dry_run:
+                connection.rollback()
+            else:
+                connection.commit()
+                report['written'] = True
+        except sqlite3.Error as e:
+            connection.rollback()
+            print(f"Catalog import error: {e}")
+            for entry in report['rows']:
+                entry['action'] = 'skipped'
+            report['error'] = str(e)
+            return report
+
+    report['inserted'] = sum(1 for entry in report['rows'] if entry['action'] == 'inserted')
+    report['updated'] = sum(1 for entry in report['rows'] if entry['action'] == 'updated')
+    report['platforms'] = sorted({platform for row in clean_rows for platform in row['platform']})
+    return report
+
+def sync_categories(admin_db, platforms):
+    """Add any platforms missing from admin.db's categories table, in one statement batch."""
+    if not platforms:
+        return True
+    with admin_db.session():
+        try:
+            admin_db.cursor.executemany(
+                "INSERT OR IGNORE INTO categories (name) VALUES (?)",
+                [(platform,) for platform in platforms]
+            )
+            admin_db.connection.commit()
+            return True
+        except sqlite3.Error as e:
+            print(f"Category sync error: {e}")
+            return False
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk import games into the Exodus Game Store catalog")
+    parser.add_argument('path', help="CSV or JSON file in the products.json schema")
+    parser.add_argument('--format', choices=['csv', 'json'], help="Defaults to the file extension")
+    parser.add_argument('--db-path', default=os.environ.get(
+        'DB_PATH', os.path.join(os.path.dirname(__file__), '..', '..', 'User', 'data.db')))
+    parser.add_argument('--admin-db-path', default=os.environ.get(
+        'ADMIN_DB_PATH', os.path.join(os.path.dirname(__file__), '..', 'instance', 'admin.db')))
+    parser.add_argument('--dry-run', action='store_true', help="Validate and report without writing")
+    args = parser.parse_args()
+
+    fmt = args.format or os.path.splitext(args.path)[1].lstrip('.').lower()
+    with open(args.path, 'r', encoding='utf-8-sig') as f:
+        raw_rows = parse_catalog(f.read(), fmt)
+    report = import_catalog(Database(args.db_path), raw_rows, dry_run=args.dry_run)
+    for entry in report['rows']:
+        detail = '; '.join(entry['errors'])
+        print(f"row {entry['row']}: {entry['action']} {entry['id'] or ''} {entry['name']} {detail}".rstrip())
+    if report['written']:
+        sync_categories(Database(args.admin_db_path), report['platforms'])
+    print(f"{report['inserted']} inserted, {report['updated']} updated, {report['invalid']} invalid"
+          f"{'' if report['written'] else ' (nothing written)'}")
+
+if __name__ == '__main__':
+    main()
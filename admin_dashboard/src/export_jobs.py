@@ -0,0 +1,198 @@
+import json
+import os
+import threading
+from .models.database import Database
+from .exports import REPORTS, report_query, iter_batches, csv_chunks, ndjson_chunks
+
+try:
+    import fcntl
+except ImportError:  # No lockf (Windows): jobs cut off by a restart stay 'running'
+    fcntl = None
+
+EXPORT_FORMATS = {
+    'csv': '.csv',
+    'ndjson': '.ndjson',
+}
+
+class ExportWorker:
+    """Builds queued report exports in a background thread.
+
+    Jobs are rows in admin.db's export_jobs table. A worker claims a job by moving
+    it from 'queued' to 'running', so several app processes can each run a worker
+    without building the same report twice. Progress (rows_written out of
+    total_rows) is stored on the job row as the file is written. Report data is
+    read through `read_sources` under the 'exports' route.
+
+    While building a job, a worker holds that job's byte of a lock file in
+    `export_dir`. On start, each worker marks as failed any 'running' job
+    whose lock is free, since the process building it has died.
+    """
+
+    def __init__(self, read_sources, admin_db_path, export_dir, poll_interval=5):
+        self.read_sources = read_sources
+        self.admin_db_path = admin_db_path
+        self.export_dir = export_dir
+        self.poll_interval = poll_interval
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._lock_file = None
+
+    def ensure_started(self):
+        """Start the worker thread if it is not already running."""
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='export-worker', daemon=True)
+                self._thread.start()
+
+    def submit(self, report, export_format, admin_id, params=None):
+        """Queue a report export and return its job ID."""
+        if report not in REPORTS or export_format not in EXPORT_FORMATS:
+            return None
+        admin_db = Database(self.admin_db_path)
+        admin_db.connect()
+        try:
+            result = admin_db.execute_query(
+                "INSERT INTO export_jobs (report, format, params, created_by) VALUES (?, ?, ?, ?)",
+                (report, export_format, json.dumps(params or {}), admin_id)
+            )
+            job_id = admin_db.cursor.lastrowid if result else None
+        finally:
+            admin_db.disconnect()
+        self.ensure_started()
+        self._wakeup.set()
+        return job_id
+
+    def _lock_job(self, job_id):
+        """Take the job's byte of the lock file without waiting; False if another process holds it."""
+        if fcntl is None:
+            return True
+        if self._lock_file is None:
+            os.makedirs(self.export_dir, exist_ok=True)
+            self._lock_file = open(os.path.join(self.export_dir, 'export_jobs.lock'), 'a+')
+        try:
+            fcntl.lockf(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB, 1, job_id)
+            return True
+        except OSError:
+            return False
+
+    def _unlock_job(self, job_id):
+        if fcntl is not None and self._lock_file is not None:
+            fcntl.lockf(self._lock_file, fcntl.LOCK_UN, 1, job_id)
+
+    def _fail_interrupted_jobs(self):
+        """Mark jobs left 'running' by a process that died mid-build as failed."""
+        if fcntl is None:
+            return
+        admin_db = Database(self.admin_db_path)
+        if not admin_db.connect():
+            return
+        try:
+            jobs = admin_db.fetch_all("SELECT id, report, format FROM export_jobs WHERE status = 'running'") or []
+            for job in jobs:
+                if not self._lock_job(job['id']):
+                    # Still being built by a live process
+                    continue
+                try:
+                    admin_db.execute_query(
+                        "UPDATE export_jobs SET status = 'failed', error = ?, finished_at = CURRENT_TIMESTAMP "
+                        "WHERE id = ? AND status = 'running'",
+                        ("Interrupted by a server restart; submit the export again", job['id'])
+                    )
+                    partial_path = self._file_path(job) + '.part'
+                    if admin_db.cursor.rowcount == 1 and os.path.exists(partial_path):
+                        os.remove(partial_path)
+                finally:
+                    self._unlock_job(job['id'])
+        finally:
+            admin_db.disconnect()
+
+    def _run(self):
+        self._fail_interrupted_jobs()
+        while True:
+            self._wakeup.clear()
+            while self._run_next_job():
+                pass
+            self._wakeup.wait(self.poll_interval)
+
+    def _run_next_job(self):
+        """Claim and build the oldest queued job. Returns False if there was none."""
+        admin_db = Database(self.admin_db_path)
+        if not admin_db.connect():
+            return False
+        try:
+            job = admin_db.fetch_one("SELECT * FROM export_jobs WHERE status = 'queued' ORDER BY id LIMIT 1")
+            if not job:
+                return False
+            # Held from before the claim until the job finishes (see _fail_interrupted_jobs)
+            if not self._lock_job(job['id']):
+                # Another worker is claiming it
+                return True
+            try:
+                admin_db.execute_query(
+                    "UPDATE export_jobs SET status = 'running' WHERE id = ? AND status = 'queued'",
+                    (job['id'],)
+                )
+                if admin_db.cursor.rowcount != 1:
+                    # Another worker claimed it first
+                    return True
+                try:
+                    file_path = self._build(admin_db, job)
+                    admin_db.execute_query(
+                        "UPDATE export_jobs SET status = 'done', file_path = ?, finished_at = CURRENT_TIMESTAMP WHERE id = ?",
+                        (file_path, job['id'])
+                    )
+                except Exception as e:
+                    print(f"Export job {job['id']} failed: {e}")
+                    admin_db.execute_query(
+                        "UPDATE export_jobs SET status = 'failed', error = ?, finished_at = CURRENT_TIMESTAMP WHERE id = ?",
+                        (str(e), job['id'])
+                    )
+                return True
+            finally:
+                self._unlock_job(job['id'])
+        finally:
+            admin_db.disconnect()
+
+    def _file_path(self, job):
+        return os.path.join(self.export_dir, f"export_{job['id']}_{job['report']}{EXPORT_FORMATS[job['format']]}")
+
+    def _build(self, admin_db, job):
+        """Write a job's report file in batches and return its path."""
+        spec = REPORTS[job['report']]
+        query, count_query, params = report_query(job['report'], json.loads(job['params'] or '{}'))
+        os.makedirs(self.export_dir, exist_ok=True)
+        file_path = self._file_path(job)
+
+        # Pin one (pooled) Database so the count and the batches read the same file
+        data_db = self.read_sources.database('exports')
+        with data_db.session():
+            total = data_db.fetch_one(count_query, params)
+        admin_db.execute_query(
+            "UPDATE export_jobs SET total_rows = ? WHERE id = ?",
+            (total['count'] if total else None, job['id'])
+        )
+
+        progress = {'rows': 0}
+
+        def tracked_batches():
+            for rows in iter_batches(data_db, query, params, key=spec['key']):
+                yield [spec['record'](row) for row in rows]
+                progress['rows'] += len(rows)
+                admin_db.execute_query(
+                    "UPDATE export_jobs SET rows_written = ? WHERE id = ?",
+                    (progress['rows'], job['id'])
+                )
+
+        if job['format'] == 'csv':
+            chunks = csv_chunks(tracked_batches(), spec['headers'])
+        else:
+            chunks = ndjson_chunks(tracked_batches())
+
+        # Write to a temporary name so a half-written file is never offered for download
+        partial_path = file_path + '.part'
+        with open(partial_path, 'w', encoding='utf-8', newline='') as f:
+            for chunk in chunks:
+                f.write(chunk)
+        os.replace(partial_path, file_path)
+        return file_path
@@ -0,0 +1,167 @@
+import csv
+import io
+import json
+import zlib
+from .models.database import with_archive
+
+EXPORT_BATCH_SIZE = 1000
+
+# Exportable tables and their columns, in output order
+EXPORT_TYPES = {
+    'orders': {
+        'table': 'orders',
+        'filename': 'orders.csv',
+        'headers': ['id', 'user_id', 'total_price', 'status', 'created_at', 'completed_at', 'user_details'],
+    },
+    'clients': {
+        'table': 'users',
+        'filename': 'clients.csv',
+        'headers': ['id', 'username', 'first_name', 'last_name'],
+    },
+    'products': {
+        'table': 'products',
+        'filename': 'products.csv',
+        'headers': ['id', 'name', 'platform', 'price', 'stock', 'description', 'image_url'],
+    },
+}
+
+# Joined reports for background export jobs. Each query selects its keyset column as `id`.
+USER_DETAIL_FIELDS = ['name', 'email', 'phone_number', 'delivery_address']
+
+def order_line_record(row):
+    """Flatten an order line row, expanding the user_details JSON into fields."""
+    record = dict(row)
+    record.pop('id', None)
+    details = {}
+    if record.pop('user_details', None):
+        try:
+            details = json.loads(row['user_details'])
+        except (TypeError, json.JSONDecodeError):
+            details = {}
+    for field in USER_DETAIL_FIELDS:
+        record[field] = details.get(field)
+    return record
+
+REPORTS = {
+    'order_lines': {
+        'title': 'Order lines with products and customers',
+        'query': """
+            SELECT oi.rowid AS id, o.id AS order_id, o.status, o.created_at, o.completed_at,
+                   o.user_id, u.username, u.first_name, u.last_name,
+                   oi.product_id, p.name AS product_name, p.platform,
+                   oi.quantity, oi.price, o.user_details
+            FROM order_items oi
+            JOIN orders o ON o.id = oi.order_id
+            LEFT JOIN users u ON u.id = o.user_id
+            LEFT JOIN products p ON p.id = oi.product_id
+            WHERE {keyset}
+        """,
+        'count_query': """
+            SELECT COUNT(*) AS count
+            FROM order_items oi
+            JOIN orders o ON o.id = oi.order_id
+            WHERE 1 = 1
+        """,
+        'filters': {
+            'status': "o.status = ?",
+            'date_from': "o.created_at >= ?",
+            'date_to': "o.created_at < date(?, '+1 day')",
+        },
+        'key': 'oi.rowid',
+        'headers': ['order_id', 'status', 'created_at', 'completed_at', 'user_id', 'username',
+                    'first_name', 'last_name', 'product_id', 'product_name', 'platform',
+                    'quantity', 'price'] + USER_DETAIL_FIELDS,
+        'record': order_line_record,
+    },
+}
+
+def report_query(report, filters=None):
+    """Build the batched and count queries for a report, applying its supported filters."""
+    spec = REPORTS[report]
+    conditions = []
+    params = []
+    for name, condition in spec['filters'].items():
+        value = (filters or {}).get(name)
+        if value:
+            conditions.append(condition)
+            params.append(value)
+    extra = ''.join(f" AND {condition}" for condition in conditions)
+    return spec['query'] + extra, spec['count_query'] + extra, params
+
+def iter_batches(db, query, params=(), batch_size=EXPORT_BATCH_SIZE, key='id', archive_path=None):
+    """Yield lists of rows for `query` read through `db`, paging by keyset on `key`.
+
+    `query` must select the key as an `id` column and contain a `{keyset}`
+    placeholder in its WHERE clause. Each batch is a separate short read on a
+    connection checked out of `db`'s pool and handed back before the batch is
+    yielded, so no read transaction stays open while the caller is busy with
+    the previous batch. With `archive_path`, archive.db is attached for
+    queries that union it in.
+    """
+    last_id = None
+    while True:
+        if last_id is None:
+            sql = query.format(keyset="1 = 1")
+            batch_params = list(params)
+        else:
+            sql = query.format(keyset=f"{key} > ?")
+            batch_params = [last_id] + list(params)
+        with db.session(), db.attached(archive_path):
+            rows = db.fetch_all(f"{sql} ORDER BY {key} LIMIT ?", batch_params + [batch_size])
+        if not rows:
+            break
+        yield rows
+        if len(rows) < batch_size:
+            break
+        last_id = rows[-1]['id']
+
+def table_export_query(export_type, status=None, date_from=None, date_to=None, archived=False):
+    """Build the batched query and parameters for a table export.
+
+    With `archived`, an orders export also covers archive.db, which the reader
+    must attach.
+    """
+    spec = EXPORT_TYPES[export_type]
+    conditions = ["{keyset}"]
+    params = []
+    if export_type == 'orders':
+        if status:
+            conditions.append("status = ?")
+            params.append(status)
+        if date_from:
+            conditions.append("created_at >= ?")
+            params.append(date_from)
+        if date_to:
+            conditions.append("created_at < date(?, '+1 day')")
+            params.append(date_to)
+    columns = ', '.join(spec['headers'])
+    source = with_archive(spec['table'], archived and export_type == 'orders')
+    query = f"SELECT {columns} FROM {source} WHERE {' AND '.join(conditions)}"
+    return query, params
+
+def csv_chunks(batches, headers):
+    """Serialize row batches to CSV text, one chunk per batch."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(headers)
+    yield buffer.getvalue()
+    for rows in batches:
+        buffer.seek(0)
+        buffer.truncate(0)
+        for row in rows:
+            writer.writerow([row[header] for header in headers])
+        yield buffer.getvalue()
+
+def ndjson_chunks(batches):
+    """Serialize row batches to newline-delimited JSON, one chunk per batch."""
+    for rows in batches:
+        yield ''.join(json.dumps(dict(row), default=str) + '\n' for row in rows)
+
+def gzip_chunks(chunks):
+    """Compress a stream of text chunks into a gzip byte stream."""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
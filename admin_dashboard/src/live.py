@@ -0,0 +1,149 @@
+import json
+import queue
+import threading
+from .models.database import Database
+
+# Statuses that do not count as a sale, matching the data.db rollup triggers
+UNCOUNTED_STATUSES = ('pending', 'cancelled')
+
+def build_event(row):
+    """Turn a change_log row into a feed event, with the dashboard counter deltas it implies."""
+    data = json.loads(row['payload'])
+    counters = {}
+    if row['kind'] == 'order_created':
+        counters['total_orders'] = 1
+    elif row['kind'] == 'order_status':
+        was_sale = data.get('old_status') not in UNCOUNTED_STATUSES
+        is_sale = data.get('status') not in UNCOUNTED_STATUSES
+        if is_sale != was_sale:
+            revenue = float(data.get('total_price') or 0)
+            counters['total_revenue'] = revenue if is_sale else -revenue
+    return {'id': row['id'], 'type': row['kind'], 'at': row['created_at'], 'data': data, 'counters': counters}
+
+def sse_message(event):
+    """Format a feed event as a server-sent events message."""
+    return f"id: {event['id']}\nevent: {event['type']}\ndata: {json.dumps(event, default=str)}\n\n"
+
+class Subscription:
+    """One viewer's bounded queue of pending events."""
+
+    def __init__(self, max_pending):
+        self.events = queue.Queue(maxsize=max_pending)
+        self.last_id = 0
+        self.overflowed = False
+
+    def deliver(self, event):
+        if event['id'] <= self.last_id or self.overflowed:
+            return
+        try:
+            self.events.put_nowait(event)
+            self.last_id = event['id']
+        except queue.Full:
+            # A viewer this far behind reloads the page instead of replaying
+            self.overflowed = True
+
+    def get(self, timeout):
+        """Return the next event, a resync marker if the viewer fell behind, or None on timeout."""
+        if self.overflowed and self.events.empty():
+            return {'id': self.last_id, 'type': 'resync', 'at': None, 'data': {}, 'counters': {}}
+        try:
+            return self.events.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+class ChangeFeed:
+    """Tails data.db's change_log and fans new entries out to live dashboard viewers.
+
+    A single background thread per process polls the log, and only when PRAGMA
+    data_version shows that another connection has committed. It then hands each
+    new entry to every subscriber's queue, so the cost of a viewer is one queue,
+    not one query. Viewers reconnecting with a Last-Event-ID get the entries they
+    missed from the log itself.
+    """
+
+    def __init__(self, db_path, poll_interval=1.0, max_pending=200):
+        self.db = Database(db_path, read_only=True, pool_size=2)
+        self.poll_interval = poll_interval
+        self.max_pending = max_pending
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        # Held while publishing, and while a new viewer replays and registers,
+        # so no entry falls between the replay and the live stream
+        self._publish_lock = threading.Lock()
+        self._thread = None
+        self._last_id = None
+        self._stop = threading.Event()
+
+    def _latest_id(self):
+        with self.db.session():
+            if not self.db.fetch_one("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'change_log'"):
+                return None
+            return self.db.fetch_one("SELECT COALESCE(MAX(id), 0) AS id FROM change_log")['id']
+
+    def ensure_started(self):
+        """Start the tailing thread if it is not already running."""
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                if self._last_id is None:
+                    self._last_id = self._latest_id()
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name='change-feed', daemon=True)
+                self._thread.start()
+
+    def subscribe(self, last_event_id=None):
+        """Register a viewer, replaying entries after `last_event_id` if given."""
+        self.ensure_started()
+        subscription = Subscription(self.max_pending)
+        with self._publish_lock:
+            if last_event_id is not None:
+                with self.db.session():
+                    rows = self.db.fetch_all(
+                        "SELECT * FROM change_log WHERE id > ? ORDER BY id LIMIT ?",
+                        (last_event_id, self.max_pending + 1)
+                    )
+                for row in rows:
+                    subscription.deliver(build_event(row))
+            with self._lock:
+                self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def _publish(self, events):
+        with self._publish_lock:
+            with self._lock:
+                subscribers = list(self._subscribers)
+            for event in events:
+                for subscription in subscribers:
+                    subscription.deliver(event)
+
+    def _run(self):
+        # The thread keeps one connection, since data_version is per connection
+        self.db.connect()
+        try:
+            version = None
+            while not self._stop.wait(self.poll_interval):
+                current = self.db.fetch_one("PRAGMA data_version")
+                if current is None or current[0] == version:
+                    continue
+                version = current[0]
+                if self._last_id is None:
+                    # change_log did not exist yet when the feed started
+                    self._last_id = self._latest_id()
+                    continue
+                while True:
+                    rows = self.db.fetch_all(
+                        "SELECT * FROM change_log WHERE id > ? ORDER BY id LIMIT 500", (self._last_id,)
+                    )
+                    if rows:
+                        self._publish([build_event(row) for row in rows])
+                        self._last_id = rows[-1]['id']
+                    if len(rows) < 500:
+                        break
+        finally:
+            self.db.disconnect()
+
+    def stop(self):
+        self._stop.set()
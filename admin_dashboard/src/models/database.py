@@ -1,30 +1,141 @@
 import sqlite3
 import os
 import json
+import queue
+import threading
+from contextlib import contextmanager
 from datetime import datetime
+from urllib.parse import quote
+from User.metrics import timed_query
+from User.query_log import ProfiledConnection
+
+# Stay below SQLite's default SQLITE_MAX_VARIABLE_NUMBER (999 before 3.32)
+MAX_QUERY_PARAMS = 900
+
+def with_archive(table, archived=True):
+    """Return a FROM source for `table` that also covers its rows in the attached archive."""
+    if not archived:
+        return table
+    return f"(SELECT * FROM main.{table} UNION ALL SELECT * FROM archive.{table})"
+
+# Applied once to every new connection, not on each checkout
+DEFAULT_PRAGMAS = {
+    'busy_timeout': 5000,
+    'temp_store': 'MEMORY',
+}
 
 class Database:
-    def __init__(self, db_path):
+    """SQLite access shared by all request threads.
+
+    Each thread checks out its own connection from a small pool on connect() and
+    hands it back on disconnect(), so concurrent requests never share a cursor
+    and connections are reused instead of reopened per request. Nested
+    connect()/disconnect() pairs on one thread reuse the same connection.
+    """
+
+    def __init__(self, db_path, read_only=False, pool_size=8, pragmas=None):
         self.db_path = db_path
-        self.connection = None
-        self.cursor = None
-        
+        self.read_only = read_only
+        self.pragmas = DEFAULT_PRAGMAS if pragmas is None else pragmas
+        self._pool = queue.LifoQueue(maxsize=pool_size)
+        self._local = threading.local()
+
+    @property
+    def connection(self):
+        return getattr(self._local, 'connection', None)
+
+    @property
+    def cursor(self):
+        return getattr(self._local, 'cursor', None)
+
+    def _open(self):
+        """Open a new connection and apply the configured PRAGMAs."""
+        if self.read_only:
+            uri = f"file:{quote(os.path.abspath(self.db_path))}?mode=ro"
+            connection = sqlite3.connect(uri, uri=True, check_same_thread=False, factory=ProfiledConnection)
+        else:
+            connection = sqlite3.connect(self.db_path, check_same_thread=False, factory=ProfiledConnection)
+        connection.row_factory = sqlite3.Row
+        for name, value in self.pragmas.items():
+            connection.execute(f"PRAGMA {name} = {value}")
+        return connection
+
     def connect(self):
-        """Connect to the SQLite database."""
+        """Check out a connection for the current thread."""
         try:
-            self.connection = sqlite3.connect(self.db_path)
-            self.connection.row_factory = sqlite3.Row
-            self.cursor = self.connection.cursor()
+            if self.connection is None:
+                try:
+                    connection = self._pool.get_nowait()
+                except queue.Empty:
+                    connection = self._open()
+                self._local.connection = connection
+                self._local.cursor = connection.cursor()
+                self._local.depth = 0
+            self._local.depth += 1
             return True
         except sqlite3.Error as e:
             print(f"Database connection error: {e}")
             return False
-            
+
     def disconnect(self):
-        """Close the database connection."""
-        if self.connection:
-            self.connection.close()
-            
+        """Return the current thread's connection once its outermost user is done."""
+        if self.connection is None:
+            return
+        self._local.depth -= 1
+        if self._local.depth <= 0:
+            self.release()
+
+    def release(self):
+        """Return the current thread's connection to the pool, however deeply it is held."""
+        connection = self.connection
+        if connection is None:
+            return
+        self._local.connection = None
+        self._local.cursor = None
+        self._local.depth = 0
+        try:
+            if connection.in_transaction:
+                connection.rollback()
+            self._pool.put_nowait(connection)
+        except (sqlite3.Error, queue.Full):
+            connection.close()
+
+    def close_all(self):
+        """Close every idle pooled connection."""
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                break
+
+    @contextmanager
+    def session(self):
+        """Context manager form of connect()/disconnect()."""
+        if not self.connect():
+            raise sqlite3.OperationalError(f"Could not connect to {self.db_path}")
+        try:
+            yield self
+        finally:
+            self.disconnect()
+
+    @contextmanager
+    def attached(self, path, name='archive'):
+        """Attach another database file to this thread's connection for the block.
+
+        Yields whether it was attached: a missing file is not created, and
+        yields False instead.
+        """
+        if not path or not os.path.exists(path):
+            yield False
+            return
+        with self.session():
+            self.connection.execute(f"ATTACH DATABASE ? AS {name}", (path,))
+            try:
+                yield True
+            finally:
+                self.connection.execute(f"DETACH DATABASE {name}")
+
+    @timed_query
     def execute_query(self, query, params=None):
         """Execute a query with optional parameters."""
         try:
@@ -38,6 +149,7 @@ class Database:
             print(f"Query execution error: {e}")
             return False
             
+    @timed_query
     def fetch_all(self, query, params=None):
         """Execute a query and fetch all results."""
         try:
@@ -50,6 +162,7 @@ class Database:
             print(f"Fetch error: {e}")
             return []
             
+    @timed_query
     def fetch_one(self, query, params=None):
         """Execute a query and fetch one result."""
         try:
@@ -62,6 +175,26 @@ class Database:
             print(f"Fetch error: {e}")
             return None
             
+    def fetch_order_items(self, order_ids, archived=False):
+        """Fetch the items of many orders at once, grouped by order ID.
+
+        With `archived`, items in an attached archive.db are included too.
+        """
+        items_by_order = {order_id: [] for order_id in order_ids}
+        order_ids = list(items_by_order)
+        for start in range(0, len(order_ids), MAX_QUERY_PARAMS):
+            chunk = order_ids[start:start + MAX_QUERY_PARAMS]
+            placeholders = ', '.join('?' * len(chunk))
+            rows = self.fetch_all(f"""
+                SELECT oi.*, p.name, p.platform, p.image_url
+                FROM {with_archive('order_items', archived)} oi
+                JOIN products p ON oi.product_id = p.id
+                WHERE oi.order_id IN ({placeholders})
+            """, chunk)
+            for row in rows:
+                items_by_order[row['order_id']].append(dict(row))
+        return items_by_order
+            
     def create_tables(self):
         """Create new tables for admin dashboard if they don't exist."""
         try:
@@ -127,6 +260,51 @@ class Database:
                 )
             ''')
             
+            # Background export jobs table
+            self.cursor.execute('''
+                CREATE TABLE IF NOT EXISTS export_jobs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    report TEXT NOT NULL,
+                    format TEXT NOT NULL,
+                    params TEXT,
+                    status TEXT NOT NULL DEFAULT 'queued',
+                    rows_written INTEGER NOT NULL DEFAULT 0,
+                    total_rows INTEGER,
+                    file_path TEXT,
+                    error TEXT,
+                    created_by INTEGER,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    finished_at TIMESTAMP,
+                    FOREIGN KEY(created_by) REFERENCES admin_users(id)
+                )
+            ''')
+            self.cursor.execute(
+                "CREATE INDEX IF NOT EXISTS idx_export_jobs_status ON export_jobs(status, id)"
+            )
+            
+            # Per-statement timing written by the query log (User/query_log.py)
+            self.cursor.execute('''
+                CREATE TABLE IF NOT EXISTS query_stats (
+                    db TEXT NOT NULL,
+                    fingerprint TEXT NOT NULL,
+                    calls INTEGER NOT NULL DEFAULT 0,
+                    total_ms REAL NOT NULL DEFAULT 0,
+                    max_ms REAL NOT NULL DEFAULT 0,
+                    slow_calls INTEGER NOT NULL DEFAULT 0,
+                    errors INTEGER NOT NULL DEFAULT 0,
+                    query_plan TEXT,
+                    first_seen TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    last_seen TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY (db, fingerprint)
+                )
+            ''')
+            # Time of the last query stats reset; processes drop older unflushed numbers
+            self.cursor.execute('''
+                CREATE TABLE IF NOT EXISTS query_stats_resets (
+                    reset_at REAL NOT NULL
+                )
+            ''')
+            
             # Broadcast messages table
             self.cursor.execute('''
                 CREATE TABLE IF NOT EXISTS broadcast_messages (
@@ -0,0 +1,110 @@
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from urllib.parse import quote
+from .models.database import Database
+
+READ_MODES = ('live', 'wal', 'backup')
+
+def parse_route_modes(value, default='wal'):
+    """Parse 'route=mode,route=mode' into a dict, ignoring unknown modes."""
+    modes = {}
+    for item in (value or '').split(','):
+        route, _, mode = item.partition('=')
+        route, mode = route.strip(), mode.strip()
+        if route and mode in READ_MODES:
+            modes[route] = mode
+    modes.setdefault('default', default if default in READ_MODES else 'wal')
+    return modes
+
+class BackupSnapshot:
+    """Read-only copy of a database, refreshed with SQLite's online backup API.
+
+    The copy is rebuilt once it is older than `max_age` seconds. A refresh writes
+    to a temporary file of its own (every worker refreshes independently) and
+    swaps it in, and each refresh gets a fresh connection pool, so requests
+    already reading the previous copy finish on it undisturbed. While one
+    request refreshes, others keep reading the current copy.
+    """
+
+    def __init__(self, source_path, snapshot_path, max_age=300):
+        self.source_path = source_path
+        self.snapshot_path = snapshot_path
+        self.max_age = max_age
+        self._db = None
+        self._taken_at = 0
+        self._refresh_lock = threading.Lock()
+
+    def _stale(self):
+        return self._db is None or time.monotonic() - self._taken_at > self.max_age
+
+    def _refresh(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.snapshot_path)), exist_ok=True)
+        fd, partial_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(self.snapshot_path)), suffix='.part')
+        os.close(fd)
+        try:
+            source = sqlite3.connect(f"file:{quote(os.path.abspath(self.source_path))}?mode=ro", uri=True)
+            target = sqlite3.connect(partial_path)
+            try:
+                # Copy in one step: a single read transaction gives a consistent copy,
+                # and under WAL it does not hold up the bot's writes
+                source.backup(target)
+                # The copy inherits WAL mode; a rollback-journal file leaves no -wal/-shm
+                # tied to the old file behind when it is replaced under open readers
+                target.execute("PRAGMA journal_mode = DELETE")
+            finally:
+                target.close()
+                source.close()
+            os.replace(partial_path, self.snapshot_path)
+        except BaseException:
+            if os.path.exists(partial_path):
+                os.remove(partial_path)
+            raise
+        self._db = Database(self.snapshot_path, read_only=True)
+        self._taken_at = time.monotonic()
+
+    def database(self):
+        """Return a read-only Database on the current copy, refreshing it if stale."""
+        if self._stale():
+            # Only the first caller waits; later ones reuse the existing copy meanwhile
+            if self._refresh_lock.acquire(blocking=self._db is None):
+                try:
+                    if self._stale():
+                        self._refresh()
+                except (sqlite3.Error, OSError) as e:
+                    print(f"Snapshot refresh error: {e}")
+                finally:
+                    self._refresh_lock.release()
+        return self._db
+
+class ReadSources:
+    """Chooses how each reporting route reads data.db.
+
+    'live' uses the shared read/write pool, 'wal' uses read-only connections on
+    data.db itself (with data.db in WAL mode these never block the bot's writes),
+    and 'backup' reads a periodically refreshed copy so heavy queries never touch
+    the live file at all.
+    """
+
+    def __init__(self, live_db, db_path, snapshot_path, modes=None, snapshot_max_age=300):
+        self.live_db = live_db
+        self.wal_db = Database(db_path, read_only=True)
+        self.db_path = db_path
+        self.snapshot = BackupSnapshot(db_path, snapshot_path, max_age=snapshot_max_age)
+        self.modes = modes or {'default': 'wal'}
+
+    def mode(self, route):
+        return self.modes.get(route, self.modes.get('default', 'wal'))
+
+    def database(self, route):
+        """Return the Database a route should read through."""
+        mode = self.mode(route)
+        if mode == 'backup':
+            snapshot = self.snapshot.database()
+            if snapshot is not None:
+                return snapshot
+        if mode == 'live':
+            return self.live_db
+        return self.wal_db
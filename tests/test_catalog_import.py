@@ -0,0 +1,21 @@
+from admin_dashboard.src.catalog_import import import_catalog, validate_row
+
+VALID_ROW = {
+    'name': 'Game',
+    'price': '10',
+    'platform': 'PS5',
+    'stock': '3',
+    'image_url': 'images/game.jpg',
+}
+
+def test_validate_row_rejects_non_integer_id():
+    row, errors = validate_row(dict(VALID_ROW, id='abc'))
+    assert row['id'] is None
+    assert errors == ["id must be an integer"]
+
+def test_import_catalog_reports_malformed_id_without_writing():
+    report = import_catalog(None, [dict(VALID_ROW, id='abc'), dict(VALID_ROW, id='2')])
+    assert report['invalid'] == 1
+    assert report['written'] is False
+    assert report['rows'][0]['action'] == 'invalid'
+    assert report['rows'][0]['errors'] == ["id must be an integer"]
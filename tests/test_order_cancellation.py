@@ -0,0 +1,33 @@
+import asyncio
+import sqlite3
+from User.database import Database, ORDER_COMPLETED, ORDER_NOT_PENDING
+
+def _completed_order(db_path):
+    db = Database(str(db_path))
+
+    async def setup():
+        await db.initialize()
+        await db.add_user(1, 'buyer', 'Buyer', '')
+        async with db.connect() as conn:
+            await conn.execute(
+                "INSERT INTO products (id, name, platform, price, stock, description, image_url) "
+                "VALUES (1, 'Game', '[\"PS5\"]', 10.0, 5, '', 'images/game.jpg')"
+            )
+            await conn.commit()
+        order_id = await db.create_order(1, 20.0, [{'product_id': 1, 'quantity': 2, 'price': 10.0}])
+        assert await db.complete_order(order_id, {'name': 'Buyer'}) == ORDER_COMPLETED
+        return order_id
+
+    return db, asyncio.run(setup())
+
+def test_completed_order_cannot_be_cancelled(tmp_path):
+    db, order_id = _completed_order(tmp_path / 'data.db')
+
+    # What collect_address does when completing fails
+    assert asyncio.run(db.complete_order(order_id, {'name': 'Buyer'})) == ORDER_NOT_PENDING
+    assert asyncio.run(db.cancel_order(order_id)) is False
+
+    connection = sqlite3.connect(db.db_path)
+    assert connection.execute("SELECT status FROM orders WHERE id = ?", (order_id,)).fetchone()[0] == 'completed'
+    assert connection.execute("SELECT stock FROM products WHERE id = 1").fetchone()[0] == 3
+    connection.close()
@@ -1,18 +1,12 @@
-import asyncio
 import os
-import threading
-from admin_dashboard.app import app, set_telegram_app
-from User.main import run_bot, BOT_TOKEN
-from telegram.ext import Application
+from admin_dashboard.app import app, bot_leader
+from User.main import run_bot
+
+# Every web worker joins the election; the winner runs the bot and the rest
+# forward /webhook to it. Do not combine with gunicorn --preload: the workers
+# must each import this module after forking.
+bot_leader.start(run_bot)
 
 if __name__ == "__main__":
-    # Initialize Telegram app
-    telegram_app = Application.builder().token(BOT_TOKEN).build()
-    set_telegram_app(telegram_app)
-    
-    # Start bot in a separate thread
-    bot_thread = threading.Thread(target=lambda: asyncio.run(run_bot()), daemon=True)
-    bot_thread.start()
-    
     # Run Flask app
-    app.run(host='0.0.0.0', port=int(os.getenv('PORT', 8000)))
\ No newline at end of file
+    app.run(host='0.0.0.0', port=int(os.getenv('PORT', 8000)))